@@ -0,0 +1,171 @@
+"""
+Background computation of image statistics, with results delivered on the GUI
+thread and stale results discarded
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from matplotlib.backend_bases import TimerBase
+
+from recipes.logging import LoggingMixin
+
+
+def is_interactive(canvas):
+    """
+    Whether timers of `canvas` fire, ie. whether its backend runs an event
+    loop. Timers of non-interactive backends (eg. Agg) are `TimerBase`
+    instances that do nothing.
+    """
+    return type(canvas.new_timer()) is not TimerBase
+
+
+class BackgroundJobs(LoggingMixin):
+    """
+    Run expensive computations (eg. colour limits and histograms) in a thread
+    pool, so that the GUI stays responsive.
+
+    Jobs are submitted on named channels. Submitting a job on a channel
+    supersedes any earlier job on the same channel: the earlier job is
+    cancelled if it has not started yet, and its result is discarded if it
+    has. Results are delivered to the job's callback on the GUI thread by
+    polling from a canvas timer (or by calling `poll` / `wait` explicitly), so
+    the callbacks may safely modify artists. Note that timers only fire for
+    interactive backends (see `is_interactive`).
+    """
+
+    def __init__(self, canvas=None, n_workers=1, poll_interval=20):
+        """
+        Parameters
+        ----------
+        canvas: FigureCanvasBase, optional
+            Canvas used to create the timer that polls for finished jobs, and
+            which is redrawn after results have been delivered.
+        n_workers: int
+            Number of worker threads.
+        poll_interval: int
+            Interval in milliseconds between checks for finished jobs.
+        """
+        self.canvas = canvas
+        self.n_workers = int(n_workers)
+        # counters
+        self.submitted = self.delivered = self.discarded = 0
+
+        self._jobs = {}     # channel -> (token, future, callback)
+        self._tokens = {}   # channel -> token of latest submission
+        self._lock = threading.RLock()
+        self._executor = None
+        self.timer = None
+        if canvas is not None:
+            self.timer = canvas.new_timer(interval=poll_interval)
+            self.timer.add_callback(self.poll)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(pending={len(self._jobs)}, '
+                f'submitted={self.submitted}, delivered={self.delivered}, '
+                f'discarded={self.discarded})')
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                    self.n_workers, thread_name_prefix=self.__class__.__name__)
+        return self._executor
+
+    def is_pending(self, channel):
+        """Whether a job on `channel` has not been delivered yet"""
+        return channel in self._jobs
+
+    def submit(self, channel, func, *args, callback=None, **kws):
+        """
+        Compute `func(*args, **kws)` in the background, superseding any
+        pending job on `channel`. When done, `callback(result)` is called on
+        the GUI thread (during `poll`).
+
+        Returns
+        -------
+        concurrent.futures.Future
+        """
+        with self._lock:
+            token = self._tokens[channel] = self._tokens.get(channel, 0) + 1
+            old = self._jobs.pop(channel, None)
+            if old is not None:
+                old[1].cancel()
+                self.discarded += 1
+
+            future = self.executor.submit(func, *args, **kws)
+            self._jobs[channel] = (token, future, callback)
+            self.submitted += 1
+
+        if self.timer is not None:
+            self.timer.start()
+        return future
+
+    def cancel(self, channel=None):
+        """Cancel the pending job on `channel`, or all jobs if not given"""
+        with self._lock:
+            channels = list(self._jobs) if channel is None else [channel]
+            for channel in channels:
+                job = self._jobs.pop(channel, None)
+                if job is not None:
+                    job[1].cancel()
+                    self.discarded += 1
+
+    def poll(self):
+        """
+        Deliver the results of finished jobs to their callbacks. Returns the
+        number of results delivered.
+        """
+        with self._lock:
+            done = [(channel, job) for channel, job in self._jobs.items()
+                    if job[1].done()]
+            for channel, _ in done:
+                del self._jobs[channel]
+            idle = not self._jobs
+
+        if idle and self.timer is not None:
+            self.timer.stop()
+
+        delivered = 0
+        for channel, (token, future, callback) in done:
+            if future.cancelled() or token != self._tokens.get(channel):
+                self.discarded += 1
+                continue
+
+            try:
+                result = future.result()
+            except Exception:
+                self.logger.exception('Background job on channel %r failed.',
+                                      channel)
+                continue
+
+            if callback is not None:
+                callback(result)
+            delivered += 1
+
+        self.delivered += delivered
+        if delivered and self.canvas is not None:
+            self.canvas.draw_idle()
+        return delivered
+
+    def wait(self, timeout=None):
+        """
+        Block until all pending jobs are finished, and deliver their results.
+        Returns the number of results delivered.
+        """
+        with self._lock:
+            futures = [job[1] for job in self._jobs.values()]
+
+        for future in futures:
+            if not future.cancelled():
+                future.exception(timeout)
+        return self.poll()
+
+    def close(self):
+        """Cancel pending jobs and stop the worker threads"""
+        self.cancel()
+        if self.timer is not None:
+            self.timer.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
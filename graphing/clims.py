@@ -0,0 +1,293 @@
+"""
+Batch computation of colour limits for image cubes, and memoisation of colour
+limits for repeatedly displayed images
+"""
+
+import logging
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+import numpy as np
+from astropy.visualization.interval import (BaseInterval, ManualInterval,
+                                            MinMaxInterval,
+                                            AsymmetricPercentileInterval)
+
+from recipes.logging import LoggingMixin
+from recipes.introspection.utils import get_module_name
+
+from .frames import as_frame_source, map_chunks
+
+# module level logger
+logger = logging.getLogger(get_module_name(__file__))
+
+DEFAULT_CHUNK_SIZE = 32
+
+
+def _as_float_filled(frames):
+    """Convert to float array with masked elements replaced by nan"""
+    frames = np.ma.asarray(frames)
+    if not np.issubdtype(frames.dtype, np.floating):
+        frames = frames.astype(float)
+    return np.ma.filled(frames, np.nan)
+
+
+def batch_limits(frames, interval):
+    """
+    Compute colour limits for each frame in the 3D array `frames` in a single
+    vectorised pass.  Vectorised implementations exist for the `ManualInterval`,
+    `MinMaxInterval` and (Asymmetric)`PercentileInterval` classes, and for any
+    interval implementing a `get_limits_batch` method. Other intervals fall
+    back to computing limits frame by frame.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        Image stack with shape (n, ypix, xpix). Masked elements and nans are
+        ignored.
+    interval: astropy.visualization.interval.BaseInterval
+        The interval algorithm
+
+    Returns
+    -------
+    np.ndarray
+        Colour limits with shape (n, 2)
+    """
+    if hasattr(interval, 'get_limits_batch'):
+        return np.asarray(interval.get_limits_batch(frames))
+
+    n = len(frames)
+    flat = _as_float_filled(frames).reshape(n, -1)
+
+    if isinstance(interval, (ManualInterval, MinMaxInterval)):
+        lims = np.c_[np.nanmin(flat, 1), np.nanmax(flat, 1)]
+        if isinstance(interval, ManualInterval):
+            for i, v in enumerate((interval.vmin, interval.vmax)):
+                if v is not None:
+                    lims[:, i] = v
+        return lims
+
+    if isinstance(interval, AsymmetricPercentileInterval):
+        if interval.n_samples:
+            # deterministic subsample
+            step = max(flat.shape[1] // int(interval.n_samples), 1)
+            flat = flat[:, ::step]
+
+        p = (interval.lower_percentile, interval.upper_percentile)
+        return np.nanpercentile(flat, p, 1).T
+
+    # fall back to per-frame limits
+    lims = np.empty((n, 2))
+    for i, frame in enumerate(flat):
+        lims[i] = interval.get_limits(frame[~np.isnan(frame)])
+    return lims
+
+
+def _chunk_limits(frames, index, interval):
+    return batch_limits(frames.get_frames(index), interval)
+
+
+def get_sidecar_filename(filename, interval):
+    """
+    Filename for persisting colour limits of the cube in `filename`. The name
+    is keyed on the file's identity (resolved path, size and modification time)
+    and on the interval type and parameters.
+
+    Parameters
+    ----------
+    filename: str or Path
+    interval: astropy.visualization.interval.BaseInterval
+
+    Returns
+    -------
+    Path
+    """
+    path = Path(filename).resolve()
+    stat = path.stat()
+    params = sorted(vars(interval).items())
+    key = repr((str(path), stat.st_size, stat.st_mtime_ns,
+                interval.__class__.__name__, params))
+    key = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return path.with_name(f'{path.stem}.clims.{key}.npy')
+
+
+def compute_clims(data, interval, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=1,
+                  sidecar=True):
+    """
+    Compute colour limits for all frames of an image cube.
+
+    The cube is processed in chunks of `chunk_size` frames so that memory use
+    is bounded for memory mapped data. Chunks are optionally distributed
+    across a process pool. If the data are backed by a file, the result is
+    persisted to a sidecar `.npy` file next to it (see
+    `get_sidecar_filename`), which is loaded on subsequent calls instead of
+    recomputing.
+
+    Parameters
+    ----------
+    data: array-like, str, Path or FrameSource
+        The image cube
+    interval: astropy.visualization.interval.BaseInterval
+        The interval algorithm
+    chunk_size: int
+        Number of frames processed at once
+    n_jobs: int
+        Number of processes to use. With `n_jobs=1` (the default), chunks are
+        processed in the current process.
+    sidecar: bool
+        Whether to load / save the limits from / to a sidecar file.
+
+    Returns
+    -------
+    np.ndarray
+        Colour limits with shape (n, 2)
+    """
+    if not isinstance(interval, BaseInterval):
+        raise TypeError('`interval` should be an instance of '
+                        '`astropy.visualization.interval.BaseInterval`, not '
+                        f'{type(interval)}.')
+
+    frames = as_frame_source(data)
+    filename = getattr(frames, 'filename', None) if sidecar else None
+    if filename:
+        sidecar = get_sidecar_filename(filename, interval)
+        if sidecar.exists():
+            logger.info('Loading colour limits from %r', str(sidecar))
+            return np.load(sidecar)
+
+    n = len(frames)
+    if n == 0:
+        return np.empty((0, 2))
+
+    chunks = [slice(i, i + chunk_size) for i in range(0, n, chunk_size)]
+    clims = np.vstack(list(map_chunks(_chunk_limits, frames, chunks, interval,
+                                      n_jobs=n_jobs)))
+
+    if filename:
+        logger.info('Saving colour limits to %r', str(sidecar))
+        try:
+            np.save(sidecar, clims)
+        except OSError as err:
+            # eg. read-only directory
+            logger.warning('Could not save colour limits to %r: %s',
+                           str(sidecar), err)
+
+    return clims
+
+
+def fingerprint(data, n_samples=256):
+    """
+    Cheap fingerprint of an array. This combines the address of the data
+    buffer, the shape, strides and dtype, and a checksum of about `n_samples`
+    elements taken at a regular stride. For masked arrays, the fingerprint of
+    the mask is included.
+
+    Note that changes to elements that are not sampled are not detected. Use
+    `LimitsCache.invalidate` after modifying an array in place.
+
+    Parameters
+    ----------
+    data: np.ndarray
+    n_samples: int
+        Number of elements to include in the checksum
+
+    Returns
+    -------
+    tuple
+    """
+    step = max(data.size // int(n_samples), 1)
+    sample = np.ascontiguousarray(data.flat[::step])
+    checksum = hashlib.blake2b(sample.view(np.uint8), digest_size=8)
+    key = (data.__array_interface__['data'][0], data.shape, data.strides,
+           data.dtype.str, checksum.hexdigest())
+
+    if np.ma.isMA(data) and data.mask is not np.ma.nomask:
+        return key + (fingerprint(data.mask, n_samples),)
+    return key
+
+
+def params_key(obj):
+    """Hashable key for the type and parameters of `obj`"""
+    if hasattr(obj, '__dict__'):
+        return obj.__class__.__name__, repr(sorted(vars(obj).items()))
+    return repr(obj)
+
+
+class LimitsCache(LoggingMixin):
+    """
+    Bounded LRU cache for colour limits of images that are displayed
+    repeatedly. Entries are keyed on the `fingerprint` of the array and on the
+    type and parameters of the objects (eg. interval and stretch) that
+    determine the result. Only `np.ndarray` (and subclass) instances are
+    cached.
+    """
+
+    def __init__(self, maxsize=256):
+        """
+        Parameters
+        ----------
+        maxsize: int
+            Maximum number of cached results
+        """
+        self.maxsize = int(maxsize)
+        self._results = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(size={len(self)}/{self.maxsize},'
+                f' hits={self.hits}, misses={self.misses})')
+
+    def get_key(self, data, *params):
+        return (fingerprint(data), *map(params_key, params))
+
+    def get(self, data, compute, *params):
+        """
+        Return the cached result for `data` and `params`, or call `compute()`
+        and cache the result.
+        """
+        if not isinstance(data, np.ndarray) or not self.maxsize:
+            return compute()
+
+        key = self.get_key(data, *params)
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        self.misses += 1
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def get_limits(self, data, interval):
+        """Limits from `interval.get_limits(data)`, computed once."""
+        return self.get(data, lambda: interval.get_limits(data), interval)
+
+    def invalidate(self, data=None):
+        """
+        Discard the results for arrays sharing the data buffer of `data`, or
+        all results if `data` is None.
+        """
+        with self._lock:
+            if data is None:
+                self._results.clear()
+                return
+
+            address = np.asarray(data).__array_interface__['data'][0]
+            for key in [key for key in self._results if key[0][0] == address]:
+                del self._results[key]
+
+    clear = invalidate
+
+
+# shared cache for the image displays
+limits_cache = LimitsCache()
@@ -12,7 +12,7 @@ import numpy as np
 import warnings
 import numbers
 from .hist import Histogram, get_bins
-from .utils import percentile
+from .utils import percentile, get_percentile_limits
 
 import logging
 from recipes.introspection import get_module_name
@@ -149,7 +149,8 @@ def corner(samples, bins=DEFAULT_NBINS, plims=(0.5, 99.5),
     # default to min-max scaling (same as range=None for histogram)
     if not np.any(plims):
         plims = (0, 100)
-    lims = percentile(samples, plims, 0).T
+    # limits for all parameters in a single (masked) percentile pass
+    lims = get_percentile_limits(samples, plims, axis=0).T
     logger.debug('Ranges: %s', lims)
 
     # get bins
@@ -160,6 +161,9 @@ def corner(samples, bins=DEFAULT_NBINS, plims=(0.5, 99.5),
                           f'{DEFAULT_NBINS}')
             bins = DEFAULT_NBINS
         bins = np.full(dof, bins)
+    elif isinstance(bins, numbers.Integral):
+        # equal width bins spanning the limits of each parameter
+        bins = np.linspace(lims[:, 0], lims[:, 1], bins + 1, axis=1)
     else:
         # compute bins
         bins = [get_bins(s, bins, rng)
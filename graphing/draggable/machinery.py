@@ -442,17 +442,19 @@ class DraggableBase(LoggingMixin):  # TODO: use as mixin?
         # TODO: validate method for more complex movement restrictions
         # set min / max here
         self.clipped = False
+        # nan limits are unbounded
+        unbounded = (-np.inf, np.inf)
         xlim = xmin, xmax = self.xlim
         if not np.isnan(xlim).all():
             self.logger.debug('clipping %s: x [%.2f, %.2f]', self, xmin, xmax)
-            x = np.clip(x, xmin, xmax)
+            x = np.clip(x, *np.where(np.isnan(xlim), unbounded, xlim))
             if x in xlim:
                 self.clipped = True
 
         ylim = ymin, ymax = self.ylim
         if not np.isnan(ylim).all():
             self.logger.debug('clipping %s: y [%.2f, %.2f]', self, ymin, ymax)
-            y = np.clip(y, ymin, ymax)
+            y = np.clip(y, *np.where(np.isnan(ylim), unbounded, ylim))
             if y in ylim:
                 self.clipped = True
 
@@ -0,0 +1,338 @@
+"""
+Headless, parallel export of image sequences to movies or PNG sequences
+"""
+
+import os
+import logging
+import subprocess as sub
+from pathlib import Path
+from copy import deepcopy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
+from matplotlib.collections import EllipseCollection
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from recipes.introspection.utils import get_module_name
+
+from .lut import LookupImage, supports
+from .frames import warn_if_copied
+
+# module level logger
+logger = logging.getLogger(get_module_name(__file__))
+
+# renderer instance for worker processes (set by `_init_worker`)
+_renderer = None
+
+
+class FrameRenderer(object):
+    """
+    Picklable specification for rendering frames of an image sequence
+    offscreen with the Agg backend. The colour map, normalization, colour
+    limits and overlays (markers and apertures) are taken from a
+    `VideoDisplay` with `from_display`. The figure is only created (by
+    `setup`) in the process that does the rendering.
+    """
+
+    def __init__(self, frames, cmap, norm, clims=None, interval=None,
+                 origin='lower', coords=None, marker_properties=None,
+                 aperture_properties=None, dpi=100, scale=1):
+        """
+        Parameters
+        ----------
+        frames: FrameSource
+            The image sequence
+        cmap: matplotlib.colors.Colormap
+        norm: matplotlib.colors.Normalize
+        clims: array-like, optional
+            Colour limits per frame, shape (n, 2)
+        interval: astropy.visualization.interval.BaseInterval, optional
+            Interval used to compute the colour limits of each frame if
+            `clims` are not given. If neither are given, the limits of `norm`
+            are used for all frames.
+        origin: {'lower', 'upper'}
+        coords: array-like, optional
+            Marker positions (yx) for each frame, shape (n, k, 2)
+        marker_properties: dict, optional
+            Properties for the markers
+        aperture_properties: dict, optional
+            Properties for circular apertures around each marker. Should
+            contain `widths` and `heights`, and optionally `edgecolor` and
+            `linewidth`.
+        dpi: int
+            Resolution of the output frames
+        scale: float
+            Number of output pixels per image pixel
+        """
+        self.frames = frames
+        self.cmap = cmap
+        self.norm = norm
+        self.clims = clims
+        self.interval = interval
+        self.origin = origin
+        self.coords = coords
+        self.marker_properties = marker_properties or {}
+        self.aperture_properties = aperture_properties
+        self.dpi = dpi
+        self.scale = scale
+
+        self.figure = None
+
+    @classmethod
+    def from_display(cls, display, **kws):
+        """
+        Create a renderer that reproduces the image axes of `display`.
+
+        Parameters
+        ----------
+        display: VideoDisplay
+        kws:
+            Passed to the constructor, and take precedence over the values
+            taken from `display`.
+        """
+        image = display.imagePlot
+        norm = deepcopy(image.norm)
+        spec = dict(frames=display.data,
+                    cmap=image.get_cmap(),
+                    norm=norm,
+                    clims=display.clims,
+                    origin=image.origin)
+
+        # frame by frame limits if the display updates them during playback
+        if display.clims is None and display.clim_every:
+            spec['interval'] = getattr(norm, 'interval', None)
+
+        # overlays
+        if getattr(display, 'has_coords', False):
+            spec['coords'] = np.asarray(display.coords)
+            spec['marker_properties'] = display.marker_properties
+
+        aps = getattr(display, 'aps', None)
+        if aps is not None:
+            spec['aperture_properties'] = dict(
+                    widths=getattr(aps, 'widths', 7.5),
+                    heights=getattr(aps, 'heights', 7.5),
+                    edgecolor=aps.get_edgecolor(),
+                    linewidth=aps.get_linewidth())
+
+        spec.update(kws)
+        return cls(**spec)
+
+    def __getstate__(self):
+        # never pickle the figure
+        return {**self.__dict__, 'figure': None}
+
+    @property
+    def size(self):
+        """Size (width, height) of the output frames in pixels"""
+        nrows, ncols = self.frames.shape[1:]
+        return tuple(int(n * self.scale) for n in (ncols, nrows))
+
+    def setup(self):
+        """Create the offscreen figure and artists"""
+        w, h = self.size
+        self.figure = fig = Figure(figsize=(w / self.dpi, h / self.dpi),
+                                   dpi=self.dpi)
+        FigureCanvasAgg(fig)
+        self.ax = ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+
+        frame = self.frames.get_frame(0)
+        self.image = ax.imshow(frame, cmap=self.cmap, norm=self.norm,
+                               origin=self.origin)
+        if supports(frame):
+            # colour map integer frames by table lookup
+            self.image = LookupImage.from_image(self.image)
+
+        self.marks = self.aps = None
+        if self.coords is not None:
+            self.marks, = ax.plot([], [], **self.marker_properties)
+
+            if self.aperture_properties:
+                props = dict(self.aperture_properties)
+                self.aps = EllipseCollection(
+                        props.pop('widths'), props.pop('heights'), 0,
+                        units='xy', offsets=np.empty((0, 2)),
+                        offset_transform=ax.transData, facecolors='none',
+                        **props)
+                ax.add_collection(self.aps)
+
+    def get_clim(self, i, image):
+        if self.clims is not None:
+            return self.clims[i]
+
+        if self.interval is not None:
+            data = np.ma.compressed(image)
+            return self.interval.get_limits(data[~np.isnan(data)])
+
+    def render(self, i):
+        """
+        Render frame `i`.
+
+        Returns
+        -------
+        np.ndarray
+            RGBA image with shape (height, width, 4) and dtype uint8
+        """
+        if self.figure is None:
+            self.setup()
+
+        image = self.frames.get_frame(i)
+        self.image.set_data(image)
+
+        clim = self.get_clim(i, image)
+        if clim is not None and clim[0] != clim[1]:
+            self.image.set_clim(*clim)
+
+        if self.marks is not None:
+            # note coords are (y, x)
+            yx = self.coords[i] if i < len(self.coords) else np.empty((0, 2))
+            self.marks.set_data(yx[:, ::-1].T)
+            if self.aps is not None:
+                self.aps.set_offsets(yx[:, ::-1])
+
+        canvas = self.figure.canvas
+        canvas.draw()
+        return np.asarray(canvas.buffer_rgba())
+
+    def save(self, i, filename):
+        """Render frame `i` and save it as an image file"""
+        imsave(filename, self.render(i))
+        return filename
+
+
+def _init_worker(renderer):
+    global _renderer
+    _renderer = renderer
+    _renderer.setup()
+
+
+def _render(i):
+    return _renderer.render(i).tobytes()
+
+
+def _save(i, filename):
+    return _renderer.save(i, filename)
+
+
+def _ffmpeg_command(filename, size, fps, encoder='ffmpeg', args=()):
+    w, h = size
+    cmd = [encoder, '-y', '-loglevel', 'error',
+           '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{w}x{h}',
+           '-r', str(fps), '-i', '-']
+    if Path(filename).suffix.lower() in ('.mp4', '.m4v', '.mov'):
+        # h264 requires even dimensions and a yuv pixel format for playback
+        # in most players
+        cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p']
+    return [*cmd, *args, str(filename)]
+
+
+def export(display, filename, start=0, stop=None, fps=25, n_jobs=None,
+           max_in_flight=None, encoder='ffmpeg', encoder_args=(), **kws):
+    """
+    Render the frames of `display` offscreen and write them to a movie file
+    (by piping raw RGBA frames to an `ffmpeg` subprocess) or a PNG sequence.
+
+    Frames are rendered in parallel in a process pool, and written in order.
+    At most `max_in_flight` frames are rendered ahead of the writer, which
+    bounds memory use.
+
+    Parameters
+    ----------
+    display: VideoDisplay
+        The display. Its colour map, normalization, colour limits and overlays
+        are reproduced. See `FrameRenderer.from_display`.
+    filename: str or Path
+        Output filename. If this is a format string such as
+        'frames/{:05d}.png', or has a '.png' suffix (in which case the frame
+        number is appended to the stem), a PNG sequence is written. Otherwise
+        the frames are encoded to a movie file (eg. '.mp4' or '.gif').
+    start, stop: int
+        Range of frames to export
+    fps: float
+        Frame rate of the movie
+    n_jobs: int, optional
+        Number of processes to use. Defaults to the number of CPUs. With
+        `n_jobs=1`, frames are rendered in the current process.
+    max_in_flight: int, optional
+        Maximum number of frames queued for rendering at any time. Defaults
+        to twice the number of processes.
+    encoder: str
+        The encoder executable
+    encoder_args: sequence of str
+        Extra arguments for the encoder, inserted before the output filename
+    kws:
+        Passed to `FrameRenderer.from_display`, eg. `dpi` or `scale`.
+
+    Returns
+    -------
+    list of Path or Path
+        The filenames of the PNG sequence, or the movie filename.
+    """
+    renderer = FrameRenderer.from_display(display, **kws)
+    stop = len(display.data) if stop is None else stop
+    indices = range(start, stop)
+
+    filename = str(filename)
+    png = filename.endswith('.png')
+    if png:
+        if '{' not in filename:
+            path = Path(filename)
+            filename = str(path.with_name(path.stem + '{:05d}.png'))
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+    if png:
+        func, args = _save, [(i, filename.format(i)) for i in indices]
+    else:
+        func, args = _render, [(i,) for i in indices]
+
+    if png:
+        logger.info('Writing %i frames to %r', len(indices), filename)
+        return [Path(_) for _ in
+                _map_ordered(renderer, func, args, n_jobs, max_in_flight)]
+
+    cmd = _ffmpeg_command(filename, renderer.size, fps, encoder, encoder_args)
+    logger.info('Encoding %i frames: %s', len(indices), ' '.join(cmd))
+    proc = sub.Popen(cmd, stdin=sub.PIPE)
+    try:
+        for buffer in _map_ordered(renderer, func, args, n_jobs,
+                                   max_in_flight):
+            proc.stdin.write(buffer)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+
+    if proc.returncode:
+        raise sub.CalledProcessError(proc.returncode, cmd)
+
+    return Path(filename)
+
+
+def _map_ordered(renderer, func, args, n_jobs=None, max_in_flight=None):
+    """
+    Yield `func(*a)` for `a` in `args` in order, computed in a process pool
+    with at most `max_in_flight` pending tasks.
+    """
+    if n_jobs == 1:
+        _init_worker(renderer)
+        for a in args:
+            yield func(*a)
+        return
+
+    # the renderer (and the frames) are pickled for each worker
+    warn_if_copied(renderer.frames, n_jobs)
+    n_jobs = n_jobs or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * n_jobs
+    with ProcessPoolExecutor(n_jobs, initializer=_init_worker,
+                             initargs=(renderer,)) as pool:
+        queue = deque()
+        for a in args:
+            queue.append(pool.submit(func, *a))
+            if len(queue) >= max_in_flight:
+                yield queue.popleft().result()
+
+        while queue:
+            yield queue.popleft().result()
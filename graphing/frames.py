@@ -0,0 +1,584 @@
+"""
+Lazy frame sources, frame caching and background readahead for image sequences
+"""
+
+import os
+import mmap
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from recipes.logging import LoggingMixin
+from recipes.introspection.utils import get_module_name
+
+# module level logger
+logger = logging.getLogger(get_module_name(__file__))
+
+
+def is_memory_mapped(data):
+    """Check whether the buffer of array `data` is a memory mapped file"""
+    while data is not None:
+        if isinstance(data, (np.memmap, mmap.mmap)):
+            return True
+        data = getattr(data, 'base', None)
+    return False
+
+
+def get_memmap_spec(data):
+    """
+    Arguments (filename, offset, dtype, shape, order) for `np.memmap` that
+    re-open the contiguous memory mapped array `data` from its file. Returns
+    None if `data` is not memory mapped from a named file, or is not
+    contiguous.
+    """
+    if np.ma.isMA(data):
+        # the mask is not in the file
+        return None
+
+    if data.flags.c_contiguous:
+        order = 'C'
+    elif data.flags.f_contiguous:
+        order = 'F'
+    else:
+        return None
+
+    # find the array that owns the map
+    root = data
+    while not (isinstance(root, np.memmap) and
+               isinstance(root.base, mmap.mmap)):
+        root = getattr(root, 'base', None)
+        if root is None:
+            return None
+
+    if root.filename is None:
+        return None
+
+    offset = (root.offset + data.__array_interface__['data'][0]
+              - root.__array_interface__['data'][0])
+    return root.filename, offset, data.dtype, data.shape, order
+
+
+def _open_memmap(filename, offset, dtype, shape, order):
+    return MemmapFrames(np.memmap(filename, dtype, 'r', offset, shape, order))
+
+
+def warn_if_copied(frames, n_jobs):
+    """
+    Warn if the data of `frames` will be copied to each of `n_jobs` worker
+    processes, ie. if they are held in memory rather than backed by a file.
+    """
+    if n_jobs != 1 and frames.in_memory:
+        logger.warning('Image data of %s are in memory and will be copied to '
+                       'each worker process. Use a memory mapped array or a '
+                       'filename to avoid this, or set `n_jobs=1`.', frames)
+
+
+def map_chunks(func, frames, chunks, *args, n_jobs=1, max_in_flight=None):
+    """
+    Yield `func(frames, index, *args)` for each slice `index` in `chunks`, in
+    order, optionally computed in a process pool.
+
+    Frame sources backed by a file are pickled by reference, so workers read
+    their chunks from the file. For frames held in memory, only the data of
+    each chunk is sent to the worker computing it. At most `max_in_flight`
+    chunks are pending at any time, which bounds the memory held by queued
+    chunks and by results waiting to be consumed.
+
+    Parameters
+    ----------
+    func: callable
+        Picklable function computing the result for a chunk
+    frames: FrameSource
+    chunks: sequence of slice
+    args:
+        Extra arguments for `func`
+    n_jobs: int
+        Number of processes to use. With `n_jobs=1` (the default), chunks are
+        processed in the current process.
+    max_in_flight: int, optional
+        Defaults to twice the number of processes.
+    """
+    if n_jobs == 1:
+        for index in chunks:
+            yield func(frames, index, *args)
+        return
+
+    def split(index):
+        if frames.in_memory:
+            return ArrayFrames(frames.get_frames(index)), slice(None)
+        return frames, index
+
+    n_jobs = n_jobs or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * n_jobs
+    with ProcessPoolExecutor(n_jobs) as pool:
+        queue = deque()
+        for index in chunks:
+            queue.append(pool.submit(func, *split(index), *args))
+            if len(queue) >= max_in_flight:
+                yield queue.popleft().result()
+
+        while queue:
+            yield queue.popleft().result()
+
+
+def as_frame_source(data):
+    """
+    Wrap `data` in the appropriate `FrameSource` adapter without reading
+    the frames into memory.
+
+    Parameters
+    ----------
+    data: str, Path, np.ndarray, np.memmap, FrameSource, or array-like
+        The image stack. Strings and Paths are interpreted as filenames of
+        `.npy` or FITS files, which are opened as memory maps. Objects
+        exposing `shape`, `dtype` and `__getitem__` (eg. zarr, h5py or dask
+        arrays) are read one chunk at a time.
+
+    Returns
+    -------
+    FrameSource
+    """
+    if isinstance(data, FrameSource):
+        return data
+
+    if isinstance(data, (str, Path)):
+        path = Path(data)
+        if path.suffix == '.npy':
+            return NpyFrames(path)
+        if path.suffix.lower() in ('.fits', '.fit', '.fts', '.fz'):
+            return FitsFrames(path)
+        raise ValueError('Unrecognized file format: %r' % path.suffix)
+
+    if isinstance(data, np.ndarray):
+        if is_memory_mapped(data):
+            return MemmapFrames(data)
+        return ArrayFrames(data)
+
+    if all(hasattr(data, _) for _ in ('shape', 'dtype', '__getitem__')):
+        return ChunkedFrames(data)
+
+    return ArrayFrames(np.ma.asarray(data))
+
+
+class FrameSource(object):
+    """
+    Minimal protocol for lazy access to image sequences. Subclasses implement
+    `shape`, `dtype` and `get_frame`, and optionally a faster `get_frames`.
+    """
+
+    # whether pickling (eg. for worker processes) copies all the data
+    in_memory = False
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get_frame(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            # read frames, then index within them
+            key, *rest = key
+            if isinstance(key, slice):
+                rest = [slice(None)] + rest
+            return self[key][tuple(rest)]
+
+        if isinstance(key, slice):
+            return self.get_frames(key)
+
+        return self.get_frame(key)
+
+    def __repr__(self):
+        return '{}(shape={}, dtype={})'.format(self.__class__.__name__,
+                                               self.shape, self.dtype)
+
+    @property
+    def shape(self):
+        raise NotImplementedError
+
+    @property
+    def dtype(self):
+        raise NotImplementedError
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def get_frame(self, i):
+        """Read a single frame"""
+        raise NotImplementedError
+
+    def get_region(self, i, rows, cols):
+        """
+        Read the part of frame `i` selected by the slices `rows` and `cols`.
+        If `i` is a slice, the parts of the selected frames are returned as a
+        3D array. Subclasses that can read part of a frame override this.
+        """
+        if isinstance(i, slice):
+            regions = [self.get_region(j, rows, cols)
+                       for j in range(len(self))[i]]
+            if not regions:
+                nrows, ncols = self.shape[1:]
+                return np.empty((0, len(range(nrows)[rows]),
+                                 len(range(ncols)[cols])), self.dtype)
+            if any(np.ma.isMA(region) for region in regions):
+                return np.ma.stack(regions)
+            return np.stack(regions)
+
+        return self.get_frame(i)[rows, cols]
+
+    def get_frames(self, index=slice(None)):
+        """Read the frames selected by slice `index` as a 3D array"""
+        frames = [self.get_frame(i) for i in range(len(self))[index]]
+        if not frames:
+            return np.empty((0,) + self.shape[1:], self.dtype)
+        if any(np.ma.isMA(frame) for frame in frames):
+            return np.ma.stack(frames)
+        return np.stack(frames)
+
+
+class ArrayFrames(FrameSource):
+    """Frames from an array already in memory"""
+
+    in_memory = True
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def get_frame(self, i):
+        return self.data[i]
+
+    def get_region(self, i, rows, cols):
+        return self.data[i, rows, cols]
+
+    def get_frames(self, index=slice(None)):
+        return self.data[index]
+
+
+class MemmapFrames(ArrayFrames):
+    """
+    Frames from a memory mapped array. Frames are read from disk when
+    requested and returned as in-memory arrays.
+    """
+
+    @property
+    def in_memory(self):
+        return get_memmap_spec(self.data) is None
+
+    def __reduce__(self):
+        # re-open the memory map when unpickling (eg. in worker processes)
+        # instead of copying the data
+        spec = get_memmap_spec(self.data)
+        if spec is None:
+            return ArrayFrames, (np.array(self.data),)
+        return _open_memmap, spec
+
+    def get_frame(self, i):
+        return np.array(self.data[i])
+
+    def get_region(self, i, rows, cols):
+        return np.array(self.data[i, rows, cols])
+
+    def get_frames(self, index=slice(None)):
+        return np.array(self.data[index])
+
+
+class NpyFrames(MemmapFrames):
+    """Frames from a `.npy` file opened as a memory map"""
+
+    in_memory = False
+
+    def __init__(self, filename):
+        self.filename = Path(filename)
+        MemmapFrames.__init__(self, np.load(self.filename, mmap_mode='r'))
+
+    def __reduce__(self):
+        return self.__class__, (self.filename,)
+
+
+class FitsFrames(MemmapFrames):
+    """Frames from the first data HDU of a FITS file opened as a memory map"""
+
+    in_memory = False
+
+    def __init__(self, filename):
+        from astropy.io import fits
+
+        self.filename = Path(filename)
+        MemmapFrames.__init__(self, fits.getdata(self.filename, memmap=True))
+
+    def __reduce__(self):
+        return self.__class__, (self.filename,)
+
+
+class ChunkedFrames(FrameSource):
+    """
+    Frames from any array-like object exposing `shape`, `dtype` and
+    `__getitem__` (eg. zarr, h5py or dask arrays).  Only the requested frames
+    are read from the underlying store.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def shape(self):
+        return tuple(self.data.shape)
+
+    @property
+    def dtype(self):
+        return np.dtype(self.data.dtype)
+
+    def get_frame(self, i):
+        return np.asanyarray(self.data[i])
+
+    def get_region(self, i, rows, cols):
+        return np.asanyarray(self.data[i, rows, cols])
+
+    def get_frames(self, index=slice(None)):
+        return np.asanyarray(self.data[index])
+
+
+def get_nbytes(frame):
+    """
+    Memory footprint of a (possibly masked) array, or a tuple of arrays, in
+    bytes
+    """
+    if isinstance(frame, tuple):
+        return sum(map(get_nbytes, frame))
+
+    n = getattr(frame, 'nbytes', 0)
+    mask = np.ma.getmask(frame)
+    if mask is not np.ma.nomask:
+        n += mask.nbytes
+    return n
+
+
+class FrameCache(LoggingMixin):
+    """
+    Bounded least-recently-used cache of image frames with background
+    readahead.
+
+    Frames are loaded by calling `loader(i)`. Every request for a frame
+    schedules the next `readahead` frames in the direction of travel (forward
+    or backward, depending on the previously requested index) to be loaded
+    in a thread pool, so that I/O overlaps with rendering of the current frame.
+    Frames that are requested while still being fetched in the background
+    count as hits.
+    """
+
+    def __init__(self, loader, n_frames=None, max_bytes=2 ** 28, readahead=4,
+                 n_workers=2, wrap=True):
+        """
+        Parameters
+        ----------
+        loader: callable
+            Function that returns the frame for a given index.
+        n_frames: int, optional
+            Total number of frames. Readahead is restricted to (or wrapped
+            around) this number if given.
+        max_bytes: int
+            Memory budget for cached frames in bytes.
+        readahead: int
+            Number of frames to prefetch beyond the one being requested. Set
+            to 0 to disable prefetching.
+        n_workers: int
+            Number of threads used for prefetching.
+        wrap: bool
+            Whether readahead wraps around to the start (end) of the sequence
+            when scrolling past the end (start).
+        """
+        self.loader = loader
+        self.n_frames = n_frames
+        self.max_bytes = int(max_bytes)
+        self.readahead = int(readahead)
+        self.n_workers = int(n_workers)
+        self.wrap = bool(wrap)
+
+        # counters
+        self.hits = self.misses = 0
+        self.nbytes = 0
+
+        self._frames = OrderedDict()
+        self._pending = {}
+        self._lock = threading.RLock()
+        self._last = None
+        self._executor = None
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        return key in self._frames
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __repr__(self):
+        return ('{0.__class__.__name__}(frames={1}, nbytes={0.nbytes}, '
+                'hits={0.hits}, misses={0.misses})').format(self, len(self))
+
+    @property
+    def executor(self):
+        if self._executor is None and self.n_workers:
+            self._executor = ThreadPoolExecutor(
+                    self.n_workers, thread_name_prefix=self.__class__.__name__)
+        return self._executor
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def info(self):
+        """Cache statistics useful for sizing the memory budget"""
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    hit_rate=self.hit_rate,
+                    frames=len(self),
+                    pending=len(self._pending),
+                    nbytes=self.nbytes,
+                    max_bytes=self.max_bytes)
+
+    def is_pending(self, key):
+        """Whether frame `key` is currently being loaded in the background"""
+        return key in self._pending
+
+    def get(self, key, prefetch=True):
+        """
+        Get frame `key` from the cache, loading it if necessary.
+
+        Parameters
+        ----------
+        key: int
+            Frame index
+        prefetch: bool
+            Whether to schedule readahead of the subsequent frames.
+
+        Returns
+        -------
+        np.ndarray
+        """
+        future = frame = None
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                frame = self._frames[key]
+                self.hits += 1
+            elif key in self._pending:
+                future = self._pending[key]
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if prefetch and self.readahead:
+            self.prefetch(self.get_readahead(key))
+
+        if future is not None:
+            frame = future.result()
+
+        if frame is None:
+            frame = self._load(key)
+
+        return frame
+
+    def get_readahead(self, key):
+        """Indices of the frames following `key` in the direction of travel"""
+        step = -1 if (self._last is not None and key < self._last) else 1
+        self._last = key
+
+        keys = key + step * np.arange(1, self.readahead + 1)
+        if self.n_frames is None:
+            keys = keys[keys >= 0]
+        elif self.wrap:
+            keys = np.unique(keys % self.n_frames)
+        else:
+            keys = keys[(keys >= 0) & (keys < self.n_frames)]
+        return keys.tolist()
+
+    def prefetch(self, keys):
+        """Load frames `keys` in the background"""
+        if not self.executor:
+            return
+
+        with self._lock:
+            for key in keys:
+                if (key in self._frames) or (key in self._pending):
+                    continue
+                self._pending[key] = self.executor.submit(self._fetch, key)
+
+    def cancel(self, keys=None):
+        """
+        Cancel background loading of frames `keys` (all frames if not given)
+        that has not started yet.
+        """
+        with self._lock:
+            keys = list(self._pending) if keys is None else keys
+            for key in keys:
+                future = self._pending.get(key)
+                if future is not None and future.cancel():
+                    del self._pending[key]
+
+    def _fetch(self, key):
+        try:
+            return self._load(key)
+        except Exception:
+            self.logger.exception('Failed to prefetch frame %s.', key)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _load(self, key):
+        frame = self.loader(key)
+        if isinstance(frame, np.memmap):
+            # read the data now, not when the frame is first used
+            frame = np.array(frame)
+
+        self.put(key, frame)
+        return frame
+
+    def put(self, key, frame):
+        """Add `frame` to the cache, evicting old frames if needed"""
+        n = get_nbytes(frame)
+        if n > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._frames:
+                return
+
+            self._frames[key] = frame
+            self.nbytes += n
+            while self.nbytes > self.max_bytes:
+                _, old = self._frames.popitem(last=False)
+                self.nbytes -= get_nbytes(old)
+
+    def clear(self):
+        """Empty the cache and reset counters"""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._frames.clear()
+            self.nbytes = self.hits = self.misses = 0
+            self._last = None
+
+    def close(self):
+        """Empty the cache and stop the worker threads"""
+        self.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
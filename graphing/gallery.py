@@ -0,0 +1,273 @@
+"""
+Paged, lazily loaded thumbnail grids for browsing large collections of images
+"""
+
+from pathlib import Path
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.gridspec import GridSpec
+
+from recipes.logging import LoggingMixin
+
+from .frames import FrameCache
+from .pyramid import block_average
+from .utils import get_percentile_limits
+
+
+def load_image(item):
+    """
+    Load an image from `item`, which may be an array, a callable that returns
+    an array, or the filename of a `.npy` or FITS file (which are opened as
+    memory maps), or any other image format readable by matplotlib.
+    """
+    if callable(item):
+        return item()
+
+    if isinstance(item, (str, Path)):
+        path = Path(item)
+        suffix = path.suffix.lower()
+        if suffix == '.npy':
+            return np.load(path, mmap_mode='r')
+        if suffix in ('.fits', '.fit', '.fts', '.fz'):
+            from astropy.io import fits
+            return fits.getdata(path, memmap=True)
+        return plt.imread(path)
+
+    return item
+
+
+def make_thumbnail(image, size=128, plims=(0.25, 99.75)):
+    """
+    Block-averaged thumbnail of `image` with its largest dimension at most
+    `size` pixels.
+
+    Returns
+    -------
+    thumb: np.ndarray
+        The thumbnail
+    factor: int
+        Downsampling factor
+    clim: np.ndarray
+        Colour limits from the percentiles `plims` of the thumbnail pixels
+    """
+    image = np.ma.asarray(image).squeeze()
+    factor = max(int(np.ceil(max(image.shape[:2]) / size)), 1)
+    thumb = image
+    if factor > 1:
+        thumb = block_average(image, factor)
+        if image.ndim == 3 and image.dtype.kind in 'iu':
+            # RGB(A) images with integer channels should keep their dtype
+            thumb = thumb.round().astype(image.dtype)
+    values = np.ma.compressed(np.ma.masked_invalid(thumb))
+    clim = get_percentile_limits(values, plims) if values.size else (0, 1)
+    return thumb, factor, clim
+
+
+class ImageGallery(LoggingMixin):
+    """
+    Paged, virtualised grid of image thumbnails.
+
+    Only the axes for a single page are created, and they are reused for each
+    page. Images are loaded and downsampled to thumbnails in a background
+    thread pool, and kept in a bounded LRU cache. Thumbnails for the next page
+    are prefetched. A canvas timer fills in the thumbnails as they become
+    available. Full resolution data is only loaded when a thumbnail is opened
+    (by double clicking on it).
+
+    Use the arrow / page up / page down keys to change pages.
+    """
+
+    def __init__(self, images, layout=(4, 6), titles=(), figsize=None,
+                 plims=(0.25, 99.75), thumb_size=128, cache_bytes=2 ** 27,
+                 n_workers=4, poll_interval=50, **kws):
+        """
+        Parameters
+        ----------
+        images: sequence
+            Arrays, filenames or callables that load the images. See
+            `load_image`.
+        layout: tuple
+            Number of rows and columns on each page
+        titles: sequence of str, optional
+            Titles for the images
+        figsize: tuple, optional
+            Size of the figure
+        plims: tuple
+            Percentile limits for the colour scale of each thumbnail
+        thumb_size: int
+            Maximum size (in pixels) of the thumbnails
+        cache_bytes: int
+            Memory budget for cached thumbnails
+        n_workers: int
+            Number of threads for loading thumbnails
+        poll_interval: int
+            Interval in milliseconds between checks for loaded thumbnails
+        kws:
+            Passed to `ax.imshow` for each thumbnail
+        """
+        self.images = images
+        self.titles = list(titles)
+        self.plims = plims
+        self.thumb_size = int(thumb_size)
+        self.n_rows, self.n_cols = layout
+        self.page = 0
+        self.cache = FrameCache(self.load_thumbnail, len(images), cache_bytes,
+                                readahead=0, n_workers=n_workers)
+
+        # create the axes for a single page
+        self.figure = fig = plt.figure(figsize=figsize)
+        gs = GridSpec(self.n_rows, self.n_cols, hspace=0.1, wspace=0.05,
+                      left=0.02, right=0.98, bottom=0.02, top=0.95)
+        kws.setdefault('origin', 'lower')
+        self.axes, self.art, self.texts = [], [], []
+        for j, k in np.ndindex(self.n_rows, self.n_cols):
+            ax = fig.add_subplot(gs[j, k])
+            ax.set(xticks=[], yticks=[])
+            self.axes.append(ax)
+            self.art.append(ax.imshow(np.ma.masked_all((1, 1)), **kws))
+            self.texts.append(ax.set_title('', fontsize='small'))
+
+        self.info_text = fig.text(0.5, 0.985, '', ha='center', va='top')
+        self.displays = {}
+        self._pending = {}
+
+        self.timer = fig.canvas.new_timer(interval=poll_interval)
+        self.timer.add_callback(self._poll)
+        fig.canvas.mpl_connect('key_press_event', self._on_key)
+        fig.canvas.mpl_connect('button_press_event', self._on_click)
+
+        self.show_page(0)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(images={len(self)}, '
+                f'page={self.page + 1}/{self.n_pages})')
+
+    @property
+    def page_size(self):
+        return self.n_rows * self.n_cols
+
+    @property
+    def n_pages(self):
+        return -(-len(self) // self.page_size)
+
+    def get_indices(self, page):
+        """Indices of the images on `page`"""
+        start = page * self.page_size
+        return range(start, min(start + self.page_size, len(self)))
+
+    def load(self, i):
+        """Load the full resolution image `i`"""
+        return load_image(self.images[i])
+
+    def load_thumbnail(self, i):
+        """Load image `i` and create its thumbnail"""
+        return make_thumbnail(self.load(i), self.thumb_size, self.plims)
+
+    def get_title(self, i):
+        title = self.titles[i] if i < len(self.titles) else ''
+        return f'{i}: {title}' if title else str(i)
+
+    # ------------------------------------------------------------------------
+    def show_page(self, page):
+        """Display thumbnails for `page`, loading them in the background"""
+        self.page = page = int(np.clip(page, 0, self.n_pages - 1))
+        indices = self.get_indices(page)
+
+        # load the thumbnails for this page first, then those for the next
+        self.cache.prefetch(indices)
+        self.cache.prefetch(self.get_indices(page + 1))
+
+        self._pending = {}
+        for slot, ax in enumerate(self.axes):
+            ax.set_visible(slot < len(indices))
+            if slot >= len(indices):
+                continue
+
+            i = indices[slot]
+            self.texts[slot].set_text(self.get_title(i))
+            if i in self.cache:
+                self.set_thumbnail(slot, self.cache.get(i, prefetch=False))
+            else:
+                self._pending[slot] = i
+                self.art[slot].set_data(np.ma.masked_all((1, 1)))
+
+        self.info_text.set_text(f'page {page + 1} / {self.n_pages}')
+        if self._pending:
+            self.timer.start()
+
+        self.figure.canvas.draw_idle()
+
+    def next_page(self):
+        self.show_page(self.page + 1)
+
+    def previous_page(self):
+        self.show_page(self.page - 1)
+
+    def set_thumbnail(self, slot, thumbnail):
+        thumb, factor, clim = thumbnail
+        nrows, ncols = np.multiply(thumb.shape, factor) - 0.5
+        image = self.art[slot]
+        image.set_data(thumb)
+        image.set_clim(*clim)
+        # display in the pixel coordinates of the full resolution image
+        extent = (-0.5, ncols, -0.5, nrows)
+        if image.origin == 'upper':
+            extent = (-0.5, ncols, nrows, -0.5)
+        image.set_extent(extent)
+        self.axes[slot].set(xlim=extent[:2], ylim=extent[2:])
+
+    def _poll(self):
+        done = [slot for slot, i in self._pending.items()
+                if not self.cache.is_pending(i)]
+        for slot in done:
+            i = self._pending.pop(slot)
+            if i in self.cache:
+                self.set_thumbnail(slot, self.cache.get(i, prefetch=False))
+            else:
+                self.logger.warning('Could not load thumbnail for image %i.',
+                                    i)
+
+        if not self._pending:
+            self.timer.stop()
+
+        if done:
+            self.figure.canvas.draw_idle()
+
+    # ------------------------------------------------------------------------
+    def open(self, i, **kws):
+        """
+        Load the full resolution image `i` and display it in a new figure.
+
+        Returns
+        -------
+        ImageDisplay
+        """
+        from .imagine import ImageDisplay
+
+        kws.setdefault('title', self.get_title(i))
+        self.displays[i] = display = ImageDisplay(self.load(i), **kws)
+        display.figure.canvas.draw_idle()
+        return display
+
+    def _on_key(self, event):
+        if event.key in ('right', 'pagedown', 'down'):
+            self.next_page()
+        elif event.key in ('left', 'pageup', 'up'):
+            self.previous_page()
+        elif event.key == 'home':
+            self.show_page(0)
+        elif event.key == 'end':
+            self.show_page(self.n_pages - 1)
+
+    def _on_click(self, event):
+        if not event.dblclick or event.inaxes not in self.axes:
+            return
+
+        slot = self.axes.index(event.inaxes)
+        indices = self.get_indices(self.page)
+        if slot < len(indices):
+            self.open(indices[slot])
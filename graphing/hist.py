@@ -3,7 +3,7 @@ import matplotlib.pyplot as plt
 from recipes.logging import LoggingMixin
 
 from graphing.imagine import _sanitize_data
-from graphing.utils import percentile
+from graphing.utils import percentile, get_bar_verts
 
 
 def get_bins(data, bins, range=None):
@@ -24,6 +24,9 @@ class Histogram(LoggingMixin):
     def __init__(self, data, bins=bins, range=None, plims=None, **kws):
         # create
         super().__init__()
+        # preallocated vertex buffer for the bars
+        self.bars = None
+        self._verts = np.empty((0, 5, 2))
         # run
         self(data, bins, range, plims, **kws)
 
@@ -37,9 +40,13 @@ class Histogram(LoggingMixin):
         self.bin_edges = self.auto_bins(data, bins, range)
         self.counts, _ = np.histogram(data, self.bin_edges, range, **kws)
 
+        # update bars if they have been created
+        if self.bars is not None:
+            self.update_bars()
+
     @property
     def bin_centers(self):
-        return self.bin_edges[:-1] + np.diff(self.bin_edges)
+        return self.bin_edges[:-1] + np.diff(self.bin_edges) / 2
 
     @property
     def n(self):
@@ -49,29 +56,41 @@ class Histogram(LoggingMixin):
         return get_bins(data, bins, range)
 
     def get_verts(self):
-        """vertices for vertical bars"""
-        if len(self.counts) == 0:
-            # empty histogram
-            return []
-
-        x01 = [self.bin_edges[:-1], self.bin_edges[1:]]
-        x = x01 + x01[::-1]
-
-        ymin = 0
-        y = list(np.full((2, self.n), ymin)) + [self.counts] * 2
-
-        return np.array([x, y]).T
+        """
+        Vertices for vertical bars. These are written into a preallocated
+        (n, 5, 2) array which is only reallocated when the number of bins
+        changes.
+        """
+        self._verts = get_bar_verts(self.counts, self.bin_edges, self._verts)
+        return self._verts
 
     def get_bars(self, **kws):
         # create collection
 
         from matplotlib.collections import PolyCollection
-        return PolyCollection(self.get_verts(),
+        return PolyCollection(self.get_verts(), closed=False,
                               array=self.counts / self.counts.max(),
                               **kws)
 
+    def update_bars(self):
+        """Update the bars in place after the histogram has been recomputed"""
+        previous = self._verts
+        verts = self.get_verts()
+        if verts is previous:
+            # paths are views of the vertex buffer
+            paths = self.bars.get_paths()
+            if len(paths) and np.shares_memory(paths[0].vertices, verts):
+                self.bars.stale = True
+            else:
+                self.bars.set_verts(verts, closed=False)
+        else:
+            self.bars.set_verts(verts, closed=False)
+
+        self.bars.set_array(self.counts / self.counts.max())
+        return self.bars
+
     def plot(self, ax, **kws):
-        bars = self.get_bars(**kws)
+        self.bars = bars = self.get_bars(**kws)
         ax.add_collection(bars)
         return bars
 
@@ -5,32 +5,51 @@ from copy import deepcopy
 import functools
 import logging
 import warnings
-import time
+from pathlib import Path
+from contextlib import nullcontext
 from collections import Callable
 
 import numpy as np
 import matplotlib.pylab as plt
 from IPython import embed
 from matplotlib import ticker
+from matplotlib.colors import Normalize
 from matplotlib.figure import Figure
 from matplotlib.gridspec import GridSpec
 from matplotlib.widgets import Slider
+from matplotlib.backend_bases import TimerBase
 from mpl_toolkits.mplot3d import Axes3D
 from mpl_toolkits.mplot3d.art3d import Line3DCollection
 from mpl_toolkits.axes_grid1 import AxesGrid, make_axes_locatable
 
 from recipes.logging import LoggingMixin
 from recipes.introspection.utils import get_module_name
-# from .zscale import zrange
 from .sliders import TripleSliders
+from .frames import FrameCache, FrameSource, ArrayFrames, as_frame_source
 from .draggable.machinery import Observers
 
 # from astropy.visualization import mpl_normalize  # import ImageNormalize as _
 from astropy.visualization.mpl_normalize import ImageNormalize
-from astropy.visualization.interval import BaseInterval
+from astropy.visualization.interval import (BaseInterval,
+                                            AsymmetricPercentileInterval)
+from astropy.visualization.interval import \
+    ZScaleInterval as AstropyZScaleInterval
 from astropy.visualization.stretch import BaseStretch
 
-from .utils import get_percentile_limits
+from .utils import (get_percentile_limits, estimate_percentile_limits,
+                    get_bar_verts, extract_cutouts, strided_sample)
+from .clims import (compute_clims, limits_cache, params_key, fingerprint,
+                    DEFAULT_CHUNK_SIZE)
+from .stats import CumulativeHistogram, PixelStats
+from .sketch import QuantileSketch
+from .pyramid import ImagePyramid
+from .tiles import TiledImage, TiledImageView
+from .playback import Player
+from .background import BackgroundJobs, is_interactive
+from .roi import SummedAreaTable, RegionSelector, light_curve
+from .projections import project, get_params
+from .zscale import ZScaleInterval
+from . import lut
 
 import itertools as itt
 
@@ -69,35 +88,66 @@ def move_axes(ax, x, y):
     ax.set_position((l + x, b + y, w, h))
 
 
-def get_norm(image, interval, stretch):
+def get_norm(image, interval, stretch, cache=limits_cache):
     """
+    Image normalization from an interval and stretch.
 
     Parameters
     ----------
-    image
-    interval
-    stretch
+    image: np.ndarray or PixelStats
+    interval: str, tuple or BaseInterval
+        Name of the interval (and optional parameters), or the instance.
+    stretch: str, tuple or BaseStretch
+        Name of the stretch (and optional parameters), or the instance.
+    cache: clims.LimitsCache, optional
+        Cache for the interval limits, so that the interval is only run once
+        for images that are displayed repeatedly. Use None to always compute
+        the limits.
 
     Returns
     -------
-
+    ImageNormalize
     """
+    stats = PixelStats.of(image)
+    image = stats.data
+
     # choose colour interval algorithm based on data type
     if image.dtype.kind == 'i':  # integer array
-        if image.ptp() < 1000:
+        if stats.max - stats.min < 1000:
             interval = 'minmax'
 
     # determine colour transform from `interval` and `stretch`
     if isinstance(interval, str):
         interval = interval,
-    interval = Interval.from_name(*interval)
+    if isinstance(interval, BaseInterval):
+        pass
+    elif interval[0].lower() == 'zscale':
+        # vectorised implementation with batch support
+        interval = ZScaleInterval(*interval[1:])
+    else:
+        interval = Interval.from_name(*interval)
     #
     if isinstance(stretch, str):
         stretch = stretch,
-    stretch = Stretch.from_name(*stretch)
+    if not isinstance(stretch, BaseStretch):
+        stretch = Stretch.from_name(*stretch)
 
     # Create an ImageNormalize object
-    return ImageNormalize(image, interval, stretch=stretch)
+    if cache is None:
+        vmin, vmax = stats.get_limits(interval)
+    else:
+        vmin, vmax = cache.get(image, lambda: stats.get_limits(interval),
+                               interval)
+    return ImageNormalize(vmin=vmin, vmax=vmax, interval=interval,
+                          stretch=stretch)
+
+
+def get_colour_scaler(plims=(0.25, 99.75), **kws):
+    """
+    Function that computes colour limits for image data from the percentile
+    limits `plims`. Remaining keywords are returned unchanged.
+    """
+    return functools.partial(get_percentile_limits, plims=plims), kws
 
 
 def get_screen_size_inches():
@@ -203,8 +253,54 @@ def set_clim_connected(x, y, artist, sliders):
     return artist
 
 
+class SharedNorm(LoggingMixin):
+    """
+    A single normalization object shared by many images. Changing the colour
+    limits updates the norm once with its callbacks blocked, so that the
+    update costs O(1) Python work instead of a `changed` callback chain for
+    every image. Only the images that are currently visible are marked for
+    redrawing.
+    """
+
+    def __init__(self, norm=None):
+        self.norm = Normalize() if norm is None else norm
+        self.artists = []
+
+    def __len__(self):
+        return len(self.artists)
+
+    def add(self, artist):
+        """Add an image artist that uses the shared norm"""
+        if artist.norm is not self.norm:
+            artist.set_norm(self.norm)
+        self.artists.append(artist)
+
+    def get_visible(self):
+        """The images that are currently visible in their figure"""
+        return [art for art in self.artists
+                if art.get_visible() and art.axes is not None
+                and art.axes.get_visible() and art.figure is not None]
+
+    def set_clim(self, vmin, vmax):
+        """
+        Set the colour limits for all images.
+
+        Returns
+        -------
+        list
+            The visible images, which need to be redrawn
+        """
+        with self.norm.callbacks.blocked():
+            self.norm.vmin, self.norm.vmax = vmin, vmax
+
+        visible = self.get_visible()
+        for art in visible:
+            art.stale = True
+        return visible
+
+
 def plot_image_grid(images, layout=(), titles=(), figsize=None, plims=None,
-                    clim_all=False):
+                    clim_all=False, paged=False, **kws):
     """
 
     Parameters
@@ -217,11 +313,26 @@ def plot_image_grid(images, layout=(), titles=(), figsize=None, plims=None,
         images.  Choose this if your images are all normalised to roughly the
         same scale. If False clims will be computed individually and the
         colourbar sliders will be disabled.
+    paged: bool
+        Show the images in a paged, virtualised grid of thumbnails that are
+        loaded in the background. `images` may then also contain filenames or
+        loader functions. In this case, `layout` is the grid layout of a
+        single page, and a `gallery.ImageGallery` is returned. Extra keywords
+        are passed to `ImageGallery`.
+    kws:
+        Passed to `ImageDisplay` for each image (eg. `cmap`), or to
+        `ImageGallery` if `paged`.
 
     Returns
     -------
 
     """
+    if paged:
+        from .gallery import ImageGallery
+
+        if plims is not None:
+            kws['plims'] = plims
+        return ImageGallery(images, layout or (4, 6), titles, figsize, **kws)
 
     # TODO: plot individual histograms as well as full hist
     # todo: guess fig size
@@ -257,11 +368,30 @@ def plot_image_grid(images, layout=(), titles=(), figsize=None, plims=None,
                   top=0.98
                   )  # todo: maybe better with tight layout.
 
+    # with an interactive backend, colour limits and histograms of large
+    # images are computed in the background by a job runner shared by all
+    # images, which is only created if needed
+    interactive = is_interactive(fig.canvas)
+    jobs = None
+
+    def get_jobs():
+        nonlocal jobs
+        if jobs is None:
+            jobs = BackgroundJobs(fig.canvas, n_workers=4)
+        return jobs
+
     # create colourbar and pixel histogram axes
-    kws = dict(origin='lower left',
-               cbar=False, sliders=False, hist=False,
-               clim=not clim_all,
-               plims=plims)
+    display_kws = dict(origin='lower',
+                       cbar=False, sliders=False, hist=False,
+                       clim=not clim_all,
+                       plims=plims)
+    display_kws.update(kws)
+
+    # all images share a single norm if the colour limits are linked
+    shared = None
+    if clim_all:
+        shared = SharedNorm()
+        display_kws['norm'] = shared.norm
 
     art = []
     w = len(str(int(n)))
@@ -274,18 +404,22 @@ def plot_image_grid(images, layout=(), titles=(), figsize=None, plims=None,
         # last
         if (i == n - 1) and clim_all:
             # do colourbar + pixel histogram if clim all
-            kws.update(cbar=True, sliders=True, hist=True,
-                       cax=fig.add_subplot(
-                               gs[:, -(cbar_size + hist_size) * n_cols:]),
-                       hax=fig.add_subplot(gs[:, -hist_size * n_cols:]))
+            display_kws.update(
+                    cbar=True, sliders=True, hist=True,
+                    cax=fig.add_subplot(
+                            gs[:, -(cbar_size + hist_size) * n_cols:]),
+                    hax=fig.add_subplot(gs[:, -hist_size * n_cols:]))
 
         # create axes!
         axes[j, k] = ax = fig.add_subplot(
                 gs[j:j + 1, (100 * k):(100 * (k + 1))])
 
         # plot image. use imshow for all but last
-
-        imd = ImageDisplay(images[i], ax=ax, **kws)
+        background = (interactive and
+                      np.size(images[i]) > ImageDisplay.async_threshold)
+        display_kws.update(async_stats=background,
+                           jobs=get_jobs() if background else None)
+        imd = ImageDisplay(images[i], ax=ax, **display_kws)
         artist = imd.imagePlot
         # else:
         #     artist = ax.imshow(images[i], **kws)
@@ -315,48 +449,50 @@ def plot_image_grid(images, layout=(), titles=(), figsize=None, plims=None,
     # fig.colorbar(imd.imagePlot, cax)
 
     if clim_all:
-        # connect all image clims to the sliders.
+        # link all image clims to the sliders. Moving the sliders sets the
+        # shared norm once, and redraws only the visible images
         for artist in art:
-            # noinspection PyUnboundLocalVariable
-            imd.sliders.lower.on_move.add(set_clim_connected, artist,
-                                          imd.sliders)
-            imd.sliders.upper.on_move.add(set_clim_connected, artist,
-                                          imd.sliders)
-
-        # The same as above can be accomplished in pure matplolib as follows:
-        # https://matplotlib.org/3.1.1/gallery/images_contours_and_fields/multi_image.html
-        # Make images respond to changes in the norm of other images (e.g. via
-        # the "edit axis, curves and images parameters" GUI on Qt), but be
-        # careful not to recurse infinitely!
-        # def update(changed_image):
-        #     for im in art:
-        #         if (changed_image.get_cmap() != im.get_cmap()
-        #                 or changed_image.get_clim() != im.get_clim()):
-        #             im.set_cmap(changed_image.get_cmap())
-        #             im.set_clim(changed_image.get_clim())
-        #
-        # for im in art:
-        #     im.callbacksSM.connect('changed', update)
-
-        # update clim for all plots
-
-        # for the general case where images are non-uniform shape, we have to
-        # flatten them all to get the colour percentile values.
-        # TODO: will be more eficcient for large number of images to sample
-        #  evenly from each image
-        pixels = []
-        for im in images:
-            pixels.extend(im.compressed() if np.ma.isMA(im) else im.ravel())
-        pixels = np.array(pixels)
+            shared.add(artist)
+        # noinspection PyUnboundLocalVariable
+        imd.linked_norm = shared
+
+        # the histogram shows the pixels of all images, not only the last
+        if imd.jobs is not None:
+            imd.jobs.cancel(imd._channel('image'))
+
+        def show(sketch):
+            clim = sketch.percentile(imd._default_plims if plims is None
+                                     else plims)
+            imd.sliders.set_positions(clim, draw_on=False)  # no canvas yet!
+
+            # Update histogram with data from all images
+            imd.histogram.set_array(CumulativeHistogram.from_sketch(sketch))
+            imd.histogram.autoscale_view()
+
+        # for the general case where images are non-uniform shape, stream
+        # the pixels of all images into a quantile sketch from which the
+        # colour limits and histogram are estimated
+        if interactive and sum(map(np.size, images)) > imd.async_threshold:
+            # show estimates from a sample of each image while sketching all
+            # the pixels in the background
+            show(sketch_images(images, imd.clim_n_preview))
+            get_jobs().submit('grid', sketch_images, images, callback=show)
+        else:
+            show(sketch_images(images))
 
-        clim = imd.clim_from_data(pixels, plims=plims)
-        imd.sliders.set_positions(clim, draw_on=False)  # no canvas yet!
+    return fig, axes, imd
 
-        # Update histogram with data from all images
-        imd.histogram.set_array(pixels)
-        imd.histogram.autoscale_view()
 
-    return fig, axes, imd
+def sketch_images(images, n_samples=None):
+    """
+    Stream the pixels of all `images` (or a strided sample of `n_samples`
+    pixels of each) into a `QuantileSketch`.
+    """
+    sketch = QuantileSketch()
+    for image in images:
+        sketch.update(image if n_samples is None else
+                      strided_sample(image, n_samples))
+    return sketch
 
 
 class FromNameMixin(object):
@@ -389,8 +525,9 @@ class FromNameMixin(object):
 
 class Interval(BaseInterval, FromNameMixin):
     def get_limits(self, values):
-        print('hi')  # FIXME: this is missed
-        return BaseInterval.get_limits(self, _sanitize_data(values))
+        if not isinstance(values, PixelStats):
+            values = PixelStats(values)
+        return BaseInterval.get_limits(self, values.values)
 
 
 class Stretch(BaseStretch, FromNameMixin):
@@ -431,7 +568,7 @@ class ColourBarHistogram(LoggingMixin):  # PixelHistogram
 
     # todo. better with data?
     def __init__(self, ax, image_plot, orientation='horizontal', use_blit=True,
-                 outside_colour=None, outside_alpha=0.5, **kws):
+                 outside_colour=None, outside_alpha=0.5, data=None, **kws):
         """
         Display a histogram for colour values in an image.
 
@@ -441,6 +578,9 @@ class ColourBarHistogram(LoggingMixin):  # PixelHistogram
         image_plot
         use_blit
         outside_colour
+        data: array-like, optional
+            Pixel values to compute the histogram from. Defaults to the array
+            of `image_plot`.
         kws
         """
 
@@ -477,13 +617,19 @@ class ColourBarHistogram(LoggingMixin):  # PixelHistogram
         self.cmap.set_under(under)
 
         # compute histogram
+        self.table = self.bars = None
         self.bins = self.counts = self.bin_edges = self.bin_centers = ()
-        self.compute(self.get_array())
+        # vertex buffer for the bars, and the state that determined the
+        # current bar colours
+        self._verts = np.empty((0, 5, 2))
+        self._shared_verts = False
+        self._colour_state = None
+        self.compute(self.get_array() if data is None else data)
 
         # create collection
-        self.bars = PolyCollection(self.get_verts(self.counts, self.bin_edges),
-                                   array=self.norm(self.bin_centers),
-                                   cmap=self.cmap)
+        self.bars = PolyCollection([])
+        self.set_verts()
+        self.update()
         ax.add_collection(self.bars)
 
         if use_blit:
@@ -503,42 +649,73 @@ class ColourBarHistogram(LoggingMixin):  # PixelHistogram
 
     def set_array(self, data):
 
-        # compute histogram
+        # compute histogram (this also updates the bars)
         self.compute(data)
 
-        # create collection
-        self.bars.set_verts(self.get_verts(self.counts, self.bin_edges))
-        self.bars.set_array(self.norm(self.bin_centers))
-
     def compute(self, data, bins=_default_n_bins, range=None):
-
-        # compute histogram
+        """
+        Compute the cumulative count table for the pixels in `data`, and
+        derive the histogram from it. This is the only method that touches
+        the pixels. A precomputed `CumulativeHistogram`, or the `PixelStats`
+        of the image, may also be passed.
+        """
+        if isinstance(data, PixelStats):
+            data = data.table
+        elif not isinstance(data, CumulativeHistogram):
+            data = CumulativeHistogram(data)
+        self.table = data
+        self.rebin(bins, range)
+
+    def rebin(self, bins=_default_n_bins, range=None):
+        """
+        Recompute the histogram counts for a new range / number of bins from
+        the cumulative count table.  This scales with the number of bins, not
+        the number of pixels.
+        """
         self.bins = self._auto_bins(bins)  # TODO: allow passing
         if range is None:
             range = self._auto_range()
 
-        self.counts, self.bin_edges = \
-            np.histogram(_sanitize_data(data), self.bins, range)
-        self.bin_centers = self.bin_edges[:-1] + np.diff(self.bin_edges)
+        self.counts, self.bin_edges = self.table.rebin(self.bins, range)
+        self.bin_centers = self.bin_edges[:-1] + np.diff(self.bin_edges) / 2
 
-    def get_verts(self, counts, bin_edges):
-        """vertices for horizontal bars"""
-        # FIXME: order swaps for vertical bars
+        # bar colours depend on the bin centres
+        self._colour_state = None
+        if self.bars is not None:
+            self.set_verts()
 
-        if len(counts) == 0:
-            # empty histogram
-            return []
+    def get_verts(self, counts, bin_edges):
+        """
+        Vertices for the bars. These are written into a preallocated
+        (n_bins, 5, 2) array which is only reallocated when the number of
+        bins changes.
+        """
+        self._verts = get_bar_verts(counts, bin_edges, self._verts,
+                                    self.orientation)
+        return self._verts
+
+    def set_verts(self):
+        """Update the bar vertices for the current counts"""
+        previous = self._verts
+        verts = self.get_verts(self.counts, self.bin_edges)
+        if (verts is previous) and self._shared_verts:
+            # paths share memory with the vertex buffer which has been
+            # updated in place
+            self.bars.stale = True
+            return
 
-        xmin = 0
-        ywidth = np.diff(bin_edges[:2])[0]
-        return [[(xmin, ymin),
-                 (xmin, ymin + ywidth),
-                 (xmin + xwidth, ymin + ywidth),
-                 (xmin + xwidth, ymin),
-                 (xmin, ymin)]
-                for xwidth, ymin in zip(counts, bin_edges)]
+        self.bars.set_verts(verts, closed=False)
+        paths = self.bars.get_paths()
+        self._shared_verts = bool(len(paths)) and np.shares_memory(
+                paths[0].vertices, verts)
 
-    def update(self):
+    def update(self, data=None):
+        """
+        Update the bar colours for the current colour limits. If `data` is
+        given, first recompute the histogram for the new image.
+        """
+        if data is not None:
+            self.set_array(data)
 
         # data = self.image_plot.get_array()
         # rng = self._auto_range()
@@ -554,18 +731,20 @@ class ColourBarHistogram(LoggingMixin):  # PixelHistogram
         # note set_array doesn't seem to work correctly. bars outside the
         #  range get coloured for some reason
 
-        self.bars.set_facecolors(self.cmap(self.norm(self.bin_centers)))
+        # only recompute the colours if the normalization changed
+        state = (self.norm.vmin, self.norm.vmax,
+                 getattr(self.norm, 'stretch', None))
+        if state != self._colour_state:
+            self.bars.set_facecolors(self.cmap(self.norm(self.bin_centers)))
+            self._colour_state = state
+
         return self.bars  # TODO: xtick labels if necessary
 
     def _auto_bins(self, n=_default_n_bins):
-        bins = n
-        data = self.get_array()
-
         # unit bins for integer arrays containing small range of numbers
-        if data.dtype.kind == 'i':  # integer array
-            lo, hi = np.nanmin(data), np.nanmax(data)
-            bins = np.arange(min(hi - lo, n) + 1)
-        return bins
+        if self.table.integer:
+            return min(int(self.table.max - self.table.min) + 1, n)
+        return n
 
     def _auto_range(self, stretch=1.2):
         # choose range based on image colour limits
@@ -573,8 +752,7 @@ class ColourBarHistogram(LoggingMixin):  # PixelHistogram
         if vmin == vmax:
             self.logger.warning('Colour range is 0! Falling back to min-max '
                                 'range.')
-            image = self.get_array()
-            return image.min(), image.max()
+            return self.table.min, self.table.max
 
         # set the axes limits slightly wider than the clims
         m = 0.5 * (vmin + vmax)
@@ -615,6 +793,26 @@ class ImageDisplay(LoggingMixin):
     _default_plims = (0.25, 99.75)
     _default_hist_kws = dict(bins=100)
 
+    # colour limits are estimated from a subsample of pixels for images larger
+    # than this
+    clim_sample_threshold = 2 ** 22  # pixels
+    clim_sample_method = 'strided'  # or 'reservoir'
+    clim_n_samples = 2 ** 18
+
+    # colour limits and histograms of images larger than this are computed in
+    # the background. The image is first shown with colour limits from a
+    # preview sample of `clim_n_preview` pixels
+    async_threshold = 2 ** 22  # pixels
+    clim_n_preview = 2 ** 14
+    # keywords of `clim_from_data` that are needed to recompute the limits
+    _clim_keys = ('clim', 'plims', 'sample')
+
+    # `SharedNorm` for linking the colour limits of several images
+    linked_norm = None
+    # `roi.RegionSelector` for region statistics
+    roi = None
+    _sat = None
+
     def __init__(self, image, *args, **kws):
         """
 
@@ -633,6 +831,32 @@ class ImageDisplay(LoggingMixin):
         hax
         sliders
         ax
+        pyramid: bool
+            Display a block-averaged version of the image matched to the
+            screen resolution, switching to finer levels when zooming in.
+        tiled: bool or dict
+            Display the image out-of-core: only the tiles intersecting the
+            current view are read (see `tiles.TiledImage`), and colour limits
+            and the histogram are computed from a sample of the pixels. A dict
+            of keywords for `TiledImage` may be given.
+        lut: bool or 'auto'
+            Colour map integer images of at most 16 bits through a lookup
+            table built from the norm and colour map (see
+            `lut.LookupImage`), instead of normalizing every pixel. 'auto'
+            enables this if the image has a supported data type.
+        async_stats: bool or 'auto'
+            Compute the colour limits and histogram in a background thread
+            (see `background.BackgroundJobs`), so that the figure is shown
+            without waiting for them. The image is first displayed with
+            colour limits estimated from a small sample of the pixels, and the
+            exact limits and histogram are applied when they are ready. 'auto'
+            enables this for images with more than `async_threshold` pixels
+            when the figure has an interactive backend. Timers of
+            non-interactive backends (eg. Agg) never fire, so results are then
+            only applied by calling `jobs.poll` or `jobs.wait`.
+        jobs: BackgroundJobs, optional
+            Background job runner for `async_stats`. Several displays in the
+            same figure can share one.
 
         remaining keywords passed to ax.imshow
 
@@ -649,6 +873,11 @@ class ImageDisplay(LoggingMixin):
         self.has_sliders = kws.pop('sliders', True)
         self.use_blit = kws.pop('use_blit', False)
         connect = kws.pop('connect', self.has_sliders)
+        use_pyramid = kws.pop('pyramid', False)
+        tiled = kws.pop('tiled', False)
+        use_lut = kws.pop('lut', False)
+        async_stats = kws.pop('async_stats', 'auto')
+        jobs = kws.pop('jobs', None)
         # set origin
         kws.setdefault('origin', 'lower')
 
@@ -664,19 +893,59 @@ class ImageDisplay(LoggingMixin):
         if image.dtype.name == 'bool':
             image = image.astype(int)
 
-        self.data = image
+        if use_pyramid and tiled:
+            raise ValueError('Pyramid and tiled display modes are mutually '
+                             'exclusive.')
+
+        self.data = self.image = image
         self.ishape = self.data.shape
 
+        # pixel values used for colour limits and histogram
+        self.tiles = self.tiled_view = None
+        self.stats_view = image
+        if tiled:
+            self.tiles = TiledImage(image, **(tiled if isinstance(tiled, dict)
+                                              else {}))
+            self.stats_view = self.tiles.get_sample(self.clim_n_samples,
+                                                    self.clim_sample_method)
+
         # create the figure if needed
         self.divider = None
         self.figure, axes = self.init_figure(kws)
         self.ax, self.cax, self.hax = axes
         ax = self.ax
 
-        # use imshow to do the plotting
-        self.clim_from_data(image, kws)
+        # optionally compute statistics in the background
+        self.jobs = None
+        if async_stats == 'auto':
+            async_stats = (np.size(self.stats_view) > self.async_threshold and
+                           is_interactive(self.figure.canvas))
+        if async_stats:
+            self.jobs = jobs or BackgroundJobs(self.figure.canvas)
+            # keywords for computing the exact colour limits later
+            clim_kws = {key: kws[key] for key in self._clim_keys if key in kws}
+            # start with statistics of a small sample of the pixels
+            stats = self.pixel_stats
+            self.stats_view = strided_sample(stats.data, self.clim_n_preview)
 
-        self.imagePlot = ax.imshow(image, *args, **kws)
+        # use imshow to do the plotting
+        self.clim_from_data(self.pixel_stats, kws)
+
+        # optionally display a downsampled image matched to the screen
+        # resolution
+        self.pyramid = None
+        self._level = 0
+        if use_pyramid:
+            self.imagePlot = self.init_pyramid(image, args, kws)
+        elif tiled:
+            self.tiled_view = TiledImageView(ax, self.tiles, **kws)
+            self.imagePlot = self.tiled_view.image
+        else:
+            self.imagePlot = ax.imshow(image, *args, **kws)
+            if use_lut == 'auto':
+                use_lut = lut.supports(image)
+            if use_lut:
+                self.imagePlot = lut.LookupImage.from_image(self.imagePlot)
         self.norm = self.imagePlot.norm
         # self.imagePlot.set_clim(*clim)
 
@@ -692,6 +961,10 @@ class ImageDisplay(LoggingMixin):
         self._draw_count = 0
         # self.cid = ax.figure.canvas.mpl_connect('draw_event', self._on_draw)
 
+        if self.jobs is not None:
+            self.jobs.submit(self._channel('image'), self._compute_stats,
+                             stats, clim_kws, callback=self._apply_stats)
+
         if connect:
             self.connect()
 
@@ -754,6 +1027,124 @@ class ImageDisplay(LoggingMixin):
         ax.format_coord = self.format_coord
         return ax.figure, (ax, cax, hax)
 
+    def init_pyramid(self, image, args, kws):
+        """
+        Display the level of a multi-resolution image pyramid that best matches
+        the on-screen pixel density. Finer levels are swapped in when zooming.
+        """
+        if 'extent' in kws:
+            raise ValueError('Image pyramid display does not support '
+                             'setting `extent`.')
+
+        # axes limits of the full resolution image (the coarser levels may be
+        # padded)
+        origin = kws.get('origin', plt.rcParams['image.origin'])
+        nrows, ncols = np.subtract(self.ishape, 0.5)
+        lims = dict(xlim=(-0.5, ncols),
+                    ylim=(-0.5, nrows)[::(-1) ** (origin == 'upper')])
+        self.ax.set(**lims)
+
+        self.pyramid = ImagePyramid(image)
+        self._level = self.get_pyramid_level()
+        kws['extent'] = self.pyramid.get_extent(self._level, origin)
+        image_plot = self.ax.imshow(self.pyramid[self._level], *args, **kws)
+        self.ax.set(**lims)
+
+        # swap in levels when zooming
+        self.ax.callbacks.connect('xlim_changed', self._on_lim_change)
+        self.ax.callbacks.connect('ylim_changed', self._on_lim_change)
+        return image_plot
+
+    def get_pyramid_level(self):
+        """Pyramid level for the current axes limits and size"""
+        bbox = self.ax.bbox
+        if not (bbox.width and bbox.height):
+            return 0
+
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        # number of image pixels per screen pixel along each dimension
+        # (limited to the image size since axes may be zoomed out)
+        nrows, ncols = self.ishape
+        density = min(min(abs(x1 - x0), ncols) / bbox.width,
+                      min(abs(y1 - y0), nrows) / bbox.height)
+        return self.pyramid.select_level(density)
+
+    def set_pyramid_level(self, level):
+        """Display pyramid level `level`"""
+        if level == self._level:
+            return
+
+        self.logger.debug('Switching to pyramid level %i', level)
+        self._level = level
+        self.imagePlot.set_data(self.pyramid[level])
+        self.imagePlot.set_extent(
+                self.pyramid.get_extent(level, self.imagePlot.origin))
+
+    def _on_lim_change(self, ax):
+        self.set_pyramid_level(self.get_pyramid_level())
+
+    @property
+    def stats_view(self):
+        """Pixel values used for the colour limits and histogram"""
+        return self.pixel_stats.data
+
+    @stats_view.setter
+    def stats_view(self, data):
+        # statistics are shared by the colour limits, histogram and sliders
+        self.pixel_stats = PixelStats(data)
+
+    def set_image_data(self, image):
+        """
+        Set the (full resolution) image data to be displayed. This does not
+        update the normalization.
+        """
+        self.image = image
+        if self.tiles is not None:
+            self.tiles.set_data(image)
+            self.stats_view = self.tiles.get_sample(self.clim_n_samples,
+                                                    self.clim_sample_method)
+            self.tiled_view.set_tiles(self.tiles)
+            return
+
+        self.stats_view = image
+        if self.pyramid is None:
+            self.imagePlot.set_data(image)
+            return
+
+        self.pyramid = ImagePyramid(image)
+        self.imagePlot.set_data(self.pyramid[self._level])
+
+    def get_sat(self):
+        """
+        Summed-area table of the (full resolution) image for region
+        statistics. This is computed once for each image displayed.
+        """
+        if self._sat is None or self._sat.data is not self.image:
+            self._sat = SummedAreaTable(self.image)
+        return self._sat
+
+    def add_roi(self, extents=None, **kws):
+        """
+        Add an interactive rectangular region of interest that displays the
+        number of pixels, and the sum, mean and standard deviation of their
+        values. See `roi.RegionSelector`.
+
+        Parameters
+        ----------
+        extents: tuple, optional
+            Initial data coordinates of the rectangle
+            (xmin, xmax, ymin, ymax).
+
+        Returns
+        -------
+        RegionSelector
+        """
+        if self.roi is not None:
+            self.roi.remove()
+        self.roi = RegionSelector(self, extents, **kws)
+        return self.roi
+
     def guess_figsize(self, data, fill_factor=0.55, max_pixel_size=0.2):
         """
         Make an educated guess of the size of the figure needed to display the
@@ -811,7 +1202,8 @@ class ImageDisplay(LoggingMixin):
         cbh = None
         if self.has_hist:
             cbh = ColourBarHistogram(self.hax, self.imagePlot, 'horizontal',
-                                     self.use_blit, **hist_kws)
+                                     self.use_blit, data=self.pixel_stats,
+                                     **hist_kws)
 
             # set ylim if reasonable to do so
             # if data.ptp():
@@ -824,7 +1216,17 @@ class ImageDisplay(LoggingMixin):
         return sliders, cbh
 
     def clim_from_data(self, data, kws=None, **kws_):
-        """Get colour scale limits for data"""
+        """
+        Get colour scale limits for data, which may be an array or its
+        `PixelStats`.
+
+        For images with more than `clim_sample_threshold` pixels, the
+        percentile limits are estimated from a subsample of
+        `clim_n_samples` pixels (see `utils.estimate_percentile_limits`).
+        This can be controlled by passing `sample`, which may be one of
+        'auto' (the default), 'strided', 'reservoir', or 'exact' (or False) to
+        compute the limits from all pixels.
+        """
         # first arg is dict from which we remove 'extra' keywords that
         # are not allowed in imshow. This allows a dict friom the calling
         # scope to be edited here without global statement.
@@ -832,28 +1234,90 @@ class ImageDisplay(LoggingMixin):
         kws = kws or {}
         clim = kws.pop('clim', True)
         plims = kws.pop('plims', None)
+        sample = kws.pop('sample', kws_.pop('sample', 'auto'))
         if clim:
             plims = kws_.setdefault('plims', plims)
             if plims is None:
                 kws_['plims'] = self._default_plims
 
-            clims = get_percentile_limits(_sanitize_data(data), **kws_)
+            stats = PixelStats.of(data)
+            if sample == 'auto':
+                sample = (np.size(stats.data) > self.clim_sample_threshold and
+                          self.clim_sample_method)
+
+            # limits are cached for images that are displayed repeatedly
+            clims = limits_cache.get(
+                    stats.data, functools.partial(self._compute_clim, stats,
+                                                  sample, **kws_),
+                    'percentile', sample, self.clim_n_samples, kws_)
             self.logger.debug('Colour limits: (%.1f, %.1f)', *clims)
             kws['vmin'], kws['vmax'] = clims
             return clims
         return None, None
 
+    def _compute_clim(self, stats, sample, **kws):
+        if sample and sample != 'exact':
+            clims, bounds = estimate_percentile_limits(
+                    stats.data, kws['plims'], self.clim_n_samples, sample)
+            self.logger.debug('Colour limits estimated from %s sample: '
+                              '(%.1f, %.1f); bounds: %s', sample, *clims,
+                              bounds.tolist())
+            return clims
+
+        if set(kws) == {'plims'}:
+            return stats.get_percentile_limits(kws['plims'])
+        return get_percentile_limits(stats.values, **kws)
+
+    def _channel(self, name):
+        # background job channels are unique to each display
+        return id(self), name
+
+    def _compute_stats(self, stats, kws):
+        """
+        Colour limits and histogram table for the image `stats`. This runs in
+        a worker thread, so it does not touch any artists.
+        """
+        clim = self.clim_from_data(stats, dict(kws))
+        if self.has_hist:
+            stats.table
+        return stats, clim
+
+    def _apply_stats(self, result):
+        """Display the statistics computed by `_compute_stats`"""
+        stats, clim = result
+        self.pixel_stats = stats
+
+        draw_list = [self.imagePlot]
+        if clim[0] is not None and clim[0] != clim[1]:
+            if self.sliders:
+                # moving the sliders sets the colour limits
+                draw_list = self.sliders.set_positions(clim, draw_on=False)
+            else:
+                draw_list = self.set_clim(*clim)
+        if self.has_hist:
+            # histogram of all the pixels, binned for the new colour limits
+            draw_list.append(self.histogram.update(stats))
+            self.histogram.autoscale_view()
+        return draw_list
+
     def set_clim(self, *clim):
-        self.imagePlot.set_clim(*clim)
+        if self.linked_norm is None:
+            self.imagePlot.set_clim(*clim)
+            draw_list = [self.imagePlot]
+        else:
+            draw_list = self.linked_norm.set_clim(*clim)
+            if self.cbar:
+                # notify the colourbar
+                self.imagePlot.changed()
 
         if not self.has_hist:
-            return self.imagePlot
+            return draw_list
 
         self.histogram.update()
-        self.sliders.min_span = (clim[0] - clim[1]) / 100
+        self.sliders.min_span = (clim[1] - clim[0]) / 100
 
         # TODO: return COLOURBAR ticklabels?
-        return self.imagePlot, self.histogram.bars
+        return [*draw_list, self.histogram.bars]
 
     def update_clim(self, *xydata):
         """Set colour limits on slider move"""
@@ -896,8 +1360,8 @@ class ImageDisplay(LoggingMixin):
         col, row = int(x + 0.5), int(y + 0.5)
         nrows, ncols = self.ishape
         if (0 <= col < ncols) and (0 <= row < nrows):
-            data = self.imagePlot.get_array()
-            z = data[row, col]
+            # note: always report values from the full resolution image
+            z = self.image[row, col]
             # handle masked data
             if np.ma.is_masked(z):
                 # prevent Warning: converting a masked element to nan.
@@ -918,6 +1382,8 @@ class ImageDisplay(LoggingMixin):
 
 class AstroImageDisplay(ImageDisplay):
 
+    _clim_keys = (*ImageDisplay._clim_keys, 'interval', 'stretch')
+
     def clim_from_data(self, data, kws):
         # colour transform / normalize
         interval = kws.pop('interval', 'zscale')
@@ -929,10 +1395,12 @@ class AstroImageDisplay(ImageDisplay):
         # HACK: get limits ignoring masked pixels
         #         # set the slider positions / color limits
 
-        self.norm = get_norm(data, interval, stretch)
-        # kws['norm'] = norm
-        clim = self.norm.interval.get_limits(data)
-        return clim
+        # This may run in a worker thread (see `_compute_stats`), so only the
+        # keywords are updated here. The norm is used when the image is
+        # created, and later limits are applied by `_apply_stats`.
+        norm = get_norm(data, interval, stretch)
+        kws.setdefault('norm', norm)
+        return norm.vmin, norm.vmax
 
 
 # ****************************************************************************************************
@@ -942,6 +1410,20 @@ class VideoDisplay(ImageDisplay):
     # TODO: lock the sliders in place with button??
 
     _scroll_wrap = True  # scrolling past the end leads to the beginning
+    _default_cache_bytes = 2 ** 28  # 256 MB
+    _default_readahead = 4
+    # minimal interval (ms) between rendering frames requested by scrolling
+    # or moving the frame slider
+    refresh_interval = 16
+
+    frame_cache = None
+    # precomputed colour limits, and the key of the interval they belong to
+    _clims = _clims_key = None
+    # `playback.Timings` instance for profiling `update` during playback
+    timings = None
+    # default frame rate for `play`
+    fps = 25
+    player = None
 
     def __init__(self, data, **kws):
         """
@@ -951,55 +1433,111 @@ class VideoDisplay(ImageDisplay):
 
         Parameters
         ----------
-        data:       np.ndarray or np.memmap
-            initial display data
+        data:       np.ndarray, np.memmap, str, FrameSource or array_like
+            initial display data. Anything other than an in-memory array is
+            read lazily, one frame at a time. See `frames.as_frame_source`.
 
         clim_every: int
             How frequently to re-run the color normalizer algorithm to set
             the colour limits. Setting this to `False` may have a positive
             effect on performance.
+        cache_bytes: int
+            Memory budget (in bytes) for the frame cache. Set to 0 to disable
+            caching and read each frame on demand.
+        readahead: int
+            Number of frames to prefetch in the background in the direction
+            of travel when moving through the sequence.
+        lut: bool or 'auto'
+            Colour map frames through a lookup table. The default 'auto'
+            enables this for integer data of at most 16 bits (eg. uint16
+            CCD frames). See `ImageDisplay`.
+        coalesce: bool
+            Coalesce frame requests from scrolling and the frame slider:
+            only the most recently requested frame is rendered, at most once
+            every `refresh_interval` milliseconds. This has no effect for
+            non-interactive backends.
 
         kws are passed directly to ImageDisplay.
         """
 
-        if not isinstance(data, np.ndarray):
-            data = np.ma.asarray(data)
-
         # setup image display
         n = self._frame = 0
 
-        n_dim = data.ndim
-        if n_dim == 2:
+        if not isinstance(data, (str, Path, FrameSource)) \
+                and np.ndim(data) == 2:
             warnings.warn('Loading single image frame as 3D data cube. Use '
                           '`ImageDisplay` instead to view single frames.')
-            data = np.ma.atleast_3d(data)
+            data = np.ma.asarray(data)[None]
 
+        # wrap data in a lazy frame source so that we never need to load the
+        # entire cube into memory
+        data = as_frame_source(data)
+        n_dim = data.ndim
         if n_dim != 3:
             raise ValueError('Cannot image %iD data' % n_dim)
 
         #
         self.clim_every = kws.pop('clim_every', 1)
+        cache_bytes = kws.pop('cache_bytes', self._default_cache_bytes)
+        readahead = kws.pop('readahead', self._default_readahead)
+        coalesce = kws.pop('coalesce', True)
 
         # don't connect methods yet
         connect = kws.pop('connect', True)
 
+        # colour map integer frames through a lookup table
+        kws.setdefault('lut', 'auto')
+
         # parent sets data as 2D image.
         ImageDisplay.__init__(self, data[n], connect=False, **kws)
-        # save data (this can be array_like (or np.mmap))
+        # save data (this is a `FrameSource` wrapping array_like or np.mmap)
         self.data = data
 
+        # use the vectorised zscale implementation for the frame limits
+        interval = getattr(self.norm, 'interval', None)
+        if isinstance(interval, AstropyZScaleInterval) and \
+                not isinstance(interval, ZScaleInterval):
+            self.norm.interval = ZScaleInterval.from_astropy(interval)
+
+        # frame cache with background readahead. Note the loader is the
+        # (possibly overwritten) `get_image_data` method, so subclasses get
+        # caching for free
+        self.frame_cache = None
+        # projections of the cube along the frame axis, keyed on kind, with
+        # the parameters they were computed with, and the fingerprint of the
+        # data they were computed from
+        self.projections = {}
+        self._projections_key = None
+        if cache_bytes:
+            self.frame_cache = FrameCache(self.get_image_data, len(data),
+                                          cache_bytes, readahead,
+                                          wrap=self._scroll_wrap)
+
         # make observer container for scroll
         # self.on_scroll = Observers()
 
         # make frame slider
+        if self.divider is None:
+            # no colour bar
+            self.divider = make_axes_locatable(self.ax)
         fsax = self.divider.append_axes('bottom', size=0.1, pad=0.3)
         self.frameSlider = Slider(fsax, 'frame', n, len(data), valfmt='%d')
-        self.frameSlider.on_move(self.update)
+        self.frameSlider.on_move(self.request_frame)
         fsax.xaxis.set_major_locator(ticker.AutoLocator())
 
         if self.use_blit:
             self.frameSlider.drawon = False
 
+        # render requested frames from a timer, so that fast scrolling does
+        # not queue an update for every intermediate frame. Timers of
+        # non-interactive backends never fire, so render immediately there
+        self._requested = None
+        self._render_timer = timer = self.figure.canvas.new_timer(
+                interval=self.refresh_interval)
+        timer.single_shot = True
+        timer.add_callback(self._on_refresh)
+        self.coalesce = coalesce and (type(timer) is not TimerBase)
+
         # # save background for blitting
         # self.background = self.figure.canvas.copy_from_bbox(
         #     self.ax.bbox)
@@ -1075,7 +1613,92 @@ class VideoDisplay(ImageDisplay):
         np.ndarray
 
         """
-        return self.data[i]
+        return self.data.get_frame(i)
+
+    def get_frame(self, i):
+        """
+        Get the image data for frame `i`, from the frame cache if available.
+        This also triggers the background readahead of subsequent frames.
+
+        Parameters
+        ----------
+        i: int
+            Frame number
+
+        Returns
+        -------
+        np.ndarray
+        """
+        if self.frame_cache is None:
+            return self.get_image_data(i)
+        return self.frame_cache.get(i)
+
+    def get_interval(self):
+        """
+        The interval algorithm used to compute the colour limits of each frame.
+        This is the interval of the image normalization if it has one,
+        otherwise the default percentile limits of the display.
+        """
+        interval = getattr(self.norm, 'interval', None)
+        if interval is None:
+            interval = AsymmetricPercentileInterval(*self._default_plims)
+        return interval
+
+    @property
+    def clims(self):
+        """
+        Precomputed colour limits for all frames (see `precompute_clims`), or
+        None. The limits are discarded when the interval of the display
+        changes.
+        """
+        if self._clims is not None and \
+                params_key(self.get_interval()) != self._clims_key:
+            self.logger.debug('Interval changed. Discarding precomputed '
+                              'colour limits.')
+            self._clims = self._clims_key = None
+        return self._clims
+
+    @clims.setter
+    def clims(self, clims):
+        self._clims = None if clims is None else np.asarray(clims)
+        self._clims_key = params_key(self.get_interval())
+
+    def precompute_clims(self, interval=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                         n_jobs=1, sidecar=True):
+        """
+        Compute the colour limits for all frames in the cube in a single
+        chunked pass. Playback and scrubbing will subsequently look up these
+        limits instead of computing them for each frame. See
+        `clims.compute_clims` for details on the parameters.
+
+        Returns
+        -------
+        np.ndarray
+            Colour limits with shape (n, 2)
+        """
+        if interval is None:
+            interval = self.get_interval()
+
+        self.clims = compute_clims(self.data, interval, chunk_size, n_jobs,
+                                   sidecar)
+        return self.clims
+
+    def get_frame_clim(self, i, image):
+        """
+        Colour limits for frame `i`, given the `image` (array or its
+        `PixelStats`). Returns None if the colour limits should not be
+        updated for this frame.
+        """
+        clims = self.clims
+        if clims is not None:
+            return clims[i]
+
+        if not self.clim_every or (self._draw_count % self.clim_every):
+            return
+
+        interval = getattr(self.norm, 'interval', None)
+        if interval:
+            return PixelStats.of(image).get_limits(interval)
 
     def update(self, i, draw=True):
         """
@@ -1098,22 +1721,180 @@ class VideoDisplay(ImageDisplay):
         """
         self.set_frame(i)
 
-        image = self.get_image_data(self.frame)
+        with self._timed('fetch'):
+            image = self.get_frame(self.frame)
+
+        with self._timed('normalise'):
+            draw_list = self._update_image(image)
+
+        if self.roi is not None:
+            draw_list.append(self.roi.update())
+
+        #
+        if draw:
+            self.sliders.draw(draw_list)
+
+        return draw_list
+        # return i, image
+
+    def roi_light_curve(self, box=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Statistics of the pixels in a region for every frame in the cube,
+        computed in chunks of frames. See `roi.light_curve`.
+
+        Parameters
+        ----------
+        box: tuple, optional
+            Pixel box (r0, r1, c0, c1) with exclusive upper bounds. Defaults
+            to the region of interest on the display (see `add_roi`).
+
+        Returns
+        -------
+        roi.RegionStats
+            Fields are arrays with one value per frame
+        """
+        if box is None:
+            if self.roi is None:
+                raise ValueError('No region given, and no region of interest '
+                                 'selected on the display.')
+            box = self.roi.box
+
+        return light_curve(self.data, box, chunk_size)
+
+    def get_data_key(self):
+        """
+        Key identifying the image cube, used to discard results computed from
+        earlier data. For arrays (including memory maps), this is the
+        `clims.fingerprint` of the array, which also detects most in-place
+        changes. Otherwise, the identity of the data object is used.
+        """
+        data = self.data
+        if isinstance(data, ArrayFrames):
+            data = data.data
+        if isinstance(data, np.ndarray):
+            return fingerprint(data)
+        return id(data)
+
+    def get_projection(self, kind='median', chunk_size=DEFAULT_CHUNK_SIZE,
+                       n_jobs=1):
+        """
+        Project the cube along the frame axis. Frames are streamed in chunks,
+        optionally across a process pool, and the result is cached. Cached
+        projections are recomputed if they were computed with different
+        parameters (see `projections.get_params`), and the cache is cleared
+        when the data change (see `get_data_key`). See `projections.project`
+        for details on the parameters.
+
+        Parameters
+        ----------
+        kind: str or sequence of str
+            Any of 'mean', 'std', 'min', 'max', 'median'. Several projections
+            are computed in a single pass over the frames.
+
+        Returns
+        -------
+        np.ndarray or dict
+            The projected image, or a dict of images if a sequence of kinds
+            is given.
+        """
+        key = self.get_data_key()
+        if key != self._projections_key:
+            self.projections.clear()
+            self._projections_key = key
+
+        kinds = (kind,) if isinstance(kind, str) else tuple(kind)
+        params = {k: get_params(k, chunk_size) for k in kinds}
+        missing = [k for k in kinds
+                   if self.projections.get(k, (None,))[0] != params[k]]
+        if missing:
+            images = project(self.data, missing, chunk_size, n_jobs)
+            self.projections.update({k: (params[k], images[k])
+                                     for k in missing})
+
+        if isinstance(kind, str):
+            return self.projections[kind][1]
+        return {k: self.projections[k][1] for k in kinds}
+
+    def show_projection(self, kind='median', draw=True, **kws):
+        """
+        Display a projection of the cube (see `get_projection`) as a
+        pseudo-frame. Moving to any frame restores the normal display.
+
+        Returns
+        -------
+        draw_list: list
+            list of artists that have been changed and need to be redrawn
+        """
+        image = self.get_projection(kind, **kws)
+        if self.jobs is not None:
+            self.jobs.cancel(self._channel('frame'))
+
+        self.set_image_data(image)
+        stats = self.pixel_stats
+        draw_list = self._apply_frame_stats((stats, self.clim_from_data(stats)))
+        if self.roi is not None:
+            draw_list.append(self.roi.update())
+
+        # label the pseudo-frame on the frame slider
+        self.frameSlider.valtext.set_text(kind)
+        draw_list.append(self.frameSlider.valtext)
+
+        if draw:
+            self.figure.canvas.draw_idle()
+        return draw_list
+
+    def _timed(self, stage):
+        if self.timings is None:
+            return nullcontext()
+        return self.timings(stage)
+
+    def _update_image(self, image):
         # set the image data
-        # TODO: method set_image_data here??
-        self.imagePlot.set_data(image)  # does not update normalization
+        self.set_image_data(image)  # does not update normalization
 
         # FIXME: normalizer fails with boolean data
         #  File "/usr/local/lib/python3.6/dist-packages/matplotlib/colorbar.py", line 956, in on_mappable_changed
         #   self.update_normal(mappable)
         # File "/usr/local/lib/python3.6/dist-packages/matplotlib/colorbar.py", line 987, in update_normal
 
+        # statistics of the new image shared by the sliders, histogram and
+        # colour limits
+        stats = self.pixel_stats
+        if self.jobs is None:
+            return self._apply_frame_stats(
+                    self._compute_frame_stats(self.frame, stats))
+
+        # show the new frame with the current colour limits, and update them
+        # when the statistics are ready. Results for frames that have been
+        # scrolled past in the meantime are discarded
+        self.jobs.cancel(self._channel('image'))
+        self.jobs.submit(self._channel('frame'), self._compute_frame_stats,
+                         self.frame, stats, callback=self._apply_frame_stats)
+        return [self.imagePlot]
+
+    def _compute_frame_stats(self, i, stats):
+        """
+        Statistics needed to display frame `i`. This may run in a worker
+        thread, so it does not touch any artists.
+        """
+        if self.sliders:
+            stats.extrema
+        if self.has_hist:
+            stats.table
+        return stats, self.get_frame_clim(i, stats)
+
+    def _apply_frame_stats(self, result):
+        """
+        Update the sliders, histogram and colour limits for the statistics
+        computed by `_compute_frame_stats`.
+        """
+        stats, clim = result
         draw_list = [self.imagePlot]
 
         # set the slider axis limits
         if self.sliders:
             # find min / max as float
-            imin, imax = float(np.nanmin(image)), float(np.nanmax(image))
+            imin, imax = map(float, stats.extrema)
             self.sliders.ax.set_ylim(imin, imax)
             self.sliders.valmin, self.sliders.valmax = imin, imax
             # since we changed the axis limits, need to redraw the tick labels
@@ -1123,49 +1904,83 @@ class VideoDisplay(ImageDisplay):
 
         # update histogram
         if self.has_hist:
-            draw_list.extend(self.histogram.update(image))
-
-        if not (self._draw_count % self.clim_every):
-            # set the slider positions / color limits
-            # TODO: move to clim_from_data
-
-            if getattr(self.norm, 'interval', None):
-                vmin, vmax = self.norm.interval.get_limits(
-                        _sanitize_data(image))
-                bad_clims = (vmin == vmax)
-                if bad_clims:
-                    # self.logger.warning('Bad colour interval from %s: '
-                    #                     '(%.1f, %.1f). Ignoring',
-                    #                     self.imagePlot.norm.interval.__class__,
-                    #                     vmin, vmax)
-                    self.logger.warning('Bad colour interval: '
-                                        '(%.1f, %.1f). Ignoring',
-                                        vmin, vmax)
-                else:
-                    self.logger.debug('Auto clims: (%.1f, %.1f)', vmin, vmax)
-                    self.imagePlot.set_clim(vmin, vmax)
-
-                    if self.sliders:
-                        draw_list = self.sliders.set_positions((vmin, vmax),
-                                                               draw_on=False)
-
-                    # set the axes limits slightly wider than the clims
-                    if self.has_hist:
-                        self.histogram.autoscale_view()
+            draw_list.append(self.histogram.update(stats))
+
+        # set the slider positions / color limits
+        if clim is not None:
+            vmin, vmax = clim
+            bad_clims = (vmin == vmax)
+            if bad_clims:
+                # self.logger.warning('Bad colour interval from %s: '
+                #                     '(%.1f, %.1f). Ignoring',
+                #                     self.imagePlot.norm.interval.__class__,
+                #                     vmin, vmax)
+                self.logger.warning('Bad colour interval: '
+                                    '(%.1f, %.1f). Ignoring',
+                                    vmin, vmax)
+            else:
+                self.logger.debug('Auto clims: (%.1f, %.1f)', vmin, vmax)
+                self.imagePlot.set_clim(vmin, vmax)
 
-        #
-        if draw:
-            self.sliders.draw(draw_list)
+                if self.sliders:
+                    draw_list = self.sliders.set_positions((vmin, vmax),
+                                                           draw_on=False)
+
+                # set the axes limits slightly wider than the clims
+                if self.has_hist:
+                    self.histogram.rebin()
+                    self.histogram.update()
+                    self.histogram.autoscale_view()
 
         return draw_list
-        # return i, image
+
+    def request_frame(self, i):
+        """
+        Request frame `i` to be displayed. With `coalesce` enabled, only the
+        most recent request is rendered on the next tick of the refresh
+        timer. Background work for superseded requests (frame prefetches and
+        statistics) is cancelled.
+        """
+        if not self.coalesce:
+            return self.update(i)
+
+        pending = self._requested is not None
+        self._requested = i
+        # cancel prefetches and statistics that are no longer needed
+        if self.frame_cache is not None:
+            self.frame_cache.cancel()
+        if self.jobs is not None:
+            self.jobs.cancel(self._channel('frame'))
+
+        if not pending:
+            self._render_timer.start()
+
+    def flush(self):
+        """
+        Render the most recently requested frame, if any.
+
+        Returns
+        -------
+        draw_list: list
+            list of artists that have been changed and need to be redrawn
+        """
+        self._render_timer.stop()
+        i, self._requested = self._requested, None
+        if i is None:
+            return []
+        return self.update(i)
+
+    def _on_refresh(self):
+        self.flush()
 
     def _scroll(self, event):
 
         # FIXME: drawing on scroll.....
         # try:
         inc = [-1, +1][event.button == 'up']
-        new = self._frame + inc
+        # continue from the latest requested frame if it is not rendered yet
+        current = self._frame if self._requested is None else self._requested
+        new = current + inc
         if self.use_blit:
             self.frameSlider.drawon = False
         self.frameSlider.set_val(new)  # calls connected `update`
@@ -1174,22 +1989,34 @@ class VideoDisplay(ImageDisplay):
         # except Exception as err:
         #     self.logger.exception('Scroll failed:')
 
-    def play(self, start=None, stop=None, pause=0):
+    def play(self, start=None, stop=None, pause=0, fps=None, rate=1,
+             loop=True, drop=True):
         """
-        Show a video of images in the model space
+        Play the image sequence. This does not block: playback is driven by a
+        canvas timer, and can be controlled through the returned `Player`
+        (pause / resume / seek / set_rate) while the GUI stays responsive.
 
         Parameters
         ----------
-        n: int
-            number of frames in the animation
+        start, stop: int
+            Range of frames to play. If only `start` is given, it is
+            interpreted as `stop`. As for `range`, `stop` is exclusive: the
+            last frame played is `stop - 1`.
         pause: int
-            interval between frames in milliseconds
+            Interval between frames in milliseconds. Ignored if `fps` is given.
+        fps: float
+            Target frame rate. Defaults to the `fps` attribute.
+        rate: float
+            Playback rate multiplier
+        loop: bool
+            Whether to restart at the beginning after the last frame
+        drop: bool
+            Whether to drop frames to keep up with the target frame rate
 
         Returns
         -------
-
+        playback.Player
         """
-
         if stop is None and start:
             stop = start
             start = 0
@@ -1197,54 +2024,26 @@ class VideoDisplay(ImageDisplay):
             start = 0
         if stop is None:
             stop = len(self.data)
+        if fps is None:
+            fps = 1000 / pause if pause else self.fps
 
-        # save background for blitting
-        # FIXME: saved bg should be without
-        tmp_inviz = [self.frameSlider.poly, self.frameSlider.valtext]
-        # tmp_inviz.extend(self.histogram.ax.yaxis.get_ticklabels())
-        tmp_inviz.append(self.histogram.bars)
-        for s in tmp_inviz:
-            s.set_visible(False)
-
-        fig = self.figure
-        fig.canvas.draw()
-        self.background = fig.canvas.copy_from_bbox(self.figure.bbox)
+        if self.player is not None:
+            self.player.close()
 
-        for s in tmp_inviz:
-            s.set_visible(True)
+        self.player = Player(self, fps, start, stop, rate, loop, drop)
+        self.player.seek(start)
+        self.player.play()
+        return self.player
 
-        self.frameSlider.eventson = False
-        self.frameSlider.drawon = False
-
-        # pause: inter-frame pause (millisecond)
-        seconds = pause / 1000
-        i = int(start)
-
-        # note: the fastest frame rate achievable currently seems to be
-        #  around 20 fps
-        try:
-            while i <= stop:
-                self.frameSlider.set_val(i)
-                draw_list = self.update(i)
-                draw_list.extend([self.frameSlider.poly,
-                                  self.frameSlider.valtext])
-
-                fig.canvas.restore_region(self.background)
-
-                # FIXME: self.frameSlider.valtext doesn't dissappear on blit
-
-                for art in draw_list:
-                    self.ax.draw_artist(art)
-
-                fig.canvas.blit(fig.bbox)
+    def export(self, filename, start=0, stop=None, fps=None, **kws):
+        """
+        Render the frames offscreen and save them to a movie file or PNG
+        sequence. This does not require a display. See `export.export` for
+        details on the parameters.
+        """
+        from .export import export
 
-                i += 1
-                time.sleep(seconds)
-        except Exception as err:
-            raise err
-        finally:
-            self.frameSlider.eventson = True
-            self.frameSlider.drawon = True
+        return export(self, filename, start, stop, fps or self.fps, **kws)
 
     # def blit_setup(self):
 
@@ -1318,10 +2117,11 @@ class VideoDisplayX(VideoDisplay):
             if coords.ndim == 2:
                 # Assuming single coordinate point per frame
                 coords = coords[:, None]
-            if len(coords) < len(data):
+            if len(coords) < len(self.data):
                 self.logger.warning(
                         'Coordinate array contains fewer points (%i) than '
-                        'the number of frames (%i).', len(coords), len(data))
+                        'the number of frames (%i).', len(coords),
+                        len(self.data))
 
             # set for frame 0
             self.marks.set_data(coords[0, :, ::-1].T)
@@ -1408,7 +2208,6 @@ class VideoDisplayA(VideoDisplayX):
 
 # ****************************************************************************************************
 class Compare3DImage(LoggingMixin):
-    # TODO: profile & speed up!
     # TODO: link viewing angles!!!!!!!!!
     # TODO: blit for view angle change...
     # MODE = 'update'
@@ -1423,11 +2222,22 @@ class Compare3DImage(LoggingMixin):
         args : tuple
             (X, Y, Z, data)  or  (fig, X, Y, Z, data)   or   ()
         kws :
+            titles: list of str
+                Titles for the data, model and residual axes
+            stride: int
+                Only every `stride`-th row and column of the data is drawn in
+                the wireframe plots. Useful for large windows.
+            plims: tuple
+                Percentile limits for the colour scale
         """
 
         self.plots = []
         self.images = []
-        self.titles = kws.get('titles', ['Data', 'Fit', 'Residual'])
+        self.titles = kws.pop('titles', ['Data', 'Fit', 'Residual'])
+        # decimation of the wireframes
+        self.stride = int(kws.pop('stride', 1))
+        # persistent segment buffers for the wireframe plots
+        self._segments = [None] * 3
         self._get_clim, kws = get_colour_scaler(**kws)
 
         nargs = len(args)
@@ -1473,7 +2283,7 @@ class Compare3DImage(LoggingMixin):
         grid_3D = AxesGrid(fig, 211,  # similar to subplot(211)
                            nrows_ncols=(1, 3),
                            axes_pad=-0.2,
-                           label_mode=None,
+                           label_mode='keep',
                            # This is necessary to avoid AxesGrid._tick_only
                            # throwing
                            share_all=True,
@@ -1542,26 +2352,75 @@ class Compare3DImage(LoggingMixin):
         return grid_images
 
     @staticmethod
-    def make_segments(X, Y, Z):
-        """Update segments of wireframe plots."""
-        # NOTE: Does not seem to play well with masked data - mask shape changes...
-        xlines = np.r_['-1,3,0', X, Y, Z]
-        ylines = xlines.transpose(1, 0, 2)  # swap x-y axes
-        return list(xlines) + list(ylines)
+    def make_segments(X, Y, Z, out=None, stride=1):
+        """
+        Segments of the wireframe plot of the surface `Z(X, Y)`.
 
-    def get_clim(self, data):
-        data = _sanitize_data(data)
-        return self._get_clim(data)
+        Parameters
+        ----------
+        X, Y, Z: np.ndarray
+            Coordinate grids and surface values, all of shape (nrows, ncols).
+            Masked values in `Z` are filled with nan, which breaks the lines.
+        out: np.ndarray, optional
+            Array to fill in place. A new array is allocated if not given, or
+            if its shape does not match.
+        stride: int
+            Decimation factor for the rows and columns of the grid.
 
-    def update(self, X, Y, Z, data):
-        """update plots with new data."""
+        Returns
+        -------
+        np.ndarray
+            Segments with shape (nrows + ncols, n, 3), where
+            `n = max(nrows, ncols)` (after decimation). The rows of the grid
+            are followed by the columns. Lines shorter than `n` are padded by
+            repeating their last point.
+        """
+        s = slice(None, None, int(stride))
+        X, Y, Z = X[s, s], Y[s, s], np.ma.filled(Z[s, s], np.nan)
+        r, c = Z.shape
+        n = max(r, c)
+        if out is None or out.shape != (r + c, n, 3):
+            out = np.empty((r + c, n, 3))
+
+        for k, z in enumerate((X, Y, Z)):
+            out[:r, :c, k] = z
+            out[r:, :r, k] = z.T
+
+        # pad the shorter lines for non-square grids
+        if c < n:
+            out[:r, c:] = out[:r, c - 1:c]
+        if r < n:
+            out[r:, r:] = out[r:, r - 1:r]
+        return out
+
+    def set_segments(self, i, X, Y, Z):
+        """
+        Update the wireframe plot `i` by writing the new segments into the
+        buffer owned by the collection.
+        """
+        buffer = self._segments[i]
+        segments = self.make_segments(X, Y, Z, buffer, self.stride)
+        if segments is buffer:
+            # collection already references the buffer
+            self.plots[i].stale = True
+        else:
+            self._segments[i] = segments
+            self.plots[i].set_segments(segments)
+        return self.plots[i]
+
+    def get_clim(self, data):
+        return self._get_clim(PixelStats.of(data).values)
 
-        res = data - Z
+    def update(self, X, Y, Z, data, res=None):
+        """
+        Update plots with new data. The residuals `res` are computed if not
+        given.
+        """
+        if res is None:
+            res = data - Z
         plots, images = self.plots, self.images
-        # NOTE: mask shape changes, which breaks things below.
-        plots[0].set_segments(self.make_segments(X, Y, data.copy()))
-        plots[1].set_segments(self.make_segments(X, Y, Z))
-        plots[2].set_segments(self.make_segments(X, Y, res.copy()))
+        for i, z in enumerate((data, Z, res)):
+            self.set_segments(i, X, Y, z)
         images[0].set_data(data)
         images[1].set_data(Z)
         images[2].set_data(res)
@@ -1605,14 +2464,13 @@ class Compare3DContours(Compare3DImage):
                                       # This is necessary to avoid AxesGrid._tick_only throwing
                                       share_all=True)
 
-    def update(self, X, Y, Z, data):
+    def update(self, X, Y, Z, data, res=None):
         """update plots with new data."""
-        res = data - Z
+        if res is None:
+            res = data - Z
         plots, images = self.plots, self.images
-
-        plots[0].set_segments(self.make_segments(X, Y, data))
-        plots[1].set_segments(self.make_segments(X, Y, Z))
-        plots[2].set_segments(self.make_segments(X, Y, res))
+        for i, z in enumerate((data, Z, res)):
+            self.set_segments(i, X, Y, z)
         # images[0].set_data( data )
         # images[1].set_data( Z )
         # images[2].set_data( res )
@@ -1641,44 +2499,131 @@ class Compare3DContours(Compare3DImage):
         # self.fig.canvas.draw()
 
 
-# from recipes.array import ndgrid
-from recipes.array.neighbours import neighbours
+class PSFPlotter(Compare3DImage, VideoDisplay):
+    """
+    Compare image cutouts around a source with a PSF model fitted to each
+    frame of a sequence.
 
+    Cutouts, models and residuals can be computed for a range of frames in a
+    single batch with `compute_batch`. These are stored as contiguous
+    (n, window, window) stacks, and scrubbing through the batched frames
+    reads directly from them.
+    """
 
-class PSFPlotter(Compare3DImage, VideoDisplay):
-    def __init__(self, filename, model, params, coords, window, **kws):
+    def __init__(self, filename, model, params, coords, window,
+                 vectorized=False, **kws):
+        """
+        Parameters
+        ----------
+        filename: str or array-like
+            The image sequence
+        model: callable
+            The PSF model, called as `model(p, grid)`, where `grid` is the
+            (2, window, window) array of pixel coordinates.
+        params: array-like
+            Model parameters for each frame, shape (n, k)
+        coords: array-like
+            Centre (row, column) of the source in each frame, shape (n, 2)
+        window: int
+            Size of the cutouts in pixels
+        vectorized: bool
+            Whether `model` can evaluate all parameter rows at once. If True,
+            `model(params, grid)` with `params` of shape (m, k) should return
+            an array of shape (m, window, window). Otherwise the model is
+            evaluated separately for each row.
+        kws:
+            Passed to `Compare3DImage`
+        """
         self.model = model
-        self.params = params
-        self.coords = coords
+        self.params = np.asarray(params)
+        self.coords = np.asarray(coords)
         self.window = w = int(window)
+        self.vectorized = bool(vectorized)
         self.grid = np.mgrid[:w, :w]
         extent = np.array([0, w, 0, w]) - 0.5  # l, r, b, t
 
-        Compare3DImage.__init__(self)
+        # cached data, model and residual stacks for frames in `batch`
+        self.batch = range(0)
+        self.stacks = None
+
+        Compare3DImage.__init__(self, **kws)
         axData = self.grid_images[0]
 
-        FitsCubeDisplay.__init__(self, filename, ax=axData, extent=extent,
-                                 sidebar=False, autosize=False)
+        VideoDisplay.__init__(self, filename, ax=axData, extent=extent,
+                              cbar=False, hist=False, sliders=False,
+                              autosize=False)
         self.update(0)  # FIXME: full frame drawn instead of zoom
         # have to draw here for some bizarre reason
         # self.grid_images[0].draw(self.fig._cachedRenderer)
 
     def get_image_data(self, i):
-        # coo = self.coords[i]
-        data = neighbours(self[i], self.coords[i], self.window)
-        return data
+        if i in self.batch:
+            return self.stacks[0][i - self.batch.start]
+
+        return extract_cutouts(self.data, self.coords[i], self.window,
+                               [i])[0]
+
+    def evaluate_models(self, params):
+        """
+        Evaluate the model for each row of `params`.
+
+        Returns
+        -------
+        np.ndarray
+            Model stack with shape (n, window, window)
+        """
+        params = np.atleast_2d(params)
+        if self.vectorized:
+            return np.asarray(self.model(params, self.grid))
+
+        out = np.empty((len(params), self.window, self.window))
+        for j, p in enumerate(params):
+            out[j] = self.model(p, self.grid)
+        return out
+
+    def compute_batch(self, start=0, stop=None):
+        """
+        Extract the cutouts and evaluate the models and residuals for frames
+        `start` to `stop` in one pass, and cache the results. Any previously
+        cached batch is replaced.
+
+        Returns
+        -------
+        data, model, residual: np.ma.MaskedArray
+            Stacks with shape (n, window, window)
+        """
+        self.batch = batch = range(len(self.data))[start:stop]
+        index = slice(batch.start, batch.stop)
+        # only the windows are read from the frames
+        data = extract_cutouts(self.data, self.coords[index], self.window,
+                               batch)
+        model = self.evaluate_models(self.params[index])
+        self.stacks = data, model, data - model
+
+        if self.frame_cache is not None:
+            # cached frames may be stale single frame cutouts
+            self.frame_cache.clear()
+        return self.stacks
+
+    def get_stacks(self, i):
+        """Data, model and residual for frame `i`"""
+        if i in self.batch:
+            j = i - self.batch.start
+            return tuple(stack[j] for stack in self.stacks)
+
+        image = self.get_frame(i)
+        model = self.evaluate_models(self.params[i])[0]
+        return image, model, image - model
 
     def update(self, i, draw=False):
         """Set frame data. draw if requested """
-        i %= len(self)  # wrap around! (eg. scroll past end ==> go to beginning)
+        i %= len(self.data)  # wrap around! (eg. scroll past end ==> go to beginning)
         i = int(round(i, 0))  # make sure we have an int
         self._frame = i  # store current frame
 
-        image = self.get_image_data(i)
-        p = self.params[i]
-        Z = self.model(p, self.grid)
+        image, Z, residual = self.get_stacks(i)
         Y, X = self.grid
-        self.update(X, Y, Z, image)
+        Compare3DImage.update(self, X, Y, Z, image, residual)
 
         if draw:
             self.fig.canvas.draw()
@@ -0,0 +1,180 @@
+"""
+Lookup table colour mapping for integer images
+"""
+
+import numpy as np
+from matplotlib.image import AxesImage
+
+
+def supports(data):
+    """Whether `data` has an integer type that can be colour mapped by table"""
+    dtype = np.dtype(getattr(data, 'dtype', None))
+    return dtype.kind in 'iu' and dtype.itemsize <= 2
+
+
+class ColourLookup(object):
+    """
+    RGBA lookup table for integer images with at most 16 bits per pixel.
+
+    The table maps every representable pixel value through the normalization
+    (including any stretch) and colour map once. Images are then colour
+    mapped by indexing the table with the raw pixel values (a single
+    `np.take`), optionally into a reusable output buffer. The table is only
+    rebuilt when the limits or stretch of the normalization, or the colour
+    map, change.
+    """
+
+    def __init__(self, norm, cmap):
+        """
+        Parameters
+        ----------
+        norm: matplotlib.colors.Normalize
+        cmap: matplotlib.colors.Colormap
+        """
+        self.norm = norm
+        self.cmap = cmap
+        self.table = None
+        self._state = None
+
+    def __repr__(self):
+        size = 0 if self.table is None else len(self.table)
+        return f'{self.__class__.__name__}(size={size})'
+
+    def get_state(self, dtype):
+        """Everything that determines the table for images of `dtype`"""
+        norm, cmap = self.norm, self.cmap
+        stretch = getattr(norm, 'stretch', None)
+        return (np.dtype(dtype).str, type(norm), norm.vmin, norm.vmax,
+                getattr(norm, 'clip', None),
+                None if stretch is None else
+                (type(stretch), repr(sorted(vars(stretch).items()))),
+                id(cmap), cmap.name, cmap.N,
+                *(tuple(np.ravel(c)) for c in
+                  (cmap.get_bad(), cmap.get_under(), cmap.get_over())))
+
+    @property
+    def stale(self):
+        return self.table is None
+
+    def get_table(self, dtype):
+        """
+        The (2 ** nbits, 4) uint8 RGBA table for images of `dtype`. Entry `i`
+        holds the colour of the pixel value with the bit pattern of `i`, so
+        that signed images can index the table through an unsigned view.
+        """
+        state = self.get_state(dtype)
+        if state != self._state:
+            dtype = np.dtype(dtype)
+            unsigned = np.dtype(f'u{dtype.itemsize}')
+            values = np.arange(2 ** (8 * dtype.itemsize),
+                               dtype=unsigned).view(dtype)
+            self.table = self.cmap(self.norm(values), bytes=True)
+            self._state = state
+        return self.table
+
+    def __call__(self, image, out=None):
+        """
+        Colour map the integer `image`.
+
+        Parameters
+        ----------
+        image: np.ndarray
+            Image with an integer dtype of at most 16 bits. Masked pixels are
+            given the colour map's "bad" colour.
+        out: np.ndarray, optional
+            Output buffer with shape `image.shape + (4,)` and dtype uint8. A
+            new array is allocated if not given, or if the shape does not
+            match.
+
+        Returns
+        -------
+        np.ndarray
+            RGBA image with dtype uint8
+        """
+        data = np.ma.getdata(image)
+        table = self.get_table(data.dtype)
+        shape = data.shape + (4,)
+        if out is None or out.shape != shape:
+            out = np.empty(shape, np.uint8)
+
+        index = data.view(f'u{data.dtype.itemsize}')
+        np.take(table, index, axis=0, out=out, mode='clip')
+
+        mask = np.ma.getmask(image)
+        if mask is not np.ma.nomask and mask.any():
+            out[mask] = self.cmap(np.ma.masked, bytes=True)
+        return out
+
+
+class LookupImage(AxesImage):
+    """
+    `AxesImage` that colour maps integer data through a `ColourLookup` table
+    when rendering, instead of normalizing and colour mapping the pixel values
+    with matplotlib. Other data types are rendered as usual. The scalar data
+    remain the image array, so colour bars, cursor data and norm / colour map
+    changes work as for a normal image.
+    """
+
+    def __init__(self, ax, **kws):
+        AxesImage.__init__(self, ax, **kws)
+        self.lut = ColourLookup(self.norm, self.cmap)
+        self._rgba = None
+        # table state with which `_rgba` was coloured (None if stale)
+        self._rgba_state = None
+
+    @classmethod
+    def from_image(cls, image):
+        """
+        Replace the `AxesImage` instance `image` (eg. created by `ax.imshow`)
+        in its axes with an equivalent `LookupImage`.
+        """
+        ax = image.axes
+        kws = dict(cmap=image.get_cmap(), norm=image.norm,
+                   interpolation=image.get_interpolation(),
+                   origin=image.origin, extent=image.get_extent(),
+                   filternorm=image.get_filternorm(),
+                   filterrad=image.get_filterrad(),
+                   resample=image.get_resample())
+        if hasattr(image, 'get_interpolation_stage'):
+            kws['interpolation_stage'] = image.get_interpolation_stage()
+
+        new = cls(ax, **kws)
+        new.update_from(image)
+        new.set_zorder(image.get_zorder())
+        new.set_url(image.get_url())
+        new.set_data(image.get_array())
+        image.remove()
+        ax.add_image(new)
+        return new
+
+    def set_data(self, A):
+        AxesImage.set_data(self, A)
+        self._rgba_state = None
+
+    def changed(self):
+        # norm or colour map changed
+        self._rgba_state = None
+        AxesImage.changed(self)
+
+    def make_image(self, renderer, magnification=1.0, unsampled=False):
+        A = self._A
+        if not supports(A):
+            return AxesImage.make_image(self, renderer, magnification,
+                                        unsampled)
+
+        # keep the table in sync with the current norm and colour map. The
+        # state is also checked here since the norm may change without
+        # notifying the image (eg. setting `norm.vmin` with callbacks blocked)
+        self.lut.norm, self.lut.cmap = self.norm, self.cmap
+        state = self.lut.get_state(A.dtype)
+        if state != self._rgba_state:
+            self._rgba = self.lut(A, self._rgba)
+            self._rgba_state = state
+
+        # render the RGBA image in place of the scalar data
+        self._A = self._rgba
+        try:
+            return AxesImage.make_image(self, renderer, magnification,
+                                        unsampled)
+        finally:
+            self._A = A
@@ -0,0 +1,335 @@
+"""
+Timer driven, non-blocking playback of image sequences
+"""
+
+import time
+from contextlib import contextmanager
+from collections import defaultdict, deque
+
+import numpy as np
+
+from recipes.logging import LoggingMixin
+
+
+class Timings(object):
+    """
+    Running averages of the time spent in each stage of rendering a frame.
+    Use as a context manager factory::
+
+        with timings('fetch'):
+            ...
+    """
+
+    def __init__(self, window=50):
+        """
+        Parameters
+        ----------
+        window: int
+            Number of most recent measurements to average over
+        """
+        self.window = int(window)
+        self.durations = defaultdict(lambda: deque(maxlen=self.window))
+
+    def __repr__(self):
+        return '{}({})'.format(
+                self.__class__.__name__,
+                ', '.join('%s=%.1fms' % (stage, 1000 * t)
+                          for stage, t in self.mean().items()))
+
+    @contextmanager
+    def __call__(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage].append(time.perf_counter() - t0)
+
+    def mean(self):
+        """Mean duration (seconds) of each stage"""
+        return {stage: np.mean(d) for stage, d in self.durations.items() if d}
+
+    def clear(self):
+        self.durations.clear()
+
+
+class Player(LoggingMixin):
+    """
+    Non-blocking playback engine for `VideoDisplay`, driven by a canvas timer
+    so that the GUI event loop stays responsive.
+
+    The frame to display is determined by the wall clock: on every timer tick
+    the player computes which frame should be showing given the target frame
+    rate and playback rate multiplier. If rendering falls behind, intermediate
+    frames are dropped (unless `drop=False`, in which case every frame is
+    shown and playback slows down instead). Time spent fetching, normalising,
+    drawing and blitting each frame is recorded in `timings`.
+    """
+
+    def __init__(self, display, fps=25, start=0, stop=None, rate=1, loop=True,
+                 drop=True, blit=None):
+        """
+        Parameters
+        ----------
+        display: VideoDisplay
+            The display to animate
+        fps: float
+            Target frame rate
+        start, stop: int
+            Range of frames to play. As for `range`, `stop` is exclusive.
+        rate: float
+            Playback rate multiplier. Negative values play in reverse.
+        loop: bool
+            Whether to restart at the beginning after the last frame
+        drop: bool
+            Whether to drop frames to keep up with the target frame rate
+        blit: bool, optional
+            Whether to redraw only the changed artists. Defaults to True if
+            the canvas supports blitting.
+        """
+        self.display = display
+        self.fps = float(fps)
+        self.start = int(start)
+        self.stop = len(display.data) if stop is None else int(stop)
+        self.rate = float(rate)
+        self.loop = bool(loop)
+        self.drop = bool(drop)
+
+        canvas = display.figure.canvas
+        if blit is None:
+            blit = getattr(canvas, 'supports_blit', False)
+        self.blit = bool(blit)
+        self.background = None
+        self._cid = None
+
+        # state
+        self.playing = False
+        self.frame = self.start
+        self._t0 = self._frame0 = self._position = None
+
+        # statistics
+        self.rendered = self.dropped = 0
+        self.timings = Timings()
+        self._times = deque(maxlen=max(int(2 * self.fps), 2))
+
+        self.timer = canvas.new_timer(interval=self.interval)
+        self.timer.add_callback(self._on_tick)
+
+        # continue from the new position when the frame slider is moved
+        self._slider_cid = display.frameSlider.on_changed(self._on_slider)
+
+    def __repr__(self):
+        return ('{0.__class__.__name__}(frame={0.frame}, fps={0.fps:.1f}, '
+                'rate={0.rate}, playing={0.playing})').format(self)
+
+    @property
+    def n_frames(self):
+        return self.stop - self.start
+
+    @property
+    def interval(self):
+        """Timer interval in milliseconds"""
+        return max(int(1000 / abs(self.fps * self.rate)), 1)
+
+    @property
+    def achieved_fps(self):
+        """Frame rate measured over the most recently rendered frames"""
+        if len(self._times) < 2:
+            return 0.
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+    def info(self):
+        """Playback statistics"""
+        return dict(fps=self.fps,
+                    rate=self.rate,
+                    achieved_fps=self.achieved_fps,
+                    rendered=self.rendered,
+                    dropped=self.dropped,
+                    timings=self.timings.mean())
+
+    # ------------------------------------------------------------------------
+    def play(self):
+        """Start (or resume) playback from the current frame"""
+        if self.playing:
+            return
+
+        self.setup_blit()
+        self._sync()
+        self.playing = True
+        self.timer.interval = self.interval
+        self.timer.start()
+
+    resume = play
+
+    def pause(self):
+        """Pause playback at the current frame"""
+        if not self.playing:
+            return
+
+        self.timer.stop()
+        self.playing = False
+        self.teardown_blit()
+
+    def close(self):
+        """
+        Stop playback and disconnect from the display. The player cannot be
+        used afterwards.
+        """
+        self.pause()
+        self.timer.remove_callback(self._on_tick)
+        if self._slider_cid is not None:
+            self.display.frameSlider.disconnect(self._slider_cid)
+            self._slider_cid = None
+
+    def toggle(self):
+        """Pause if playing, resume otherwise"""
+        (self.pause if self.playing else self.play)()
+
+    def seek(self, i):
+        """Display frame `i` and continue playback from there"""
+        self.frame = self._wrap(i)
+        self._sync()
+        self.render(self.frame)
+
+    def set_rate(self, rate):
+        """Change the playback rate multiplier"""
+        self.rate = float(rate)
+        self.timer.interval = self.interval
+        self._sync()
+
+    def _sync(self):
+        # anchor the playback clock at the current frame
+        self._t0 = time.perf_counter()
+        self._frame0 = self._position = self.frame
+
+    def _on_slider(self, value):
+        self.frame = int(value)
+        self._sync()
+
+    def _wrap(self, i):
+        if self.loop:
+            return self.start + (i - self.start) % self.n_frames
+        return int(np.clip(i, self.start, self.stop - 1))
+
+    # ------------------------------------------------------------------------
+    def get_next(self):
+        """
+        Index of the next frame to show, or None if the current frame should
+        remain on screen. The index is not wrapped to the playback range.
+        """
+        if not self.drop:
+            self._position += 1 if self.rate > 0 else -1
+            return self._position
+
+        elapsed = time.perf_counter() - self._t0
+        target = self._frame0 + int(elapsed * self.fps * self.rate)
+        n = abs(target - self._position)
+        if n == 0:
+            # timer fired early
+            return None
+
+        if n > 1:
+            self.dropped += n - 1
+            self.logger.debug('Dropped %i frames', n - 1)
+
+        self._position = target
+        return target
+
+    def _on_tick(self):
+        i = self.get_next()
+        if i is None:
+            return
+
+        if not self.loop and not (self.start <= i < self.stop):
+            self.render(self._wrap(i))
+            self.pause()
+            return
+
+        self.render(self._wrap(i))
+
+    def step(self, n=1):
+        """Advance by `n` frames"""
+        self.seek(self.frame + n)
+
+    def render(self, i):
+        """Update the display to frame `i` and draw it"""
+        self.frame = i
+        display = self.display
+        slider = display.frameSlider
+        # note: fetch and normalise stages are timed in `display.update`
+        timings, display.timings = display.timings, self.timings
+        eventson, slider.eventson = slider.eventson, False
+        drawon, slider.drawon = slider.drawon, False
+        try:
+            slider.set_val(i)
+            draw_list = display.update(i, draw=False)
+        finally:
+            display.timings = timings
+            slider.eventson = eventson
+            slider.drawon = drawon
+
+        draw_list.extend([slider.poly, slider.valtext])
+        self.draw(draw_list)
+
+        self.rendered += 1
+        self._times.append(time.perf_counter())
+
+    def draw(self, artists):
+        """Draw the changed `artists` (or the full figure without blitting)"""
+        canvas = self.display.figure.canvas
+        if not (self.blit and self.background):
+            with self.timings('draw'):
+                canvas.draw()
+            return
+
+        with self.timings('draw'):
+            canvas.restore_region(self.background)
+            for art in artists:
+                if art.axes and art.get_visible():
+                    art.axes.draw_artist(art)
+
+        with self.timings('blit'):
+            canvas.blit(self.display.figure.bbox)
+            canvas.flush_events()
+
+    # ------------------------------------------------------------------------
+    def get_animated(self):
+        """Artists that change from frame to frame"""
+        display = self.display
+        artists = [display.imagePlot, display.frameSlider.poly,
+                   display.frameSlider.valtext]
+        if display.has_hist:
+            artists.append(display.histogram.bars)
+        return artists
+
+    def setup_blit(self):
+        """
+        Mark the artists that change as animated and save the background.
+        The background is re-captured whenever the canvas is redrawn
+        (eg. on resize).
+        """
+        if not self.blit:
+            return
+
+        for art in self.get_animated():
+            art.set_animated(True)
+
+        canvas = self.display.figure.canvas
+        self._cid = canvas.mpl_connect('draw_event', self._on_draw)
+        canvas.draw()
+
+    def teardown_blit(self):
+        if self._cid is None:
+            return
+
+        canvas = self.display.figure.canvas
+        canvas.mpl_disconnect(self._cid)
+        self._cid = self.background = None
+        for art in self.get_animated():
+            art.set_animated(False)
+        canvas.draw_idle()
+
+    def _on_draw(self, event):
+        canvas = self.display.figure.canvas
+        self.background = canvas.copy_from_bbox(self.display.figure.bbox)
+        for art in self.get_animated():
+            art.axes.draw_artist(art)
@@ -0,0 +1,241 @@
+"""
+Chunked, parallel projections of image cubes along the frame axis (mean,
+standard deviation, minimum, maximum and median images)
+"""
+
+import logging
+import warnings
+
+import numpy as np
+
+from recipes.introspection.utils import get_module_name
+
+from .frames import as_frame_source, map_chunks
+from .clims import _as_float_filled, DEFAULT_CHUNK_SIZE
+
+# module level logger
+logger = logging.getLogger(get_module_name(__file__))
+
+KINDS = ('mean', 'std', 'min', 'max', 'median')
+
+
+class Projection(object):
+    """
+    Mergeable per-pixel summary of a sequence of frames.
+
+    Frames are added in chunks. The number of valid values, mean and sum of
+    squared deviations from the mean of each pixel are combined across
+    chunks with the parallel variant of Welford's algorithm (Chan et al.
+    1979), which is numerically stable and exact. Minimum and maximum are
+    exact. The median is approximated by the median of the per-chunk
+    medians, which is exact if all frames fit in a single chunk. To bound
+    memory use for long sequences, the chunk medians are merged
+    hierarchically (the remedian of Rousseeuw & Bassett 1990): every
+    `n_medians` medians on a level are replaced by their median on the next
+    level, so at most `n_medians` images are held per level. The final
+    median is the median of the remaining images, weighted by the number of
+    chunks each represents. Summaries of separate chunks can be computed
+    independently (eg. in worker processes) and merged.
+
+    Masked and nan pixels are ignored.
+    """
+
+    # number of medians per level before they are merged
+    n_medians = 16
+
+    def __init__(self, kinds=KINDS):
+        """
+        Parameters
+        ----------
+        kinds: sequence of str
+            The projections to compute. Any of 'mean', 'std', 'min', 'max',
+            'median'.
+        """
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f'Unknown projection(s): {unknown}. Valid '
+                             f'projections are: {KINDS}.')
+
+        self.kinds = tuple(kinds)
+        self.n_frames = 0
+        self.n = self.mean = self.m2 = self.min = self.max = None
+        # median images on each level of the hierarchy
+        self.medians = []
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(kinds={self.kinds}, '
+                f'frames={self.n_frames})')
+
+    def update(self, frames):
+        """Add the chunk of `frames` (axis 0) to the summary"""
+        return self.merge(self.from_chunk(frames, self.kinds))
+
+    @classmethod
+    def from_chunk(cls, frames, kinds=KINDS):
+        """Summary of the chunk of `frames` (axis 0)"""
+        obj = cls(kinds)
+        data = _as_float_filled(frames)
+        valid = ~np.isnan(data)
+
+        obj.n_frames = len(data)
+        obj.n = n = valid.sum(0)
+        with np.errstate(invalid='ignore', divide='ignore'), \
+                warnings.catch_warnings():
+            # all-nan pixels
+            warnings.simplefilter('ignore', RuntimeWarning)
+
+            obj.mean = mean = np.where(n, np.nansum(data, 0) / n, 0)
+            obj.m2 = np.nansum((data - mean) ** 2, 0)
+            if 'min' in kinds:
+                obj.min = np.nanmin(data, 0)
+            if 'max' in kinds:
+                obj.max = np.nanmax(data, 0)
+            if 'median' in kinds:
+                obj.medians = [[np.nanmedian(data, 0)]]
+        return obj
+
+    def _add_median(self, image, level=0):
+        while len(self.medians) <= level:
+            self.medians.append([])
+
+        medians = self.medians[level]
+        medians.append(image)
+        if len(medians) == self.n_medians:
+            self.medians[level] = []
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                image = np.nanmedian(medians, 0)
+            self._add_median(image, level + 1)
+
+    def merge(self, other):
+        """Merge the summary `other` into this one"""
+        if other.n is None:
+            return self
+
+        if self.n is None:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+        else:
+            # Chan et al. parallel update of the mean and squared deviations
+            n = self.n + other.n
+            delta = other.mean - self.mean
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weight = np.where(n, other.n / n, 0)
+            self.mean = self.mean + delta * weight
+            self.m2 = self.m2 + other.m2 + delta * delta * self.n * weight
+            self.n = n
+            if self.min is not None:
+                self.min = np.fmin(self.min, other.min)
+            if self.max is not None:
+                self.max = np.fmax(self.max, other.max)
+
+        self.n_frames += other.n_frames
+        for level, medians in enumerate(other.medians):
+            for image in medians:
+                self._add_median(image, level)
+        return self
+
+    def get(self, kind):
+        """
+        The projected image for `kind`. Pixels without any valid values are
+        nan.
+        """
+        if kind not in self.kinds:
+            raise ValueError(f'Projection {kind!r} was not computed.')
+        if self.n is None:
+            raise ValueError('No frames in summary.')
+
+        empty = (self.n == 0)
+        with np.errstate(invalid='ignore', divide='ignore'), \
+                warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if kind == 'mean':
+                image = self.mean
+            elif kind == 'std':
+                image = np.sqrt(self.m2 / self.n)
+            elif kind == 'median':
+                images, weights = [], []
+                for level, medians in enumerate(self.medians):
+                    images.extend(medians)
+                    weights.extend([self.n_medians ** level] * len(medians))
+                image = _weighted_median(images, weights)
+            else:
+                image = getattr(self, kind)
+
+        return np.where(empty, np.nan, image)
+
+
+def get_params(kind, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parameters that affect the result of the projection `kind`. Only the
+    median is approximate, and depends on the chunk size and the number of
+    medians merged per level (`Projection.n_medians`).
+    """
+    if kind == 'median':
+        return int(chunk_size), Projection.n_medians
+    return ()
+
+
+def _weighted_median(images, weights):
+    """
+    Weighted median of a stack of `images` (axis 0) for each pixel, ignoring
+    nans. With equal weights, this is `np.nanmedian`.
+    """
+    images = np.asarray(images)
+    weights = np.asarray(weights, float)
+    if np.all(weights == weights[0]):
+        return np.nanmedian(images, 0)
+
+    # nans sort to the end, and carry no weight
+    order = np.argsort(images, 0)
+    values = np.take_along_axis(images, order, 0)
+    cumulative = np.cumsum(np.where(np.isnan(values), 0, weights[order]), 0)
+    index = np.argmax(cumulative >= cumulative[-1] / 2, 0)
+    median = np.take_along_axis(values, index[None], 0)[0]
+    return np.where(cumulative[-1] > 0, median, np.nan)
+
+
+def _chunk_projection(frames, index, kinds):
+    return Projection.from_chunk(frames.get_frames(index), kinds)
+
+
+def project(data, kinds=KINDS, chunk_size=DEFAULT_CHUNK_SIZE, n_jobs=1):
+    """
+    Project an image cube along the frame axis.
+
+    The cube is processed in chunks of `chunk_size` frames, so memory use is
+    bounded for memory mapped data. Chunks are optionally distributed across
+    a process pool. See `Projection` for how partial results are combined.
+
+    Parameters
+    ----------
+    data: array-like, str, Path or FrameSource
+        The image cube
+    kinds: str or sequence of str
+        The projection(s) to compute. Any of 'mean', 'std', 'min', 'max',
+        'median'.
+    chunk_size: int
+        Number of frames processed at once. This also sets the accuracy of
+        the median, which is approximated by the median of the chunk medians.
+    n_jobs: int
+        Number of processes to use. With `n_jobs=1` (the default), chunks are
+        processed in the current process.
+
+    Returns
+    -------
+    dict
+        Projected images keyed on `kinds`
+    """
+    if isinstance(kinds, str):
+        kinds = (kinds,)
+
+    frames = as_frame_source(data)
+    n = len(frames)
+    chunks = [slice(i, i + chunk_size) for i in range(0, n, chunk_size)]
+    summary = Projection(kinds)
+    for part in map_chunks(_chunk_projection, frames, chunks, kinds,
+                           n_jobs=n_jobs):
+        summary.merge(part)
+
+    logger.debug('Projected %i frames in %i chunks.', n, len(chunks))
+    return {kind: summary.get(kind) for kind in kinds}
@@ -0,0 +1,104 @@
+"""
+Multi-resolution image pyramids for fast display of large images
+"""
+
+import numpy as np
+
+
+def block_average(image, factor=2):
+    """
+    Downsample `image` by averaging blocks of `factor` x `factor` pixels.
+    Trailing axes (eg. the colour channels of RGB(A) images) are kept.
+    Masked and nan pixels are ignored. Images with dimensions that are not
+    divisible by `factor` are padded, so the last row / column of blocks may
+    contain fewer pixels.
+
+    Parameters
+    ----------
+    image: array-like
+        Image with shape (ypix, xpix, ...)
+    factor: int
+        Block size
+
+    Returns
+    -------
+    np.ndarray or np.ma.MaskedArray
+        Block averaged image. Blocks without any valid pixels are masked if
+        the input is a masked array, and nan otherwise.
+    """
+    data = np.ma.filled(np.ma.asarray(image, float), np.nan)
+    h, w, *rest = data.shape
+    f = int(factor)
+    hf, wf = -(-h // f), -(-w // f)
+    if (hf * f, wf * f) != (h, w):
+        data = np.pad(data, ((0, hf * f - h), (0, wf * f - w),
+                             *[(0, 0)] * len(rest)),
+                      constant_values=np.nan)
+
+    blocks = data.reshape(hf, f, wf, f, *rest)
+    valid = ~np.isnan(blocks)
+    total = np.where(valid, blocks, 0).sum((1, 3))
+    count = valid.sum((1, 3))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+
+    if np.ma.isMA(image):
+        return np.ma.masked_where(count == 0, mean)
+    return mean
+
+
+class ImagePyramid(object):
+    """
+    Lazily computed stack of block-averaged versions of an image. Level `k`
+    is downsampled by a factor of 2 ** k relative to the original image
+    (level 0). Levels are computed from the previous level when first
+    requested.
+    """
+
+    def __init__(self, image, min_size=64):
+        """
+        Parameters
+        ----------
+        image: array-like
+            The full resolution image
+        min_size: int
+            Size (in pixels) of the smallest dimension of the coarsest level.
+        """
+        self.levels = [image]
+        self.shape = np.shape(image)
+        self.n_levels = max(int(np.log2(min(self.shape) / min_size)), 0) + 1
+
+    def __len__(self):
+        return self.n_levels
+
+    def __getitem__(self, k):
+        if not 0 <= k < self.n_levels:
+            raise IndexError(f'Level {k} out of range for pyramid with '
+                             f'{self.n_levels} levels.')
+
+        while len(self.levels) <= k:
+            self.levels.append(block_average(self.levels[-1]))
+        return self.levels[k]
+
+    def get_extent(self, k, origin='lower'):
+        """
+        Extent (left, right, bottom, top) of level `k` in the pixel
+        coordinates of the full resolution image. Note that this may be
+        slightly larger than the original image due to padding.
+        """
+        f = 2 ** k
+        nrows, ncols = np.multiply(np.shape(self[k]), f) - 0.5
+        if origin == 'upper':
+            return -0.5, ncols, nrows, -0.5
+        return -0.5, ncols, -0.5, nrows
+
+    def select_level(self, pixels_per_screen_pixel):
+        """
+        Coarsest level that still has at least one level pixel per screen
+        pixel, given the number of full-resolution image pixels per screen
+        pixel.
+        """
+        if pixels_per_screen_pixel <= 1:
+            return 0
+        k = int(np.floor(np.log2(pixels_per_screen_pixel)))
+        return min(k, self.n_levels - 1)
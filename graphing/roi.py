@@ -0,0 +1,281 @@
+"""
+Region of interest statistics from summed-area tables (integral images), and
+an interactive rectangle selector that displays them
+"""
+
+from collections import namedtuple
+
+import numpy as np
+from matplotlib.widgets import RectangleSelector
+
+from recipes.logging import LoggingMixin
+
+from .frames import as_frame_source
+from .clims import DEFAULT_CHUNK_SIZE
+
+
+# statistics of the valid pixels in a region. Fields are arrays for stacks
+RegionStats = namedtuple('RegionStats', ('n', 'sum', 'mean', 'std'))
+
+
+def _valid_values(data):
+    """
+    Mask of the valid pixels in `data`, and the pixel values as floats with
+    masked and nan pixels set to zero.
+    """
+    data = np.ma.asarray(data)
+    values = np.ma.getdata(data).astype(float)
+    valid = ~(np.ma.getmaskarray(data) | np.isnan(values))
+    return valid, np.where(valid, values, 0)
+
+
+def clip_box(box, shape):
+    """
+    Restrict the pixel `box` (r0, r1, c0, c1), with exclusive upper bounds,
+    to an image with `shape` (ypix, xpix).
+    """
+    nrows, ncols = shape
+    r0, r1 = np.clip(box[:2], 0, nrows)
+    c0, c1 = np.clip(box[2:], 0, ncols)
+    return r0, max(r0, r1), c0, max(c0, c1)
+
+
+def region_stats(n, s, s2, offset=0):
+    """
+    `RegionStats` from the number of valid pixels `n`, and the sum `s` and sum
+    of squares `s2` of their values relative to `offset`.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s / n
+        var = np.maximum(s2 / n - mean * mean, 0)
+    return RegionStats(n, s + n * offset, mean + offset, np.sqrt(var))
+
+
+class SummedAreaTable(object):
+    """
+    Summed-area tables (integral images) of the pixel values, their squares
+    and the number of valid pixels of an image, or a stack of images.
+
+    The tables are computed once, in O(pixels), after which the sum, mean and
+    standard deviation of the pixels in any rectangle are O(1) (four lookups
+    per table). Masked and nan pixels are ignored. Values are offset by the
+    mean of the image before accumulating, which limits the loss of
+    precision in the variance for data with a large pedestal.
+    """
+
+    def __init__(self, data):
+        """
+        Parameters
+        ----------
+        data: array-like
+            Image with shape (ypix, xpix), or stack of images with shape
+            (..., ypix, xpix).
+        """
+        self.data = data
+        self.shape = np.shape(data)
+        counts, values = _valid_values(data)
+
+        # offset by the mean of the valid pixels in each image
+        axes = (-2, -1)
+        n = counts.sum(axes, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = np.where(n, values.sum(axes, keepdims=True) / n, 0)
+        values = np.where(counts, values - offset, 0)
+        self.offset = offset[..., 0, 0]
+
+        self.counts = self._integrate(counts)
+        self.sums = self._integrate(values)
+        self.squares = self._integrate(values * values)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(shape={self.shape})'
+
+    @staticmethod
+    def _integrate(image):
+        # cumulative sums along the last two axes, with a leading row and
+        # column of zeros so that box sums need no special cases at the edges
+        table = np.zeros(image.shape[:-2] + tuple(np.add(image.shape[-2:], 1)))
+        np.cumsum(image, -2, out=table[..., 1:, 1:])
+        np.cumsum(table[..., 1:, 1:], -1, out=table[..., 1:, 1:])
+        return table
+
+    def _box_sum(self, table, box):
+        r0, r1, c0, c1 = box
+        return (table[..., r1, c1] - table[..., r0, c1]
+                - table[..., r1, c0] + table[..., r0, c0])
+
+    def count(self, box):
+        """Number of valid pixels in the pixel `box` (r0, r1, c0, c1)"""
+        box = clip_box(box, self.shape[-2:])
+        return self._box_sum(self.counts, box).round().astype(int)
+
+    def sum(self, box):
+        """Sum of the valid pixels in the pixel `box` (r0, r1, c0, c1)"""
+        return self.stats(box).sum
+
+    def mean(self, box):
+        """Mean of the valid pixels in the pixel `box` (r0, r1, c0, c1)"""
+        return self.stats(box).mean
+
+    def std(self, box):
+        """
+        Standard deviation of the valid pixels in the pixel `box`
+        (r0, r1, c0, c1)
+        """
+        return self.stats(box).std
+
+    def stats(self, box):
+        """
+        Statistics of the valid pixels in the pixel `box`.
+
+        Parameters
+        ----------
+        box: tuple
+            Row and column index bounds (r0, r1, c0, c1) of the region. Upper
+            bounds are exclusive, as for slices. The box is clipped to the
+            image.
+
+        Returns
+        -------
+        RegionStats
+        """
+        box = clip_box(box, self.shape[-2:])
+        return region_stats(self.count(box),
+                            self._box_sum(self.sums, box),
+                            self._box_sum(self.squares, box),
+                            self.offset)
+
+
+def extent_to_box(extents):
+    """
+    Pixel box (r0, r1, c0, c1) of the pixels whose centres lie inside the
+    rectangle with data coordinate `extents` (xmin, xmax, ymin, ymax).
+    Pixel centres are at integer coordinates.
+    """
+    # round to avoid excluding pixels due to errors from the transforms
+    xmin, xmax, ymin, ymax = np.round(extents, 6)
+    return (int(np.ceil(ymin)), int(np.floor(ymax)) + 1,
+            int(np.ceil(xmin)), int(np.floor(xmax)) + 1)
+
+
+def _chunk_moments(frames, index, box):
+    # number of valid pixels, their mean and the sum of squared deviations
+    # from the mean for each frame in the chunk
+    r0, r1, c0, c1 = box
+    # read only the pixels in the box
+    region = frames.get_region(index, slice(r0, r1), slice(c0, c1))
+    counts, values = _valid_values(region)
+    n = counts.sum((1, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n, values.sum((1, 2)) / n, 0)
+    deviations = np.where(counts, values - mean[:, None, None], 0)
+    return n, mean, (deviations * deviations).sum((1, 2))
+
+
+def light_curve(data, box, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Statistics of the pixels in `box` for every frame of an image cube.
+
+    The frames are read in chunks of `chunk_size`, and the statistics of each
+    chunk are computed in a single vectorised pass, so memory use is bounded
+    for memory mapped data.
+
+    Parameters
+    ----------
+    data: array-like, str, Path or FrameSource
+        The image cube
+    box: tuple
+        Pixel box (r0, r1, c0, c1) with exclusive upper bounds
+    chunk_size: int
+        Number of frames processed at once
+
+    Returns
+    -------
+    RegionStats
+        Fields are arrays with one value per frame
+    """
+    frames = as_frame_source(data)
+    box = clip_box(box, frames.shape[1:])
+
+    n = len(frames)
+    moments = [_chunk_moments(frames, slice(i, i + chunk_size), box)
+               for i in range(0, n, chunk_size)]
+    if not moments:
+        return region_stats(*np.zeros((3, 0)))
+
+    n, mean, s2 = map(np.concatenate, zip(*moments))
+    return region_stats(n, np.zeros_like(mean), s2, mean)
+
+
+class RegionSelector(LoggingMixin):
+    """
+    Interactive rectangular region of interest on an `ImageDisplay`.
+
+    Statistics of the pixels inside the rectangle are computed from the
+    summed-area table of the displayed image (see
+    `ImageDisplay.get_sat`), which is built once per image, so the readout is
+    updated live while dragging or resizing the rectangle.
+    """
+
+    template = 'n = {:d}; sum = {:.6g}; mean = {:.6g}; std = {:.6g}'
+
+    def __init__(self, display, extents=None, **kws):
+        """
+        Parameters
+        ----------
+        display: ImageDisplay
+            The image display
+        extents: tuple, optional
+            Initial data coordinates of the rectangle
+            (xmin, xmax, ymin, ymax).
+        kws:
+            Passed to `matplotlib.widgets.RectangleSelector`
+        """
+        self.display = display
+        self.ax = ax = display.ax
+        kws.setdefault('interactive', True)
+        kws.setdefault('props', dict(facecolor='none', edgecolor='w'))
+        self.selector = RectangleSelector(ax, self._on_select, **kws)
+        self.text = ax.text(0.02, 0.02, '', color='w', fontsize='small',
+                            transform=ax.transAxes)
+        self.stats = None
+        self._cid = ax.figure.canvas.mpl_connect('motion_notify_event',
+                                                 self._on_motion)
+        if extents is not None:
+            self.selector.extents = extents
+            self.update()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(box={self.box})'
+
+    @property
+    def box(self):
+        """Pixel box (r0, r1, c0, c1) of the current rectangle"""
+        return extent_to_box(self.selector.extents)
+
+    def get_stats(self):
+        """Statistics of the pixels in the current rectangle"""
+        return self.display.get_sat().stats(self.box)
+
+    def update(self):
+        """Update the statistics and readout for the current rectangle"""
+        self.stats = stats = self.get_stats()
+        self.text.set_text(self.template.format(*stats))
+        return self.text
+
+    def _on_select(self, press, release):
+        self.update()
+        self.ax.figure.canvas.draw_idle()
+
+    def _on_motion(self, event):
+        # live update while dragging
+        if event.button and (event.inaxes is self.ax) and \
+                self.selector.get_active():
+            self.update()
+
+    def remove(self):
+        """Disconnect the selector and remove its artists"""
+        self.ax.figure.canvas.mpl_disconnect(self._cid)
+        self.selector.set_active(False)
+        self.selector.set_visible(False)
+        self.text.remove()
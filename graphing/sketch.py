@@ -0,0 +1,181 @@
+"""
+Streaming, mergeable quantile sketches for pixel statistics of large image
+collections
+"""
+
+import numpy as np
+
+from .utils import _valid, _iter_chunks, _percentile_coefficients
+
+
+class QuantileSketch(object):
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty 2016).
+
+    Values are streamed into a hierarchy of compactors. Items at level `h`
+    represent `2 ** h` original values. When a level exceeds its capacity, its
+    items are sorted and every other item (with a random offset) is promoted
+    to the next level. The memory footprint is O(k log(n / k)), and the rank
+    error is roughly proportional to 1 / k, independent of the number of
+    values. Sketches can be merged, so they can be computed independently
+    for each image (or in separate processes) and combined.
+
+    The exact minimum, maximum and number of values are tracked as well.
+    """
+
+    def __init__(self, k=1024, c=2 / 3, seed=None):
+        """
+        Parameters
+        ----------
+        k: int
+            Capacity of the top compactor. Controls the accuracy.
+        c: float
+            Ratio of the capacities of successive compactors (0.5 < c < 1)
+        seed: int, optional
+            Seed for the random compaction offsets.
+        """
+        self.k = int(k)
+        self.c = float(c)
+        self.rng = np.random.default_rng(seed)
+        self.compactors = [np.empty(0)]
+        self.n = 0
+        self.min, self.max = np.inf, -np.inf
+        self.integer = True
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(n={self.n}, k={self.k}, '
+                f'items={self.size})')
+
+    @property
+    def size(self):
+        """Number of items retained in the sketch"""
+        return sum(map(len, self.compactors))
+
+    def capacity(self, h):
+        """Capacity of compactor at level `h`"""
+        depth = len(self.compactors) - h - 1
+        return max(int(np.ceil(self.k * self.c ** depth)), 2)
+
+    def update(self, data, chunk_size=2 ** 20):
+        """
+        Add the (unmasked, non-nan) values in `data` to the sketch. The data
+        are processed in chunks of about `chunk_size` values.
+        """
+        for chunk in _iter_chunks(data, chunk_size):
+            values = _valid(chunk)
+            if not values.size:
+                continue
+
+            self.integer &= (values.dtype.kind in 'iub')
+            self.n += values.size
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self.compactors[0] = np.concatenate(
+                    [self.compactors[0], values.astype(float)])
+            self.compress()
+        return self
+
+    def merge(self, other):
+        """Merge `other` sketch into this one"""
+        for h, items in enumerate(other.compactors):
+            if h == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            self.compactors[h] = np.concatenate([self.compactors[h], items])
+
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.integer &= other.integer
+        self.compress()
+        return self
+
+    def compress(self):
+        """Compact levels until all are within capacity"""
+        h = 0
+        while h < len(self.compactors):
+            items = self.compactors[h]
+            if len(items) <= self.capacity(h):
+                h += 1
+                continue
+
+            if h + 1 == len(self.compactors):
+                self.compactors.append(np.empty(0))
+
+            items = np.sort(items)
+            # retain one item if the number is odd
+            m = len(items) // 2 * 2
+            offset = self.rng.integers(2)
+            self.compactors[h + 1] = np.concatenate(
+                    [self.compactors[h + 1], items[offset:m:2]])
+            self.compactors[h] = items[m:]
+
+            # capacities of lower levels shrink when the hierarchy grows, so
+            # start again from the bottom
+            h = 0
+
+    def get_items(self):
+        """Sorted retained items and their weights"""
+        weights = np.concatenate([np.full(len(items), 2 ** h)
+                                  for h, items in enumerate(self.compactors)])
+        items = np.concatenate(self.compactors)
+        o = np.argsort(items, kind='stable')
+        return items[o], weights[o]
+
+    def rank(self, x):
+        """
+        Estimated number of values smaller than or equal to `x`. For
+        floating point data, values are interpolated between retained items,
+        so this is a smooth function of `x`.
+        """
+        if not self.n:
+            return np.zeros(np.shape(x))
+
+        items, weights = self.get_items()
+        if self.integer:
+            # step function, so that ranks at half-integers are exact counts
+            # of the items below
+            cumulative = np.r_[0, np.cumsum(weights)]
+            return cumulative[np.searchsorted(items, x, 'right')]
+
+        # each item represents `weight` values centred on it
+        cumulative = np.cumsum(weights) - weights / 2
+        return np.interp(x, np.r_[self.min, items, self.max],
+                         np.r_[0, cumulative, self.n],
+                         left=0, right=self.n)
+
+    def cdf(self, x):
+        """Estimated cumulative distribution function at `x`"""
+        return self.rank(x) / max(self.n, 1)
+
+    def quantile(self, q):
+        """Estimated quantiles `q` (in the interval [0, 1])"""
+        if not self.n:
+            return np.full(np.shape(q), np.nan)
+
+        items, weights = self.get_items()
+        cumulative = np.cumsum(weights) - weights / 2
+        return np.interp(np.multiply(q, self.n),
+                         np.r_[0, cumulative, self.n],
+                         np.r_[self.min, items, self.max])
+
+    def percentile(self, p):
+        """
+        Estimated percentiles `p`, following the convention of
+        `utils.percentile` for values outside of the interval [0, 100].
+        """
+        c, u, v, w = _percentile_coefficients(p)
+        d = np.where(c > 0, self.quantile(c / 100), 0)
+        return np.squeeze(u * self.min + v * self.max + w * d)
+
+    def histogram(self, bins=100, range=None):
+        """
+        Estimated histogram of the values. See `np.histogram` for the
+        parameters.
+        """
+        if range is None:
+            range = (self.min, self.max)
+        bin_edges = np.histogram_bin_edges([], bins, range)
+        return np.diff(self.rank(bin_edges)), bin_edges
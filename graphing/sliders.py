@@ -168,7 +168,13 @@ class AxesSliders(DragMachinery):
         # not a property since it returns a list of artists to draw
         # assert len(values) == len(self.artists)
         draw_list = []
-        for drg, v in zip(self.draggable.values(), values):
+        moves = list(zip(self.draggable.values(), values))
+        if len(moves) == 2 and values[1] > self.positions[1]:
+            # when moving up, move the upper slider first so that the lower
+            # one is not restricted by the previous upper position
+            moves = moves[::-1]
+
+        for drg, v in moves:
             new = (v, drg.position[self._ilock])[self._order]
             art = self.update(drg, new, False)
             draw_list.extend(art)
@@ -0,0 +1,237 @@
+"""
+Pixel statistics for image display
+"""
+
+import numpy as np
+
+from .utils import _valid, _percentile_coefficients
+
+
+def bincount(values, vmin, vmax):
+    """
+    Exact counts of each integer in the interval [vmin, vmax] amongst the
+    integer `values`, which should lie in that interval.
+    """
+    n = int(vmax) - int(vmin) + 1
+    if not len(values):
+        return np.zeros(n, int)
+
+    if vmin >= 0 and vmax < 2 * n:
+        # index directly, avoiding a temporary offset copy of the values
+        return np.bincount(values, minlength=int(vmax) + 1)[int(vmin):]
+
+    return np.bincount(np.subtract(values, vmin, dtype=np.intp), minlength=n)
+
+
+class CumulativeHistogram(object):
+    """
+    High resolution cumulative count table for the pixel values of an image.
+
+    The table is computed in a single pass over the pixels. Histograms for any
+    range and number of bins are then derived from the table by interpolation,
+    which is O(bins), so that re-binning (eg. when the colour limits change)
+    never touches the pixels again.  For integer images with a range smaller
+    than `n_unit` (which covers 16 bit data), the table holds exact counts in
+    unit bins centred on the integers (computed with `np.bincount`), so
+    histograms with integer bin edges are exact.
+    """
+
+    n_fine = 2 ** 14
+    # maximal range of integer images for which the table has unit bins
+    n_unit = 2 ** 17
+
+    def __init__(self, data, n_fine=n_fine):
+        """
+        Parameters
+        ----------
+        data: array-like or PixelStats
+            The image. Masked and nan pixels are ignored.
+        n_fine: int
+            Resolution of the table (number of fine bins).
+        """
+        values = data.values if isinstance(data, PixelStats) else _valid(data)
+        self.integer = (values.dtype.kind in 'iu')
+        self.n = values.size
+        if self.n:
+            # note python scalars avoid overflow for small integer types
+            self.min, self.max = values.min().item(), values.max().item()
+        else:
+            self.min, self.max = 0, 1
+
+        if self.integer and (self.max - self.min) < max(n_fine, self.n_unit):
+            # exact unit bin counts in a single pass
+            counts = bincount(values, self.min, self.max)
+            self.edges = np.arange(self.min, self.max + 2) - 0.5
+        else:
+            counts, self.edges = np.histogram(values, n_fine,
+                                              (self.min, self.max))
+        self.cumulative = np.r_[0, np.cumsum(counts)]
+
+    @classmethod
+    def from_sketch(cls, sketch, n_fine=n_fine):
+        """
+        Cumulative table derived from a `sketch.QuantileSketch`. This allows
+        histograms of arbitrarily large collections of images without holding
+        all their pixels in memory.
+        """
+        obj = cls.__new__(cls)
+        obj.integer = sketch.integer
+        obj.n = sketch.n
+        if sketch.n:
+            # note python scalars avoid overflow for small integer types
+            convert = int if obj.integer else float
+            obj.min, obj.max = convert(sketch.min), convert(sketch.max)
+        else:
+            obj.min, obj.max = 0, 1
+        if obj.integer and (obj.max - obj.min) < n_fine:
+            obj.edges = np.arange(obj.min, obj.max + 2) - 0.5
+        else:
+            obj.edges = np.linspace(obj.min, obj.max, n_fine + 1)
+        obj.cumulative = sketch.rank(obj.edges)
+        return obj
+
+    def __call__(self, bins, range=None):
+        return self.rebin(bins, range)
+
+    def rebin(self, bins, range=None):
+        """
+        Histogram with `bins` in `range` derived from the cumulative table.
+
+        Parameters
+        ----------
+        bins: int or array-like
+            Number of bins, or bin edges.
+        range: 2-tuple, optional
+            Range of the histogram if `bins` is an int. Defaults to the range
+            of the data.
+
+        Returns
+        -------
+        counts: np.ndarray
+        bin_edges: np.ndarray
+        """
+        if np.ndim(bins) == 0:
+            if range is None:
+                range = self.edges[[0, -1]]
+            if self.integer:
+                # integer-aligned bins of integer width give exact counts
+                lo, hi = np.floor(range[0]), np.ceil(range[1])
+                width = max(np.ceil((hi - lo + 1) / bins), 1)
+                bin_edges = np.arange(lo - 0.5, hi + width, width)
+            else:
+                bin_edges = np.linspace(*range, int(bins) + 1)
+        else:
+            bin_edges = np.asarray(bins, float)
+
+        cumulative = np.interp(bin_edges, self.edges, self.cumulative)
+        return np.diff(cumulative), bin_edges
+
+
+class PixelStats(object):
+    """
+    Statistics of the valid (unmasked and non-nan) pixels of an image.
+
+    The valid pixel values are extracted once, and derived quantities (sorted
+    values, extrema, percentiles, colour limits and the cumulative histogram
+    table) are computed lazily from them and cached. A single instance can
+    therefore be shared by everything that needs statistics of the same image
+    (colour limits, histogram, slider ranges), without each making its own
+    copy of the valid pixels.
+    """
+
+    def __init__(self, data):
+        """
+        Parameters
+        ----------
+        data: array-like
+            The image
+        """
+        self.data = data
+        self._values = self._sorted = self._extrema = self._table = None
+
+    @classmethod
+    def of(cls, data):
+        """`data` if it is a `PixelStats` instance, otherwise wrap it."""
+        return data if isinstance(data, cls) else cls(data)
+
+    def __len__(self):
+        return self.values.size
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(shape={np.shape(self.data)})'
+
+    @property
+    def values(self):
+        """Flat array of the valid pixel values"""
+        if self._values is None:
+            self._values = _valid(self.data)
+        return self._values
+
+    @property
+    def sorted(self):
+        """Valid pixel values in ascending order"""
+        if self._sorted is None:
+            self._sorted = np.sort(self.values)
+        return self._sorted
+
+    @property
+    def extrema(self):
+        """Minimum and maximum valid pixel values (nan if there are none)"""
+        if self._extrema is None:
+            if not len(self):
+                self._extrema = (np.nan, np.nan)
+            elif self._sorted is not None:
+                self._extrema = self._sorted[[0, -1]]
+            else:
+                self._extrema = self.values.min(), self.values.max()
+        return self._extrema
+
+    @property
+    def min(self):
+        return self.extrema[0]
+
+    @property
+    def max(self):
+        return self.extrema[1]
+
+    @property
+    def table(self):
+        """Cumulative histogram table of the valid values"""
+        if self._table is None:
+            self._table = CumulativeHistogram(self)
+        return self._table
+
+    def histogram(self, bins=100, range=None):
+        """Histogram derived from the cumulative table. See `np.histogram`."""
+        return self.table.rebin(bins, range)
+
+    def percentile(self, p):
+        """
+        Percentiles `p` of the valid values, following the convention of
+        `utils.percentile` for values outside of the interval [0, 100].
+        """
+        c, u, v, w = _percentile_coefficients(p)
+        if not len(self):
+            return np.squeeze(np.full(len(c), np.nan))
+
+        # linear interpolation between closest ranks as in `np.percentile`
+        n = len(self)
+        index = c / 100 * (n - 1)
+        lo = np.floor(index).astype(int)
+        hi = np.minimum(lo + 1, n - 1)
+        if self._sorted is None:
+            # partial sort that only places the required ranks, O(n)
+            values = np.partition(self.values, np.union1d(lo, hi))
+        else:
+            values = self._sorted
+        d = values[lo] + (index - lo) * (values[hi] - values[lo])
+        d = np.where(c > 0, d, 0)
+        return np.squeeze(u * self.min + v * self.max + w * d)
+
+    def get_percentile_limits(self, plims=(-5, 105)):
+        """Limits from the percentiles `plims`. See `utils.percentile`."""
+        return self.percentile(plims)
+
+    def get_limits(self, interval):
+        """Limits from an astropy `interval` computed on the valid values"""
+        return interval.get_limits(self.values)
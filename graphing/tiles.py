@@ -0,0 +1,266 @@
+"""
+Tiled, out-of-core rendering of images that are larger than memory
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from recipes.logging import LoggingMixin
+
+from .frames import FrameCache
+from .utils import sample_pixels
+
+
+class TiledImage(LoggingMixin):
+    """
+    Multi-resolution tiled access to a (possibly memory mapped) 2D image.
+
+    Tile `(k, i, j)` at level `k` covers the full resolution image rows
+    `[i * s, (i + 1) * s)` and columns `[j * s, (j + 1) * s)`, where
+    `s = tile_size * 2 ** k`, decimated by a stride of `2 ** k`.  Only the
+    requested rows of the underlying array are therefore read from disk.
+    Tiles are kept in a bounded LRU cache and can be loaded in the background
+    by a thread pool.
+    """
+
+    def __init__(self, data, tile_size=512, max_bytes=2 ** 28, n_workers=4):
+        """
+        Parameters
+        ----------
+        data: array-like
+            The 2D image. Usually an `np.memmap`.
+        tile_size: int
+            Size of the (square) tiles in pixels
+        max_bytes: int
+            Memory budget for cached tiles in bytes
+        n_workers: int
+            Number of threads used for loading tiles in the background
+        """
+        self.tile_size = int(tile_size)
+        self.cache = FrameCache(self.read_tile, max_bytes=max_bytes,
+                                readahead=0, n_workers=n_workers)
+        self.set_data(data)
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(shape={self.shape}, '
+                f'tile_size={self.tile_size}, levels={self.n_levels})')
+
+    def set_data(self, data):
+        """Set a new image, discarding all cached tiles"""
+        self.data = data
+        self.shape = np.shape(data)
+        # the coarsest level fits in a single tile
+        self.n_levels = max(int(np.ceil(np.log2(max(self.shape) /
+                                                self.tile_size))), 0) + 1
+        self.cache.clear()
+
+    def get_level_shape(self, k):
+        """Shape of the (decimated) image at level `k`"""
+        return tuple(-(-np.array(self.shape) // 2 ** k))
+
+    def select_level(self, pixels_per_screen_pixel):
+        """
+        Coarsest level that still has at least one level pixel per screen
+        pixel, given the number of full-resolution image pixels per screen
+        pixel.
+        """
+        if pixels_per_screen_pixel <= 1:
+            return 0
+        k = int(np.floor(np.log2(pixels_per_screen_pixel)))
+        return min(k, self.n_levels - 1)
+
+    def read_tile(self, key):
+        """Read tile `key = (k, i, j)` from the underlying array"""
+        k, i, j = key
+        f = 2 ** k
+        s = self.tile_size * f
+        # copy to read the data into memory
+        return self.data[i * s:(i + 1) * s:f, j * s:(j + 1) * s:f].copy()
+
+    def get_tile_range(self, k, xlim, ylim):
+        """
+        Ranges of tile row and column indices at level `k` that intersect the
+        view with axes limits `xlim` and `ylim` (in full resolution pixel
+        coordinates).
+        """
+        s = self.tile_size * 2 ** k
+        ranges = []
+        for lim, n in zip((ylim, xlim), self.shape):
+            lo, hi = np.clip(np.add(sorted(lim), 0.5) // s, 0, (n - 1) // s)
+            ranges.append(range(int(lo), int(hi) + 1))
+        return tuple(ranges)
+
+    def get_sample(self, n=2 ** 18, method='strided'):
+        """
+        Subsample of about `n` pixels from the full image for computing
+        colour limits and histograms. See `utils.sample_pixels`.
+        """
+        return sample_pixels(self.data, n, method)
+
+    def assemble(self, k, rows, cols, origin='lower', wait=False):
+        """
+        Mosaic the tiles at level `k` with indices in the ranges `rows` and
+        `cols` into a single image.
+
+        Parameters
+        ----------
+        k: int
+            Level
+        rows, cols: range
+            Tile indices
+        origin: {'lower', 'upper'}
+            Image origin. Determines the order of the `extent` values.
+        wait: bool
+            Whether to block until all the tiles are loaded. If False, tiles
+            that are not yet cached are scheduled for loading in the
+            background and masked in the mosaic.
+
+        Returns
+        -------
+        image: np.ma.MaskedArray
+            The mosaic
+        extent: tuple
+            Extent (left, right, bottom, top) of the mosaic in full
+            resolution pixel coordinates.
+        missing: list
+            Keys of the tiles that are still being loaded.
+        """
+        t = self.tile_size
+        f = 2 ** k
+        nrows, ncols = self.get_level_shape(k)
+        r0, r1 = rows[0] * t, min(rows[-1] * t + t, nrows)
+        c0, c1 = cols[0] * t, min(cols[-1] * t + t, ncols)
+        image = np.ma.masked_all((r1 - r0, c1 - c0), np.dtype(self.data.dtype))
+
+        missing = []
+        for i in rows:
+            for j in cols:
+                key = (k, i, j)
+                if not (wait or key in self.cache):
+                    missing.append(key)
+                    continue
+
+                tile = self.cache.get(key, prefetch=False)
+                y, x = i * t - r0, j * t - c0
+                image[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+
+        if missing:
+            self.cache.prefetch(missing)
+
+        left, bottom = np.multiply((c0, r0), f) - 0.5
+        right, top = left + image.shape[1] * f, bottom + image.shape[0] * f
+        if origin == 'upper':
+            bottom, top = top, bottom
+        return image, (left, right, bottom, top), missing
+
+
+class TiledImageView(LoggingMixin):
+    """
+    Displays the tiles of a `TiledImage` that intersect the current view of
+    the axes at the resolution matching the screen. When the view changes,
+    cached tiles are drawn immediately, and the remaining tiles are loaded in
+    the background. A canvas timer polls for completed tiles and redraws.
+    """
+
+    def __init__(self, ax, tiles, poll_interval=50, **kws):
+        """
+        Parameters
+        ----------
+        ax: matplotlib.axes.Axes
+        tiles: TiledImage
+        poll_interval: int
+            Interval in milliseconds between checks for loaded tiles
+        kws:
+            Keywords passed to `ax.imshow`
+        """
+        self.ax = ax
+        self.tiles = tiles
+        self.origin = kws.setdefault('origin', plt.rcParams['image.origin'])
+        if 'extent' in kws:
+            raise ValueError('Tiled image display does not support setting '
+                             '`extent`.')
+
+        # axes limits of the full image. This also switches off autoscaling
+        # which would otherwise reset the view when the extent changes
+        nrows, ncols = np.subtract(tiles.shape, 0.5)
+        ax.set(xlim=(-0.5, ncols),
+               ylim=(-0.5, nrows)[::(-1) ** (self.origin == 'upper')])
+
+        self._view = None
+        self._missing = []
+        image, extent = self.get_image(wait=True)
+        self.image = ax.imshow(image, extent=extent, **kws)
+
+        self.timer = ax.figure.canvas.new_timer(interval=poll_interval)
+        self.timer.add_callback(self._poll)
+        ax.callbacks.connect('xlim_changed', self._on_lim_change)
+        ax.callbacks.connect('ylim_changed', self._on_lim_change)
+
+    def get_level(self):
+        """Tile level matching the current axes limits and size"""
+        bbox = self.ax.bbox
+        if not (bbox.width and bbox.height):
+            return 0
+
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        nrows, ncols = self.tiles.shape
+        density = min(min(abs(x1 - x0), ncols) / bbox.width,
+                      min(abs(y1 - y0), nrows) / bbox.height)
+        return self.tiles.select_level(density)
+
+    def get_view(self):
+        """Level and tile ranges for the current axes limits"""
+        k = self.get_level()
+        rows, cols = self.tiles.get_tile_range(k, self.ax.get_xlim(),
+                                               self.ax.get_ylim())
+        return k, rows, cols
+
+    def get_image(self, wait=False):
+        """Mosaic and extent for the current view"""
+        self._view = self.get_view()
+        image, extent, self._missing = self.tiles.assemble(
+                *self._view, self.origin, wait)
+        return image, extent
+
+    def refresh(self, wait=False):
+        """
+        Update the image if the view requires different tiles, or if
+        previously missing tiles have been loaded.
+
+        Returns
+        -------
+        bool
+            Whether the image was updated
+        """
+        if (self.get_view() == self._view) and not self._missing:
+            return False
+
+        image, extent = self.get_image(wait)
+        self.image.set_data(image)
+        self.image.set_extent(extent)
+        if self._missing:
+            self.timer.start()
+        return True
+
+    def _on_lim_change(self, ax):
+        self.refresh()
+
+    def _poll(self):
+        cache = self.tiles.cache
+        if any(map(cache.is_pending, self._missing)):
+            return
+
+        # all tiles loaded. Any that have since been evicted from the cache
+        # (or failed to load) are read here
+        self.timer.stop()
+        self._missing = []
+        self._view = None  # force update
+        if self.refresh(wait=True):
+            self.ax.figure.canvas.draw_idle()
+
+    def set_tiles(self, tiles):
+        """Display a new `TiledImage`"""
+        self.tiles = tiles
+        self._view = None
+        self.refresh(wait=True)
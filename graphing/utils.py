@@ -1,3 +1,5 @@
+from statistics import NormalDist
+
 import numpy as np
 
 
@@ -7,6 +9,10 @@ def percentile(data, p, axis=None):
     `p` are interpreted as percentile distance below minimum.  Similarly for
     values of `p` greater than 100. Useful for scaling the axes of plots.
 
+    Masked elements and nans are ignored. When `axis` is given, this is done
+    for all the lanes along `axis` at once, without compressing them
+    individually.
+
     Parameters
     ----------
     data: array-like
@@ -15,10 +21,88 @@ def percentile(data, p, axis=None):
 
     Returns
     -------
-
+    np.ndarray
+        Percentiles with shape `(len(p),) + remaining dimensions`, with
+        singleton dimensions squeezed out.
     """
 
     data = np.asanyarray(data)
+    c, u, v, w = _percentile_coefficients(p)
+
+    if np.ma.isMA(data) or (data.dtype.kind == 'f' and np.isnan(data).any()):
+        # sort based algorithm that ignores masked points and nans
+        d, mn, mx = _nanpercentile(data, c, axis)
+    else:
+        d = np.zeros((len(c),) + _reduced_shape(data.shape, axis))
+        d[c > 0] = np.percentile(data, c[c > 0], axis)
+        mn, mx = data.min(axis), data.max(axis)
+
+    # broadcast coefficients along the remaining dimensions
+    u, v, w = (np.reshape(_, (-1,) + (1,) * np.ndim(mn)) for _ in (u, v, w))
+    d = np.where(np.reshape(c, u.shape) > 0, d, 0)
+    return np.squeeze(u * mn + v * mx + w * d)
+
+
+def _reduced_shape(shape, axis):
+    """Shape of an array with `shape` after reduction along `axis`"""
+    if axis is None:
+        return ()
+    axes = np.arange(len(shape))[list(np.atleast_1d(axis))]
+    return tuple(np.delete(shape, axes))
+
+
+def _nanpercentile(data, c, axis=None):
+    """
+    Percentiles `c` (in the interval [0, 100]) of `data` along `axis`,
+    ignoring masked elements and nans. The data are sorted along `axis`
+    (invalid elements sort to the end), and the percentiles interpolated
+    linearly between the valid elements of each lane, as for
+    `np.percentile`.
+
+    Returns
+    -------
+    d: np.ndarray
+        Percentiles with shape `(len(c),) + remaining dimensions`
+    mn, mx: np.ndarray
+        Minimum and maximum of the valid elements of each lane
+    """
+    data = np.ma.filled(np.ma.asarray(data, float), np.nan)
+    if axis is None:
+        data = data.ravel()
+    else:
+        # move reduction axes to the end and flatten them
+        axes = np.arange(data.ndim)[list(np.atleast_1d(axis))]
+        data = np.moveaxis(data, axes, range(-len(axes), 0))
+        data = data.reshape(data.shape[:data.ndim - len(axes)] + (-1,))
+
+    data = np.sort(data, axis=-1)
+    n = (~np.isnan(data)).sum(-1, keepdims=True)
+    last = np.maximum(n - 1, 0)
+
+    # fractional indices of the percentiles, shape (len(c), ..., 1)
+    index = np.multiply.outer(np.divide(c, 100), last)
+    lo = np.floor(index).astype(int)
+    hi = np.minimum(lo + 1, last)
+    frac = index - lo
+    below = np.take_along_axis(data[None], lo, -1)
+    above = np.take_along_axis(data[None], hi, -1)
+    d = (below + frac * (above - below))[..., 0]
+
+    mn, mx = data[..., 0], np.take_along_axis(data, last, -1)[..., 0]
+    # lanes without valid elements
+    empty = (n == 0)[..., 0]
+    if empty.any():
+        d[:, empty] = mn[empty] = mx[empty] = np.nan
+    return d, mn, mx
+
+
+def _percentile_coefficients(p):
+    """
+    Decompose the (extended) percentiles `p` (see `percentile`) into ordinary
+    percentiles `c` in the interval [0, 100], and coefficients `u`, `v`, `w`
+    such that the extended percentiles are ``u * min + v * max + w * d``,
+    where `d` is the ordinary `c` percentile (taken as 0 where `c` is 0).
+    """
     signum = np.array([-1, 1])
 
     p = np.array(p, ndmin=1)
@@ -28,29 +112,11 @@ def percentile(data, p, axis=None):
     r, q = np.divmod(a, 1)
     c = np.abs((p > 1).astype(float) - s * q) * 100
 
-    # remove masked points
-    if np.ma.is_masked(data):
-        if axis is not None:
-            raise NotImplementedError
-        else:
-            data = np.ma.compressed(data)
-
-    # get shape of output array
-    out_shape = (len(p),)
-    if axis is not None:
-        out_shape += tuple(np.take(data.shape, np.delete(np.arange(data.ndim),
-                                                         axis)))
-    ndo = len(out_shape)
-    #
-    d = np.zeros(out_shape)
-    d[c > 0] = np.percentile(data, c[c > 0], axis)
-
-    mn, mx, = data.min(axis, keepdims=True), data.max(axis, keepdims=True)
     p1 = (p > 1).astype(int)
-    s2 = np.array(signum[((0 < p) & (p < 1)).astype(int)], ndmin=ndo).T
-    u = np.array(p1 - s * np.ceil(a) + 1, ndmin=ndo).T
-    v = np.array(p1 + s * np.floor(a), ndmin=ndo).T
-    return np.squeeze(u * mn + v * mx + s2 * d)
+    w = signum[((0 < p) & (p < 1)).astype(int)]
+    u = p1 - s * np.ceil(a) + 1
+    v = p1 + s * np.floor(a)
+    return c, u, v, w
 
 
 def get_percentile_limits(data, plims=(-5, 105), e=(), axis=None):
@@ -70,15 +136,119 @@ def get_percentile_limits(data, plims=(-5, 105), e=(), axis=None):
     e: uncertainty (stddev, measurement errors)
         can be either single array of same shape as x, or 2 arrays (δx+, δx-)
     axis: None, int, tuple
-        axis along which to compute percentile
+        axis along which to compute percentile. For example, limits for each
+        row of an `(n_series, n_points)` block are computed at once with
+        `axis=1`.
+
+    Returns
+    -------
+    np.ndarray
+        Limits with shape (2,), or (2, ...) for the remaining dimensions if
+        `axis` is given.
     """
 
-    x = get_data_pm_1sigma(data, e)
-    lims = np.empty(2, data.dtype)
-    for i, (x, p) in enumerate(zip(x, plims)):
-        lims[i] = percentile(x, p, axis)
+    data = np.asanyarray(data)
+    lower, upper = get_data_pm_1sigma(data, e)
+    if lower is upper:
+        # both limits in a single pass
+        lims = percentile(data, plims, axis)
+    else:
+        lims = np.array([percentile(x, p, axis)
+                         for x, p in zip((lower, upper), plims)])
+
+    return np.asarray(lims).astype(data.dtype, copy=False)
+
+
+def get_bar_verts(counts, bin_edges, out=None, orientation='vertical',
+                  base=0):
+    """
+    Vertices of histogram bars as closed rectangles.
+
+    Parameters
+    ----------
+    counts: array-like
+        Bar heights, shape (n,)
+    bin_edges: array-like
+        Bin edges, shape (n + 1,)
+    out: np.ndarray, optional
+        Array of shape (n, 5, 2) to fill in place. A new array is allocated
+        if not given, or if its shape does not match.
+    orientation: {'vertical', 'horizontal'}
+        Orientation of the bars
+    base: float
+        Count-axis coordinate of the base of the bars.
+
+    Returns
+    -------
+    np.ndarray
+        Vertices, shape (n, 5, 2)
+    """
+    n = len(counts)
+    if (out is None) or (out.shape != (n, 5, 2)):
+        out = np.empty((n, 5, 2))
 
-    return lims
+    # index of the coordinate along the bin axis and along the count axis
+    v, c = (0, 1) if orientation.lower().startswith('v') else (1, 0)
+    counts = np.asarray(counts)
+    bin_edges = np.asarray(bin_edges)
+    out[:, 0, v] = bin_edges[:-1]
+    out[:, 1:3, v] = bin_edges[1:, None]
+    out[:, 3:, v] = bin_edges[:-1, None]
+    out[:, :2, c] = base
+    out[:, 2:4, c] = counts[:, None]
+    out[:, 4, c] = base
+    return out
+
+
+def extract_cutouts(frames, centres, size, indices=None):
+    """
+    Extract a square window from images in a stack into a single contiguous
+    array. Only the windows are read from `frames`, so memory use scales with
+    the number and size of the windows, not the size of the images. This
+    makes it suitable for memory mapped stacks. Windows that extend beyond
+    the edges of the images are padded with masked pixels.
+
+    Parameters
+    ----------
+    frames: array-like or FrameSource
+        Image stack, shape (nframes, nrows, ncols)
+    centres: array-like
+        Centre (row, column) of the window for each image, shape (n, 2).
+        Positions are rounded to the nearest pixel.
+    size: int
+        Size of the windows in pixels
+    indices: sequence of int, optional
+        Index of the frame for each window. Defaults to the first `n` frames.
+
+    Returns
+    -------
+    np.ma.MaskedArray
+        Cutouts with shape (n, size, size). Pixels outside the images, or
+        masked in `frames`, are masked.
+    """
+    size = int(size)
+    start = np.round(np.reshape(centres, (-1, 2))).astype(int) - size // 2
+    if indices is None:
+        indices = range(len(frames) if len(start) == 1 else len(start))
+    start = np.broadcast_to(start, (len(indices), 2))
+
+    # read only the part of each window that lies within the image
+    get_region = getattr(frames, 'get_region', None)
+    shape = np.array(frames.shape[1:])
+    lo = np.clip(start, 0, shape)
+    hi = np.clip(start + size, 0, shape)
+    out = np.ma.masked_all((len(indices), size, size), frames.dtype)
+    for k, i in enumerate(indices):
+        (r0, c0), (r1, c1) = lo[k], hi[k]
+        if r1 <= r0 or c1 <= c0:
+            continue
+
+        rows, cols = slice(r0, r1), slice(c0, c1)
+        region = (get_region(i, rows, cols) if get_region else
+                  frames[i, rows, cols])
+        (r, c) = start[k]
+        out[k, r0 - r:r1 - r, c0 - c:c1 - c] = region
+    return out
 
 
 def get_data_pm_1sigma(x, e=()):
@@ -108,3 +278,163 @@ def get_data_pm_1sigma(x, e=()):
         return x - e[0], x + e[1]
     else:
         return x - e, x + e
+
+
+def _valid(values):
+    """Flattened array of unmasked, non-nan elements of `values`"""
+    values = np.ma.compressed(values) if np.ma.isMA(values) else np.ravel(values)
+    if values.dtype.kind == 'f':
+        return values[~np.isnan(values)]
+    return values
+
+
+def _iter_chunks(data, chunk_size=2 ** 20):
+    """Iterate over blocks of rows of `data` containing ~`chunk_size` items"""
+    data = np.asanyarray(data)
+    if data.ndim < 2:
+        data = data.reshape(1, -1)
+    step = max(chunk_size // max(data[0].size, 1), 1)
+    for i in range(0, len(data), step):
+        yield data[i:i + step]
+
+
+def get_extrema(data, chunk_size=2 ** 20):
+    """
+    Min and max of unmasked, non-nan elements of `data`, computed chunk-wise
+    so that no full copy of the data is needed.
+    """
+    mn, mx = np.inf, -np.inf
+    for chunk in _iter_chunks(data, chunk_size):
+        chunk = _valid(chunk)
+        if chunk.size:
+            mn, mx = min(mn, chunk.min()), max(mx, chunk.max())
+    return mn, mx
+
+
+def strided_sample(data, n):
+    """
+    Deterministic subsample of about `n` elements of `data` taken on a regular
+    grid with equal stride along each axis. Masked and nan elements are
+    removed from the sample.
+    """
+    data = np.asanyarray(data)
+    step = int(np.ceil((data.size / n) ** (1 / data.ndim))) if n else 1
+    return _valid(data[(slice(None, None, max(step, 1)),) * data.ndim])
+
+
+def reservoir_sample(data, n, seed=None, chunk_size=2 ** 20):
+    """
+    Uniform random sample of `n` valid (unmasked, non-nan) elements of `data`
+    without replacement.  The data are streamed in chunks (reservoir sampling
+    algorithm R), so memory use is independent of the size of the data, which
+    makes this suitable for memory mapped arrays.
+
+    Parameters
+    ----------
+    data: array-like
+    n: int
+        Sample size
+    seed: int, optional
+        Seed for the random number generator. The sample is deterministic for
+        a given seed.
+    chunk_size: int
+        Approximate number of elements to process at once.
+
+    Returns
+    -------
+    np.ndarray
+    """
+    data = np.asanyarray(data)
+    rng = np.random.default_rng(seed)
+    reservoir = np.empty(n, data.dtype)
+    seen = 0
+    for chunk in _iter_chunks(data, chunk_size):
+        values = _valid(chunk)
+        # fill the reservoir
+        k = max(min(n - seen, len(values)), 0)
+        reservoir[seen:seen + k] = values[:k]
+        values = values[k:]
+        seen += k
+        if len(values):
+            # replace elements with decreasing probability
+            j = rng.integers(0, seen + np.arange(1, len(values) + 1))
+            keep = j < n
+            reservoir[j[keep]] = values[keep]
+            seen += len(values)
+
+    return reservoir[:min(seen, n)]
+
+
+def sample_pixels(data, n, method='strided', seed=None):
+    """
+    Subsample of about `n` valid pixels from `data`.
+
+    Parameters
+    ----------
+    data: array-like
+    n: int
+        Sample size
+    method: {'strided', 'reservoir'}
+        Sampling method. See `strided_sample` and `reservoir_sample`.
+    seed: int, optional
+        Seed for reservoir sampling
+
+    Returns
+    -------
+    np.ndarray
+    """
+    if method == 'strided':
+        return strided_sample(data, n)
+    if method == 'reservoir':
+        return reservoir_sample(data, n, seed)
+    raise ValueError(f'Unknown sampling method {method!r}')
+
+
+def estimate_percentile_limits(data, plims=(-5, 105), n_samples=2 ** 18,
+                               method='strided', confidence=0.95, seed=None):
+    """
+    Estimate percentile limits of `data` from a subsample of its pixels.  See
+    `get_percentile_limits` for the meaning of `plims`.  The exact extrema of
+    the data are included in the sample, so that limits outside the range
+    (0, 100) remain anchored on the true data range.
+
+    Parameters
+    ----------
+    data: array-like
+    plims: 2-tuple
+        Percentile limits
+    n_samples: int
+        Sample size
+    method: {'strided', 'reservoir'}
+        Sampling method
+    confidence: float
+        Confidence level for the error bounds
+    seed: int, optional
+        Seed for reservoir sampling
+
+    Returns
+    -------
+    lims: np.ndarray
+        Estimated limits, shape (2,)
+    bounds: np.ndarray
+        Lower and upper confidence bounds for each limit, shape (2, 2). These
+        follow from the binomial distribution of the rank of the sample
+        percentile.
+    """
+    sample = sample_pixels(data, n_samples, method, seed)
+
+    plims = np.asarray(plims, float)
+    if np.any((plims <= 0) | (plims >= 100)):
+        sample = np.hstack([sample, get_extrema(data)])
+
+    lims = get_percentile_limits(sample, plims)
+
+    # uncertainty in the sample quantile
+    n = len(sample)
+    z = NormalDist().inv_cdf(0.5 * (1 + confidence))
+    q = np.divmod(np.abs(plims) / 100, 1)[1]
+    q = np.where(plims >= 100, 1 - q, q)
+    dp = 100 * z * np.sqrt(q * (1 - q) / max(n, 1))
+    bounds = np.sort([percentile(sample, [p - d, p + d])
+                      for p, d in zip(plims, dp)], 1)
+    return lims, bounds
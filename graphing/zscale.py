@@ -1,116 +1,244 @@
+"""
+Vectorised implementation of the IRAF zscale algorithm for determining colour
+limits of astronomical images, with a batch mode for image cubes
+"""
+
 import numpy as np
-from scipy.optimize import leastsq
-#from misc import profile
+from astropy.visualization.interval import ZScaleInterval as _ZScaleInterval
+
+
+def _as_float_filled(data):
+    """Float array with masked elements replaced by nan"""
+    data = np.ma.asarray(data)
+    if not np.issubdtype(data.dtype, np.floating):
+        data = data.astype(float)
+    return np.ma.filled(data, np.nan)
+
+
+def _fit_lines(x, y, good):
+    """
+    Closed form least squares fit of straight lines `y = a + b * x` to each
+    row of `y`, using only the points where `good` is True.
+
+    Returns
+    -------
+    intercept, slope: np.ndarray
+    """
+    s = good.sum(1)
+    sx = (good * x).sum(1)
+    sy = (good * y).sum(1)
+    sxx = (good * x * x).sum(1)
+    sxy = (good * x * y).sum(1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (s * sxy - sx * sy) / (s * sxx - sx * sx)
+        intercept = (sy - slope * sx) / s
+    return intercept, slope
+
+
+def sample(frames, n_samples=1000):
+    """
+    Deterministic, evenly strided sample of at most `n_samples` pixels from
+    each row of the 2D array `frames`, sorted in ascending order. Nans sort
+    to the end of each row.
+    """
+    step = max(frames.shape[1] // int(n_samples), 1)
+    return np.sort(frames[:, ::step][:, :int(n_samples)], axis=1)
+
+
+def zscale(frames, n_samples=1000, contrast=0.25, sigma_clip=2.5,
+           max_reject=0.5, min_pix=5, maxiter=5):
+    """
+    Zscale colour limits for each row of `frames` in a single vectorised
+    pass.
+
+    A straight line is fit (in closed form) to the sorted sample of pixel
+    values of each frame. Points with residuals larger than `sigma_clip`
+    times the standard deviation of the residuals are rejected, and the fit
+    repeated until no more points are rejected, or `maxiter` iterations have
+    been done. The colour limits follow from the slope of the line, scaled by
+    `contrast`, about the median of the sample, and are restricted to the
+    range of the sample. If more than `max_reject` of the sample (or all but
+    `min_pix` points) is rejected, the limits are the minimum and maximum of
+    the sample.
+
+    Parameters
+    ----------
+    frames: np.ndarray
+        Float array with shape (n, npix). Invalid pixels should be nan.
+
+    Returns
+    -------
+    np.ndarray
+        Colour limits with shape (n, 2)
+    """
+    y = sample(frames, n_samples)
+    x = np.arange(y.shape[1], dtype=float)
+    good = ~np.isnan(y)
+    n_valid = good.sum(1)
+
+    # extrema of the (sorted) sample
+    rows = np.arange(len(y))
+    vmin, vmax = y[:, 0], y[rows, np.maximum(n_valid - 1, 0)]
+    y = np.where(good, y, 0)
+
+    min_good = np.maximum(min_pix, (1 - max_reject) * n_valid)
+    failed = n_valid < min_good
+    active = ~failed
+    for _ in range(int(maxiter)):
+        if not active.any():
+            break
+
+        intercept, slope = _fit_lines(x, y, good)
+        resid = np.where(good, y - intercept[:, None] - slope[:, None] * x, 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt((resid * resid).sum(1) / good.sum(1))
+        keep = good & (np.abs(resid) <= sigma_clip * std[:, None])
+
+        # only update rows that are still being clipped
+        changed = active & (keep != good).any(1)
+        good[changed] = keep[changed]
+        failed |= changed & (good.sum(1) < min_good)
+        active = changed & ~failed
+
+    intercept, slope = _fit_lines(x, y, good)
+    if contrast > 0:
+        slope = slope / contrast
+
+    # median of the valid (sorted) sample values
+    lo, hi = (n_valid - 1) // 2, n_valid // 2
+    median = (y[rows, np.maximum(lo, 0)] + y[rows, np.maximum(hi, 0)]) / 2
+    centre = (n_valid - 1) // 2
+
+    lims = np.c_[vmin, vmax]
+    ok = ~failed & np.isfinite(slope)
+    lims[ok, 0] = np.maximum(vmin, median - (centre - 1) * slope)[ok]
+    lims[ok, 1] = np.minimum(vmax, median + (n_valid - centre) * slope)[ok]
+    return lims
+
+
+def zrange(data, axis=None, mask=None, contrast=1 / 100, Npix=None, **kws):
+    """
+    Colour limits for astronomical images based on the zscale algorithm used
+    by the IRAF display task. Masked pixels and nans are ignored.
+
+    Note that the default `contrast` of 1/100 is that of earlier versions of
+    this function, and differs from the default of `zscale` and
+    `ZScaleInterval` (0.25, as in astropy), which give wider limits.
+
+    Parameters
+    ----------
+    data: array-like
+        Image, or stack of images
+    axis: int, optional
+        If given, `data` is treated as a stack of images along `axis`, and
+        the limits of each image are computed in a single vectorised pass.
+    mask: array-like, optional
+        Boolean mask of pixels to ignore (True), as for masked arrays. This
+        is combined with the mask of `data`, and should broadcast against it.
+    contrast: float
+        Scaling of the slope of the fitted line
+    Npix: int, optional
+        Number of pixels sampled from each image. Alias for `n_samples`.
+    kws:
+        Parameters for the algorithm. See `zscale`.
+
+    Returns
+    -------
+    np.ndarray
+        Colour limits (vmin, vmax) with shape (2,), or (n, 2) if `axis` is
+        given.
+    """
+    if mask is not None:
+        data = np.ma.asarray(data)
+        data = np.ma.array(data, mask=np.ma.getmaskarray(data) | mask)
+    if Npix is not None:
+        kws['n_samples'] = Npix
+
+    data = _as_float_filled(data)
+    if axis is None:
+        return zscale(data.reshape(1, -1), contrast=contrast, **kws)[0]
+
+    data = np.moveaxis(data, axis, 0)
+    return zscale(data.reshape(len(data), -1), contrast=contrast, **kws)
+
 
-#####################################################################################################
 class Zscale(object):
-    #TODO Equivalence dict
+    """
+    Zscale colour limits with the interface of earlier versions of this
+    module. This is a thin wrapper around `zrange`, kept for backwards
+    compatibility. Note that pixels are sampled deterministically (see
+    `sample`) rather than at random.
+    """
+
     def __init__(self, **kw):
-        '''
-        Class that implements the IRAF zscale algorithm to determine colour 
-        limits for displaying astronomical images
-        '''
-        self.count              = 0
-        self.rejects            = 0
-        #self.data               = np.asarray( data )
-        self.sigma_clip         = kw.get('sigma_clip', 3.5)
-        self.maxiter            = kw.get('maxiter', 10)
-        self.Npix               = kw.get('Npix', 1000)
-        self.min_pix            = kw.get('min_pix', 100)
-        self.max_pix_frac       = kw.get('max_pix_frac', 0.5)
-        self.mask               = kw.get( 'mask' )
-       
-    #====================================================================================================
-    #def __call__(self, data):
-    
-    #====================================================================================================
-    def apply_mask(self, data):
-        '''Apply bad pixel mask if given. Return flattened array'''
-        if self.mask is None:
-            return data.ravel()
-        else:
-            assert data.shape==self.mask.shape, 'Mask and data have unequal shapes.' 
-            return data[self.mask]
-
-    #====================================================================================================
-    def resample(self, data):
-        '''Resample data without replacement.'''
-        Npix = self.Npix
-        mfrac = self.max_pix_frac
-        
-        if Npix < self.min_pix:
-            Npix = self.min_pix                #use at least this many pixels
-        
-        if Npix > data.size*mfrac:
-            Npix = int(data.size*mfrac)           #use at most half of the image pixels
-        
-        return np.random.choice(data, size=Npix, replace=False)
-    
-    #====================================================================================================
-    #TODO: memoize?
+        """
+        Parameters
+        ----------
+        sigma_clip: float
+            Rejection threshold in units of the standard deviation of the
+            residuals
+        maxiter: int
+            Maximum number of rejection iterations
+        Npix: int
+            Number of pixels sampled
+        min_pix: int
+            Minimum number of pixels sampled
+        max_pix_frac: float
+            Maximum fraction of the pixels sampled
+        mask: array-like, optional
+            Boolean array selecting the pixels to use (True)
+        """
+        self.sigma_clip = kw.get('sigma_clip', 3.5)
+        self.maxiter = kw.get('maxiter', 10)
+        self.Npix = kw.get('Npix', 1000)
+        self.min_pix = kw.get('min_pix', 100)
+        self.max_pix_frac = kw.get('max_pix_frac', 0.5)
+        self.mask = kw.get('mask')
+        self.z1 = self.z2 = None
+
     def range(self, data, **kw):
-        '''
-        Algorithm to determine colour limits for astronomical images based on 
-        zscale algorithm used by IRAF display task.
-        '''
-        #if data is None: 
-            #data = self.data
-        if self.count==0:
-            #remove bad pixels and flatten
-            data = self.apply_mask(data)
-            #save range and size of original resampled data 
-            self.original_data_range = np.min(data), np.max(data)
-            self.original_data_size = data.size
-            #resample and sort ascending
-            data = np.sort( self.resample(data), axis=None )   
-            
-        
-        Il = len(data)
-        Ir = np.arange(Il)
-        Im = np.median(data)
-        
-        #fit a straight line to the resampled, sorted pixel values
-        line            = lambda p, data : (p[0]*Ir + p[1])
-        residuals       = lambda p, data : np.abs( data - line(p,data) )
-         #initial guess for slope / intercep
-        m0 = np.ptp(data) / Il                  #= data[-1]-data[0] #can speed this up since data are sorted
-        p0 = m0, 0
-        fit, _ = leastsq(residuals, p0, data)
-
-        #Assume residuals are normally distributed and clip values outside acceptable confidence interval
-        res = residuals(fit, data)
-        clipped = res > res.std() * self.sigma_clip
-
-        if clipped.any() and self.count < self.maxiter:
-            self.count += 1
-            self.rejects += clipped.sum()
-            #print('rejects: ', self.rejects )
-            if self.rejects > self.original_data_size//2:                 #if more than half the original datapoints are rejected return original data range
-                return self.original_data_range
-            else:
-                return self.range(data[~clipped], **kw)
-        else:
-            contrast = kw.get('contrast', 1./100)
-            midpoint = Il/2
-            slope = fit[0]
-            z1 = Im + (slope/contrast)*(1.-midpoint)
-            z2 = Im + (slope/contrast)*(Il-midpoint)
-            #restrict colour limits to data limits
-            self.z1 = max(self.original_data_range[0], z1)
-            self.z2 = min(self.original_data_range[-1], z2)
-            self.count = 0
-            self.rejects = 0
-            return self.z1, self.z2
-
-#####################################################################################################
-def zrange(data, **kw):
-    '''
-    Algorithm to determine colour limits for astronomical images based on zscale
-    algorithm used by IRAF display task.
-    '''
-    contrast = kw.pop('contrast', 1./100)
-    #TODO: resolve multiple masks
-    if np.ma.is_masked( data ):
-        kw['mask'] = data.mask          #WARNING:  this overwrites any explicit provided mask
-    
-    return Zscale( **kw ).range( data, contrast=contrast )
\ No newline at end of file
+        """
+        Zscale colour limits of `data`. The `contrast` (default 1/100) can be
+        given as a keyword.
+        """
+        data = np.ma.asarray(data)
+        mask = None if self.mask is None else ~np.asarray(self.mask, bool)
+        size = data.count() if mask is None else (~(mask | data.mask)).sum()
+        n_samples = max(self.Npix, self.min_pix)
+        n_samples = max(min(n_samples, int(size * self.max_pix_frac)), 1)
+        self.z1, self.z2 = zrange(data, mask=mask,
+                                  contrast=kw.get('contrast', 1 / 100),
+                                  n_samples=n_samples,
+                                  sigma_clip=self.sigma_clip,
+                                  maxiter=self.maxiter)
+        return self.z1, self.z2
+
+
+class ZScaleInterval(_ZScaleInterval):
+    """
+    Drop-in replacement for `astropy.visualization.ZScaleInterval` that uses
+    the vectorised `zscale` engine, ignores masked pixels, and can compute
+    limits for a stack of images in one pass with `get_limits_batch`.
+    """
+
+    @classmethod
+    def from_astropy(cls, interval):
+        """Equivalent of an `astropy.visualization.ZScaleInterval` instance"""
+        new = cls.__new__(cls)
+        new.__dict__.update(vars(interval))
+        return new
+
+    def _get_params(self):
+        return dict(n_samples=self.n_samples,
+                    contrast=self.contrast,
+                    sigma_clip=self.krej,
+                    max_reject=self.max_reject,
+                    min_pix=self.min_npixels,
+                    maxiter=self.max_iterations)
+
+    def get_limits(self, values):
+        return tuple(zrange(values, **self._get_params()))
+
+    def get_limits_batch(self, frames):
+        """Colour limits for each image in the stack `frames` (axis 0)"""
+        return zrange(frames, 0, **self._get_params())
@@ -0,0 +1,109 @@
+import threading
+
+import numpy as np
+import pytest
+import matplotlib
+
+matplotlib.use('Agg')
+
+from graphing.background import BackgroundJobs
+from graphing.imagine import ImageDisplay, VideoDisplay
+
+
+def test_stale_results_discarded():
+    jobs = BackgroundJobs()
+    release = threading.Event()
+    results = []
+    jobs.submit('a', release.wait, callback=results.append)
+    for i in range(5):
+        jobs.submit('a', pow, i, 2, callback=results.append)
+    jobs.submit('b', pow, 3, 2, callback=results.append)
+
+    release.set()
+    assert jobs.wait(1) == 2
+    assert sorted(results) == [9, 16]
+    assert jobs.discarded == 5
+    assert not jobs.is_pending('a')
+    jobs.close()
+
+
+def test_image_display_async():
+    image = np.random.randn(200, 300)
+    im = ImageDisplay(image, autosize=False, async_stats=True)
+    assert im.jobs is not None
+    # shown immediately with limits from a sample of the pixels
+    assert len(im.pixel_stats) < image.size
+
+    im.jobs.wait(5)
+    ref = ImageDisplay(image, autosize=False, async_stats=False)
+    assert len(im.pixel_stats) == image.size
+    assert np.allclose(im.imagePlot.get_clim(), ref.imagePlot.get_clim())
+    assert np.allclose(im.histogram.counts, ref.histogram.counts)
+
+
+def test_video_display_async():
+    data = np.random.randn(10, 32, 32) * np.arange(1, 11)[:, None, None]
+    vd = VideoDisplay(data, autosize=False, async_stats=True)
+    vd.jobs.wait(5)
+    clim = vd.imagePlot.get_clim()
+
+    # scrolling quickly only applies the statistics of the last frame
+    for i in range(1, 6):
+        vd.update(i, draw=False)
+    assert vd.imagePlot.get_clim() == clim
+    vd.jobs.wait(5)
+
+    ref = VideoDisplay(data, autosize=False, async_stats=False)
+    ref.update(5, draw=False)
+    assert np.allclose(vd.imagePlot.get_clim(), ref.imagePlot.get_clim())
+    assert np.allclose(vd.histogram.counts, ref.histogram.counts)
+
+
+@pytest.mark.parametrize('interactive', [False, True])
+def test_image_grid_async(monkeypatch, interactive):
+    from graphing import imagine
+
+    monkeypatch.setattr(ImageDisplay, 'async_threshold', 1000)
+    monkeypatch.setattr(imagine, 'is_interactive', lambda canvas: interactive)
+    rng = np.random.default_rng(0)
+    images = [rng.normal(0, k, (40, 40)) for k in range(1, 5)]
+    fig, axes, imd = imagine.plot_image_grid(images, clim_all=True)
+    if interactive:
+        imd.jobs.wait(5)
+    else:
+        # statistics are computed immediately for non-interactive backends
+        assert imd.jobs is None
+
+    # colour limits and histogram of all the pixels. The limits are
+    # approximate quantiles, so compare their ranks
+    pixels = np.concatenate([im.ravel() for im in images])
+    ranks = [np.mean(pixels < clim) for clim in imd.imagePlot.get_clim()]
+    assert np.allclose(ranks, np.divide(imd._default_plims, 100), atol=0.01)
+    assert imd.histogram.table.n == pixels.size
+
+
+def test_auto_non_interactive(monkeypatch):
+    monkeypatch.setattr(ImageDisplay, 'async_threshold', 1000)
+    image = np.random.randn(100, 100)
+    im = ImageDisplay(image, autosize=False)
+    # Agg timers never fire, so the exact statistics are computed immediately
+    assert im.jobs is None
+    assert len(im.pixel_stats) == image.size
+
+
+def test_astro_display_async():
+    from astropy.visualization import SqrtStretch
+    from graphing.imagine import AstroImageDisplay
+
+    rng = np.random.default_rng(3)
+    data = rng.normal(100, 10, (200, 300))
+    im = AstroImageDisplay(data, interval='minmax', stretch='sqrt',
+                           async_stats=True, autosize=False)
+    norm = im.imagePlot.norm
+    im.jobs.wait(5)
+
+    # the interval and stretch are used for the exact limits, and the norm
+    # is only modified on the main thread
+    assert np.allclose(im.imagePlot.get_clim(), (data.min(), data.max()))
+    assert im.imagePlot.norm is norm is im.norm
+    assert isinstance(norm.stretch, SqrtStretch)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from astropy.visualization.interval import (MinMaxInterval, ManualInterval,
+                                            PercentileInterval)
+
+from graphing.clims import (batch_limits, compute_clims, fingerprint,
+                            LimitsCache)
+
+np.random.seed(42)
+cube = np.random.randn(20, 16, 12)
+masked = np.ma.array(cube, mask=np.random.rand(*cube.shape) > 0.9)
+
+
+@pytest.mark.parametrize('interval', [MinMaxInterval(),
+                                      ManualInterval(None, 1),
+                                      PercentileInterval(95)])
+def test_batch_limits(interval):
+    lims = batch_limits(masked, interval)
+    expected = [interval.get_limits(image.compressed()) for image in masked]
+    assert np.allclose(lims, expected)
+
+
+def test_sidecar(tmp_path):
+    filename = tmp_path / 'cube.npy'
+    np.save(filename, cube)
+    interval = PercentileInterval(99)
+    clims = compute_clims(filename, interval, chunk_size=3)
+    assert len(list(tmp_path.glob('cube.clims.*.npy'))) == 1
+    assert np.allclose(clims, compute_clims(filename, interval))
+
+
+def test_sidecar_read_only(tmp_path, monkeypatch, caplog):
+    filename = tmp_path / 'cube.npy'
+    np.save(filename, cube)
+
+    def save(*args):
+        raise PermissionError('read-only')
+
+    monkeypatch.setattr(np, 'save', save)
+    clims = compute_clims(filename, MinMaxInterval())
+    assert np.allclose(clims, batch_limits(cube, MinMaxInterval()))
+    assert 'Could not save' in caplog.text
+
+
+def test_display_clims():
+    import matplotlib
+    matplotlib.use('Agg')
+    from graphing.imagine import VideoDisplay
+
+    vd = VideoDisplay(cube, autosize=False)
+    clims = vd.precompute_clims(sidecar=False)
+    assert np.array_equal(vd.get_frame_clim(3, cube[3]), clims[3])
+
+    # limits are discarded when the interval changes
+    vd.norm.interval = PercentileInterval(50)
+    assert vd.clims is None
+    assert np.allclose(vd.get_frame_clim(3, cube[3]),
+                       PercentileInterval(50).get_limits(cube[3]))
+
+
+def test_limits_cache():
+    image = np.random.randn(100, 100)
+    cache = LimitsCache(maxsize=2)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return image.min(), image.max()
+
+    interval = PercentileInterval(98)
+    assert cache.get(image, compute, interval) == cache.get(image, compute,
+                                                            interval)
+    assert len(calls) == 1
+    # different parameters
+    cache.get(image, compute, PercentileInterval(95))
+    assert len(calls) == 2
+    # views and copies have different fingerprints
+    assert fingerprint(image) != fingerprint(image.copy())
+    assert fingerprint(image) != fingerprint(image[::2])
+    assert fingerprint(image) != fingerprint(np.ma.masked_greater(image, 1))
+
+    # sampled in place modification changes the fingerprint
+    key = fingerprint(image)
+    image[0, 0] += 1
+    assert fingerprint(image) != key
+
+    cache.get(image, compute, interval)
+    assert len(cache) == 2
+    cache.invalidate(image)
+    assert len(cache) == 0
@@ -0,0 +1,108 @@
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+
+from graphing.imagine import Compare3DImage
+
+
+Y, X = np.mgrid[:20, :30]
+Z = np.exp(-((X - 15) ** 2 + (Y - 10) ** 2) / 20)
+
+
+def test_make_segments():
+    segments = Compare3DImage.make_segments(X, Y, Z)
+    assert segments.shape == (50, 30, 3)
+
+    xlines = np.r_['-1,3,0', X, Y, Z]
+    assert np.array_equal(segments[:20], xlines)
+    assert np.array_equal(segments[20:, :20], xlines.transpose(1, 0, 2))
+    # short lines padded with their last point
+    assert np.all(segments[20:, 20:] == segments[20:, 19:20])
+
+    # buffer reused in place
+    out = Compare3DImage.make_segments(X, Y, 2 * Z, segments)
+    assert out is segments
+    assert np.array_equal(out[:20, :, 2], 2 * Z)
+
+    assert Compare3DImage.make_segments(X, Y, Z, stride=4).shape == (13, 8, 3)
+
+
+def test_update_reuses_buffers():
+    data = Z + np.random.randn(*Z.shape) * 0.05
+    comp = Compare3DImage(X, Y, Z, np.ma.masked_greater(data, 0.9))
+    comp.fig.canvas.draw()
+    buffers = list(comp._segments)
+
+    comp.update(X, Y, Z, data)
+    comp.fig.canvas.draw()
+    assert all(a is b for a, b in zip(buffers, comp._segments))
+    assert comp.plots[0]._segments3d is buffers[0]
+    assert np.array_equal(buffers[0][:20, :, 2], data)
+
+
+def gaussian(p, grid):
+    # evaluates parameter rows (amplitude, y0, x0) of any leading shape
+    a, y0, x0 = (np.asarray(p)[..., k, None, None] for k in range(3))
+    y, x = grid
+    return a * np.exp(-((x - x0) ** 2 + (y - y0) ** 2) / 4)
+
+
+def test_extract_cutouts():
+    from graphing.utils import extract_cutouts
+
+    frames = np.arange(2 * 10 * 12.).reshape(2, 10, 12)
+    cutouts = extract_cutouts(frames, [[5, 6], [0.2, 11]], 5)
+    assert cutouts.shape == (2, 5, 5)
+    assert np.array_equal(cutouts[0], frames[0, 3:8, 4:9])
+    # windows beyond the edges are masked
+    assert cutouts.mask[1, :2].all() and cutouts.mask[1, :, 3:].all()
+    assert np.array_equal(cutouts[1, 2:, :3], frames[1, :3, 9:])
+
+
+def test_extract_cutouts_memmap(tmp_path):
+    from graphing.frames import as_frame_source
+    from graphing.utils import extract_cutouts
+
+    frames = np.ma.masked_greater(np.random.randn(6, 40, 50), 2)
+    np.save(tmp_path / 'cube.npy', frames.data)
+    source = as_frame_source(np.load(tmp_path / 'cube.npy', mmap_mode='r'))
+    # full frames are never read
+    source.get_frame = source.get_frames = None
+
+    cutouts = extract_cutouts(source, [[20, 25], [1, 48]], 7, [4, 2])
+    assert not np.ma.isMA(source.get_region(0, slice(2), slice(2)))
+    assert np.array_equal(cutouts[0], frames.data[4, 17:24, 22:29])
+    assert cutouts.mask[1, :2].all() and cutouts.mask[1, :, 5:].all()
+    assert np.array_equal(cutouts[1, 2:, :5], frames.data[2, :5, 45:])
+
+    # masks of in-memory stacks are kept
+    cutouts = extract_cutouts(frames, [[20, 25]], 7, [3])
+    assert np.array_equal(cutouts.mask[0], frames.mask[3, 17:24, 22:29])
+
+
+def test_psf_batch():
+    from graphing.imagine import PSFPlotter
+
+    n = 6
+    rng = np.random.default_rng(1)
+    coords = np.c_[20 + rng.random(n) * 5, 30 + rng.random(n) * 5]
+    params = np.c_[np.full(n, 10.), coords - np.round(coords) + 5]
+    frames = rng.normal(0, 0.1, (n, 50, 60))
+
+    for vectorized in (False, True):
+        psf = PSFPlotter(frames, gaussian, params, coords, 11,
+                         vectorized=vectorized)
+        data, model, residual = psf.compute_batch(2, 5)
+        assert data.shape == model.shape == residual.shape == (3, 11, 11)
+        assert np.allclose(model[0], gaussian(params[2], psf.grid))
+        assert np.allclose(residual, data - model)
+
+        # scrubbing reads from the stacks
+        psf.update(3)
+        assert np.array_equal(psf.images[0].get_array(), data[1])
+        assert np.array_equal(psf.images[2].get_array(), residual[1])
+
+        # frames outside the batch computed on demand
+        image, _, _ = psf.get_stacks(0)
+        r, c = np.round(coords[0]).astype(int) - 5
+        assert np.array_equal(image, frames[0, r:r + 11, c:c + 11])
@@ -0,0 +1,29 @@
+import numpy as np
+import matplotlib
+
+matplotlib.use('Agg')
+
+from matplotlib.image import imread
+
+from graphing.imagine import VideoDisplayX
+from graphing.export import FrameRenderer
+
+data = np.random.rand(6, 20, 30)
+coords = np.random.rand(6, 2, 2) * 20
+
+
+def test_export_png(tmp_path):
+    vd = VideoDisplayX(data, coords, autosize=False)
+    files = vd.export(tmp_path / 'frame.png', 1, 4, n_jobs=1, scale=2)
+    assert [f.name for f in files] == ['frame00001.png', 'frame00002.png',
+                                       'frame00003.png']
+    assert imread(files[0]).shape == (40, 60, 4)
+
+
+def test_render_apertures():
+    vd = VideoDisplayX(data, coords, autosize=False)
+    renderer = FrameRenderer.from_display(
+            vd, aperture_properties=dict(widths=5, heights=5, edgecolor='m'))
+    rgba = renderer.render(3)
+    assert rgba.shape == (20, 30, 4)
+    assert np.array_equal(renderer.aps.get_offsets(), coords[3, :, ::-1])
@@ -0,0 +1,76 @@
+import pickle
+
+import numpy as np
+
+from graphing.frames import (FrameCache, ArrayFrames, MemmapFrames, NpyFrames,
+                             as_frame_source, map_chunks)
+
+data = np.random.rand(20, 16, 16)
+
+
+def test_cache_hits():
+    cache = FrameCache(data.__getitem__, len(data), readahead=0)
+    for i in (0, 1, 0, 1):
+        assert np.all(cache.get(i) == data[i])
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_cache_budget():
+    cache = FrameCache(data.__getitem__, len(data), data[0].nbytes * 3,
+                       readahead=0)
+    for i in range(5):
+        cache.get(i)
+    assert cache.nbytes <= cache.max_bytes
+    assert list(cache._frames) == [2, 3, 4]
+
+
+def test_readahead_direction():
+    cache = FrameCache(data.__getitem__, len(data), readahead=2, wrap=False)
+    assert list(cache.get_readahead(5)) == [6, 7]
+    assert list(cache.get_readahead(4)) == [3, 2]
+    assert list(cache.get_readahead(19)) == []
+    cache.close()
+
+
+def test_frame_sources(tmp_path):
+    filename = tmp_path / 'cube.npy'
+    np.save(filename, data)
+    for obj, kls in [(data, ArrayFrames), (filename, NpyFrames)]:
+        frames = as_frame_source(obj)
+        assert isinstance(frames, kls)
+        assert frames.shape == data.shape
+        assert len(frames) == len(data)
+        assert np.all(frames.get_frame(3) == data[3])
+        assert np.all(frames.get_frames(slice(2, 5)) == data[2:5])
+        assert np.all(frames[2:5, 0] == data[2:5, 0])
+
+
+def test_pickle_memmap(tmp_path):
+    filename = tmp_path / 'cube.npy'
+    np.save(filename, data)
+    mm = np.load(filename, mmap_mode='r')
+
+    # views re-open the map at their offset rather than copying the data
+    frames = as_frame_source(mm[5:12])
+    assert isinstance(frames, MemmapFrames) and not frames.in_memory
+    clone = pickle.loads(pickle.dumps(frames))
+    assert isinstance(clone.data, np.memmap)
+    assert np.array_equal(clone.get_frames(), data[5:12])
+
+    # non-contiguous views are copied
+    frames = as_frame_source(mm[::2])
+    assert frames.in_memory
+    assert np.array_equal(pickle.loads(pickle.dumps(frames)).get_frames(),
+                          data[::2])
+
+
+def test_map_chunks():
+    chunks = [slice(i, i + 6) for i in range(0, len(data), 6)]
+    result = map_chunks(_chunk_sum, as_frame_source(data), chunks, n_jobs=2,
+                        max_in_flight=1)
+    assert np.allclose(list(result),
+                       [data[index].sum() for index in chunks])
+
+
+def _chunk_sum(frames, index):
+    return frames.get_frames(index).sum()
@@ -0,0 +1,63 @@
+import numpy as np
+import matplotlib
+
+matplotlib.use('Agg')
+
+from graphing.imagine import plot_image_grid
+
+images = [np.random.randn(20, 20) * (i + 1) for i in range(6)]
+
+
+def test_shared_norm():
+    fig, axes, imd = plot_image_grid(images, clim_all=True)
+    shared = imd.linked_norm
+    assert len(shared) == len(images)
+    assert all(art.norm is shared.norm for art in shared.artists)
+
+    axes[0, 0].set_visible(False)
+    draw_list = imd.set_clim(-1, 1)
+    assert shared.artists[0] not in draw_list
+    assert all(art.get_clim() == (-1, 1) for art in shared.artists)
+
+
+def test_paged_gallery(tmp_path):
+    filenames = []
+    for i, image in enumerate(images):
+        filenames.append(tmp_path / f'{i}.npy')
+        np.save(filenames[-1], image)
+
+    gallery = plot_image_grid(filenames, (2, 2), paged=True, thumb_size=8,
+                              n_workers=0)
+    assert (gallery.n_pages, len(gallery.axes)) == (2, 4)
+    # without workers, thumbnails are not loaded in the background
+    assert len(gallery._pending) == 4
+    for i in range(4):
+        gallery.cache.get(i)
+    gallery._poll()
+    assert not gallery._pending
+    assert gallery.art[0].get_array().shape == (7, 7)
+
+    gallery.next_page()
+    assert [ax.get_visible() for ax in gallery.axes] == [True] * 2 + [False] * 2
+
+
+def test_display_keywords():
+    fig, axes, imd = plot_image_grid(images[:2], cmap='magma', origin='upper')
+    assert imd.imagePlot.get_cmap().name == 'magma'
+    assert all(ax.images[0].origin == 'upper' for ax in axes.ravel())
+
+
+def test_rgb_thumbnail(tmp_path):
+    from matplotlib import pyplot as plt
+    from graphing.gallery import load_image, make_thumbnail
+
+    filename = tmp_path / 'image.png'
+    plt.imsave(filename, np.random.rand(40, 30, 3))
+    image = load_image(filename)
+    thumb, factor, clim = make_thumbnail(image, size=16)
+    assert (factor, thumb.shape) == (3, (14, 10, 4))
+    assert np.allclose(thumb[0, 0], image[:3, :3].mean((0, 1)))
+
+    # integer channels keep their dtype
+    image = (image * 255).astype(np.uint8)
+    assert make_thumbnail(image, size=16)[0].dtype == np.uint8
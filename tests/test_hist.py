@@ -0,0 +1,41 @@
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from graphing.hist import Histogram
+
+np.random.seed(11)
+
+
+def check_bars(hist, ax):
+    # compare the bar polygons against the rectangles drawn by `ax.bar`
+    edges = hist.bin_edges
+    reference = ax.bar(edges[:-1], hist.counts, np.diff(edges), align='edge')
+    paths = hist.bars.get_paths()
+    assert len(paths) == len(reference.patches) == hist.n
+
+    for path, patch in zip(paths, reference.patches):
+        x, y = path.vertices.T
+        assert np.allclose([x.min(), x.max()],
+                           [patch.get_x(), patch.get_x() + patch.get_width()])
+        assert np.allclose([y.min(), y.max()],
+                           [patch.get_y(), patch.get_y() + patch.get_height()])
+    reference.remove()
+
+
+def test_update_bars():
+    fig, ax = plt.subplots()
+    hist = Histogram(np.random.randn(1000), bins=10)
+    hist.plot(ax)
+    check_bars(hist, ax)
+
+    # same number of bins: vertex buffer is reused
+    hist(np.random.randn(1000) + 1, bins=10)
+    check_bars(hist, ax)
+
+    # different number of bins: vertex buffer is reallocated
+    hist(np.random.rand(500), bins=17)
+    check_bars(hist, ax)
+    assert np.allclose(hist.bars.get_array(), hist.counts / hist.counts.max())
+    plt.close(fig)
@@ -0,0 +1,63 @@
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from astropy.visualization import ImageNormalize, SqrtStretch
+
+from graphing.lut import ColourLookup, LookupImage, supports
+
+
+rng = np.random.default_rng(0)
+image = rng.integers(0, 4000, (64, 48)).astype(np.uint16)
+
+
+def get_norm():
+    return ImageNormalize(vmin=100, vmax=3000, stretch=SqrtStretch())
+
+
+def test_lookup_matches_colour_map():
+    norm, cmap = get_norm(), plt.get_cmap('viridis')
+    lookup = ColourLookup(norm, cmap)
+    expected = cmap(norm(image), bytes=True)
+    assert np.array_equal(lookup(image), expected)
+
+    # signed data
+    signed = (image.astype(int) - 2000).astype(np.int16)
+    assert np.array_equal(lookup(signed), cmap(norm(signed), bytes=True))
+
+    # masked pixels get the bad colour
+    masked = np.ma.masked_greater(image, 3900)
+    rgba = lookup(masked)
+    assert (rgba[masked.mask] == cmap(np.ma.masked, bytes=True)).all()
+
+    # reuse of output buffer, table only rebuilt on change
+    table = lookup.table
+    out = lookup(image + 1, rgba)
+    assert out is rgba
+    assert lookup.table is table
+    norm.vmax = 2000
+    lookup(image)
+    assert lookup.table is not table
+
+    assert supports(image) and not supports(image.astype(float))
+    assert not supports(image.astype(np.int32))
+
+
+def test_lookup_image():
+    fig, ax = plt.subplots()
+    im = LookupImage.from_image(ax.imshow(image, norm=get_norm()))
+    assert im in ax.images and len(ax.images) == 1
+    fig.canvas.draw()
+    assert np.array_equal(im._rgba, im.to_rgba(image, bytes=True))
+
+    # rendering follows changes to the colour limits
+    im.set_clim(0, 1000)
+    fig.canvas.draw()
+    assert np.array_equal(im._rgba, im.to_rgba(image, bytes=True))
+    assert np.array_equal(im.get_array(), image)
+
+    # and to changes of the norm that do not notify the image
+    with im.norm.callbacks.blocked():
+        im.norm.vmax = 500
+    fig.canvas.draw()
+    assert np.array_equal(im._rgba, im.to_rgba(image, bytes=True))
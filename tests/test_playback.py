@@ -0,0 +1,60 @@
+import numpy as np
+import matplotlib
+
+matplotlib.use('Agg')
+
+from graphing.imagine import VideoDisplay
+
+
+def test_player():
+    vd = VideoDisplay(np.random.rand(10, 16, 16), autosize=False)
+    player = vd.play(2, 5, fps=1000, loop=False, drop=False)
+    assert player.playing
+    for _ in range(5):
+        player._on_tick()
+    assert (player.frame, vd.frame) == (4, 4)
+    assert not player.playing
+    assert player.dropped == 0
+    assert {'fetch', 'normalise', 'draw'} <= set(player.timings.mean())
+
+    player.seek(12)
+    assert vd.frame == 4
+
+
+def test_coalesce_requests():
+    vd = VideoDisplay(np.random.rand(60, 16, 16), autosize=False)
+    rendered = []
+    update = vd.update
+    vd.update = lambda i, draw=True: rendered.append(i) or update(i, False)
+
+    # rendering is immediate for non-interactive backends
+    assert not vd.coalesce
+    vd.request_frame(2)
+    assert rendered == [2]
+
+    vd.coalesce = True
+    for i in range(3, 53):
+        vd.request_frame(i)
+    assert vd.frame == 2 and rendered == [2]
+
+    vd.flush()
+    assert rendered == [2, 52] and vd.frame == 52
+    assert vd.flush() == []
+
+    # prefetches for superseded frames are cancelled unless already running
+    vd.request_frame(10)
+    pending = vd.frame_cache.info()['pending']
+    assert pending <= vd.frame_cache.n_workers
+
+
+def test_replay():
+    vd = VideoDisplay(np.random.rand(10, 16, 16), autosize=False)
+    observers = vd.frameSlider._observers.callbacks['changed']
+    n = len(observers)
+    first = vd.play(fps=1000)
+    second = vd.play(fps=1000)
+
+    # the first player is stopped and disconnected from the slider
+    assert vd.player is second
+    assert not first.playing and second.playing
+    assert len(observers) == n + 1
@@ -0,0 +1,97 @@
+import numpy as np
+import matplotlib
+
+matplotlib.use('Agg')
+
+from graphing.frames import as_frame_source
+from graphing.projections import Projection, project
+
+np.random.seed(7)
+cube = np.random.randn(23, 8, 9) * 3 + 1e3
+masked = np.ma.masked_greater(cube, 1e3 + 6)
+masked[:, 0, 0] = np.ma.masked
+
+
+def test_project():
+    result = project(masked, chunk_size=5)
+    assert set(result) == {'mean', 'std', 'min', 'max', 'median'}
+    assert np.allclose(result['mean'], masked.mean(0).filled(np.nan),
+                       equal_nan=True)
+    assert np.allclose(result['std'], masked.std(0).filled(np.nan),
+                       equal_nan=True)
+    assert np.array_equal(result['max'], masked.max(0).filled(np.nan),
+                          equal_nan=True)
+    # all-masked pixel
+    assert np.isnan(result['min'][0, 0])
+
+    # median is exact for a single chunk, approximate otherwise
+    exact = project(cube, 'median', chunk_size=len(cube))['median']
+    assert np.allclose(exact, np.median(cube, 0))
+    approx = project(cube, 'median', chunk_size=8)['median']
+    assert np.abs(approx - exact).mean() < cube.std()
+
+
+def test_merge_and_processes(tmp_path):
+    parts = [Projection.from_chunk(cube[i:i + 4]) for i in range(0, 23, 4)]
+    summary = Projection()
+    for part in parts[::-1]:
+        summary.merge(part)
+    assert summary.n_frames == len(cube)
+    assert np.allclose(summary.get('std'), cube.std(0))
+
+    filename = tmp_path / 'cube.npy'
+    np.save(filename, cube)
+    result = project(filename, ('mean', 'max'), chunk_size=6, n_jobs=2)
+    assert np.allclose(result['mean'], cube.mean(0))
+    assert np.array_equal(result['max'], cube.max(0))
+
+
+def test_show_projection():
+    from graphing.imagine import VideoDisplay
+
+    vd = VideoDisplay(cube.copy(), autosize=False)
+    images = vd.get_projection(['max', 'std'])
+    assert vd.get_projection('max') is images['max']
+
+    vd.show_projection('max', draw=False)
+    assert np.array_equal(vd.imagePlot.get_array(), cube.max(0))
+    assert vd.frameSlider.valtext.get_text() == 'max'
+
+    vd.update(3, draw=False)
+    assert np.array_equal(vd.imagePlot.get_array(), cube[3])
+
+    # the cache is cleared when the data change
+    vd.data.data[:] = cube + 1
+    assert np.allclose(vd.get_projection('max'), cube.max(0) + 1)
+    vd.data = as_frame_source(cube[:5])
+    assert np.array_equal(vd.get_projection('max'), cube[:5].max(0))
+
+
+def test_projection_cache_parameters(monkeypatch):
+    from graphing.imagine import VideoDisplay
+
+    vd = VideoDisplay(cube, autosize=False)
+    exact = vd.get_projection('median', chunk_size=len(cube))
+    assert np.allclose(exact, np.median(cube, 0))
+
+    # the median depends on the chunking, other projections do not
+    maximum = vd.get_projection('max', chunk_size=len(cube))
+    approx = vd.get_projection('median', chunk_size=4)
+    assert not np.allclose(approx, exact)
+    assert vd.get_projection('max', chunk_size=4) is maximum
+    assert vd.get_projection('median', chunk_size=4) is approx
+
+    monkeypatch.setattr(Projection, 'n_medians', 2)
+    assert vd.get_projection('median', chunk_size=4) is not approx
+
+
+def test_hierarchical_median(monkeypatch):
+    monkeypatch.setattr(Projection, 'n_medians', 3)
+    summary = Projection(['median'])
+    for i in range(len(cube)):
+        summary.update(cube[i:i + 1])
+
+    # 23 chunk medians are held as 2 + 1 + 2 images on three levels
+    assert [len(medians) for medians in summary.medians] == [2, 1, 2]
+    median = summary.get('median')
+    assert np.abs(median - np.median(cube, 0)).mean() < cube.std()
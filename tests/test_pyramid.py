@@ -0,0 +1,30 @@
+import numpy as np
+
+from graphing.pyramid import ImagePyramid, block_average
+
+
+def test_block_average():
+    image = np.ma.arange(25.).reshape(5, 5)
+    image[0, 0] = np.ma.masked
+    small = block_average(image)
+    assert small.shape == (3, 3)
+    assert small[0, 0] == np.mean([1, 5, 6])
+    assert small[2, 2] == 24
+
+
+def test_block_average_rgb():
+    image = np.random.rand(5, 6, 3)
+    small = block_average(image)
+    assert small.shape == (3, 3, 3)
+    assert np.allclose(small[0, 0], image[:2, :2].mean((0, 1)))
+    assert np.allclose(small[2, 2], image[4, 4:].mean(0))
+
+
+def test_pyramid_levels():
+    pyramid = ImagePyramid(np.random.rand(512, 300), min_size=64)
+    assert len(pyramid) == 3
+    assert pyramid[2].shape == (128, 75)
+    assert pyramid.get_extent(2) == (-0.5, 299.5, -0.5, 511.5)
+    assert pyramid.select_level(0.5) == 0
+    assert pyramid.select_level(3) == 1
+    assert pyramid.select_level(100) == 2
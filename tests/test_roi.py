@@ -0,0 +1,82 @@
+import numpy as np
+import matplotlib
+
+matplotlib.use('Agg')
+
+from graphing.frames import FrameSource, ArrayFrames
+from graphing.roi import SummedAreaTable, extent_to_box, light_curve
+
+
+def test_summed_area_table():
+    image = np.ma.masked_greater(np.random.randn(40, 50) + 1e4, 1e4 + 2)
+    image[3, 4] = np.nan
+    sat = SummedAreaTable(image)
+
+    for box in [(0, 40, 0, 50), (5, 17, 3, 30), (2, 5, 1, 8), (30, 60, -5, 9)]:
+        r0, r1, c0, c1 = np.clip(box, 0, None)
+        region = np.ma.masked_invalid(image[r0:r1, c0:c1])
+        stats = sat.stats(box)
+        assert stats.n == region.count()
+        assert np.isclose(stats.sum, region.sum())
+        assert np.isclose(stats.mean, region.mean())
+        assert np.isclose(stats.std, region.std())
+
+    # empty region
+    assert sat.count((5, 5, 0, 10)) == 0
+    assert np.isnan(sat.mean((5, 5, 0, 10)))
+
+    # stacks of images
+    cube = np.random.randn(4, 10, 12)
+    stats = SummedAreaTable(cube).stats((2, 7, 3, 9))
+    assert np.allclose(stats.mean, cube[:, 2:7, 3:9].mean((1, 2)))
+
+
+def test_light_curve():
+    cube = np.ma.masked_less(np.random.randn(25, 10, 12), -2)
+    box = extent_to_box((2.6, 8.2, 1, 6.5))
+    assert box == (1, 7, 3, 9)
+
+    curve = light_curve(cube, box, chunk_size=4)
+    region = cube[:, 1:7, 3:9]
+    assert np.array_equal(curve.n, region.count((1, 2)))
+    assert np.allclose(curve.sum, region.sum((1, 2)))
+    assert np.allclose(curve.std, region.std((1, 2)))
+
+    # only the box is read from the frames
+    frames = RegionFrames(cube)
+    curve = light_curve(frames, box, chunk_size=4)
+    assert np.allclose(curve.mean, region.mean((1, 2)))
+    assert frames.regions == [(slice(1, 7), slice(3, 9))] * len(cube)
+
+
+class RegionFrames(ArrayFrames):
+    """Frames that only support reading regions, and record the reads"""
+
+    def __init__(self, data):
+        ArrayFrames.__init__(self, data)
+        self.regions = []
+
+    def get_frame(self, i):
+        raise AssertionError('Full frame read')
+
+    def get_region(self, i, rows, cols):
+        if isinstance(i, slice):
+            return FrameSource.get_region(self, i, rows, cols)
+        self.regions.append((rows, cols))
+        return self.data[i, rows, cols]
+
+
+def test_display_roi():
+    from graphing.imagine import VideoDisplay
+
+    cube = np.random.randn(5, 20, 30)
+    vd = VideoDisplay(cube, autosize=False)
+    roi = vd.add_roi((3.5, 10.5, 2.5, 8.5))
+    assert roi.box == (3, 9, 4, 11)
+    assert np.isclose(roi.stats.mean, cube[0, 3:9, 4:11].mean())
+
+    vd.update(2, draw=False)
+    assert np.isclose(roi.stats.std, cube[2, 3:9, 4:11].std())
+    assert vd.get_sat() is vd.get_sat()
+    assert np.allclose(vd.roi_light_curve().mean,
+                       cube[:, 3:9, 4:11].mean((1, 2)))
@@ -0,0 +1,59 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from graphing.sketch import QuantileSketch
+from graphing.stats import CumulativeHistogram
+from graphing.utils import percentile
+
+rng = np.random.default_rng(0)
+images = [rng.standard_normal((200, 300)) * (i + 1) for i in range(5)]
+pixels = np.concatenate([im.ravel() for im in images])
+
+
+def test_sketch_percentile():
+    sketch = QuantileSketch(seed=0)
+    for im in images:
+        sketch.update(im)
+
+    assert sketch.n == pixels.size
+    assert sketch.size < 5000
+    assert (sketch.min, sketch.max) == (pixels.min(), pixels.max())
+
+    q = np.linspace(0.01, 0.99, 99)
+    ranks = np.searchsorted(np.sort(pixels), sketch.quantile(q)) / pixels.size
+    assert np.abs(ranks - q).max() < 0.01
+
+    lims = sketch.percentile((-5, 105))
+    assert np.allclose(lims, percentile(pixels, (-5, 105)), rtol=0.01)
+
+
+def test_sketch_merge():
+    a, b = (QuantileSketch(seed=i).update(im)
+            for i, im in enumerate(images[:2]))
+    a.merge(b)
+    assert a.n == images[0].size + images[1].size
+    assert a.max == max(images[0].max(), images[1].max())
+
+
+def test_sketch_integer_histogram():
+    data = rng.integers(0, 10, (100, 100))
+    sketch = QuantileSketch().update(data)
+    counts, _ = sketch.histogram(np.arange(-0.5, 10))
+    assert counts.sum() == data.size
+    assert np.allclose(counts, np.bincount(data.ravel()), rtol=0.05)
+
+
+@pytest.mark.parametrize('low', [0, 65000])
+def test_sketch_uint16_histogram(low):
+    data = rng.integers(low, 2 ** 16, (100, 100), dtype=np.uint16)
+    data.flat[:2] = low, 2 ** 16 - 1
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', RuntimeWarning)
+        table = CumulativeHistogram.from_sketch(QuantileSketch().update(data))
+
+    assert (table.min, table.max) == (low, 2 ** 16 - 1)
+    assert table.edges[0] <= low and table.edges[-1] >= 2 ** 16 - 1
+    counts, _ = table.rebin(10)
+    assert np.isclose(counts.sum(), data.size)
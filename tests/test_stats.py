@@ -0,0 +1,65 @@
+import numpy as np
+
+from graphing.stats import CumulativeHistogram
+
+np.random.seed(7)
+
+
+def test_rebin_float():
+    data = np.random.randn(200, 200)
+    table = CumulativeHistogram(data)
+    counts, edges = table.rebin(25, (-2, 2))
+    expected, _ = np.histogram(data, edges)
+    # exact up to the resolution of the table
+    assert np.abs(counts - expected).max() <= 0.01 * expected.max()
+    assert np.isclose(table.rebin(10)[0].sum(), data.size)
+
+
+def test_rebin_integer():
+    data = np.ma.masked_equal(np.random.randint(0, 50, (100, 100)), 7)
+    table = CumulativeHistogram(data)
+    counts, edges = table.rebin(10, (10, 30))
+    expected, _ = np.histogram(data.compressed(), edges)
+    assert np.all(counts == expected)
+
+
+def test_bincount_integer():
+    rng = np.random.default_rng(0)
+    for dtype, lo, hi in (('u2', 0, 65535), ('i2', -30000, 30000),
+                          ('u1', 0, 255)):
+        data = rng.integers(lo, hi, (200, 300), endpoint=True).astype(dtype)
+        table = CumulativeHistogram(data)
+        # one bin per integer value
+        assert len(table.edges) == int(data.max()) - int(data.min()) + 2
+
+        counts, edges = table.rebin(37, (lo + 100, hi - 100))
+        expected, _ = np.histogram(data, edges)
+        assert np.array_equal(counts, expected)
+
+
+def test_pixel_stats():
+    from graphing.stats import PixelStats
+    from graphing.utils import percentile
+
+    image = np.ma.masked_greater(np.random.randn(100, 100), 2)
+    image[0, 0] = np.nan
+    stats = PixelStats(image)
+    assert len(stats) == image.count() - 1
+
+    p = (-120, -5, 0, 0.25, 50, 99.75, 100, 105, 270)
+    assert np.allclose(stats.percentile(p), percentile(image, p))
+    # percentiles select the required ranks without sorting
+    assert stats._sorted is None
+    stats.sorted
+    assert np.allclose(stats.percentile(p), percentile(image, p))
+    assert np.allclose(stats.extrema, (np.nanmin(image), np.nanmax(image)))
+
+    # derived quantities share the valid values
+    values = stats.values
+    assert stats.table.n == values.size
+    assert stats.values is values
+    assert PixelStats.of(stats) is stats
+
+    empty = PixelStats(np.full((3, 3), np.nan))
+    assert np.isnan(empty.extrema).all()
+    assert np.isnan(empty.percentile((1, 99))).all()
@@ -0,0 +1,21 @@
+import numpy as np
+
+from graphing.tiles import TiledImage
+
+image = np.random.rand(300, 200)
+
+
+def test_assemble():
+    tiles = TiledImage(image, tile_size=64, n_workers=0)
+    assert tiles.n_levels == 4
+
+    rows, cols = tiles.get_tile_range(0, (70, 130), (-0.5, 299.5))
+    assert (rows, cols) == (range(0, 5), range(1, 3))
+    mosaic, extent, missing = tiles.assemble(0, rows, cols, wait=True)
+    assert not missing
+    assert np.all(mosaic == image[:, 64:192])
+    assert extent == (63.5, 191.5, -0.5, 299.5)
+
+    mosaic, extent, _ = tiles.assemble(1, range(3), range(2), 'upper', True)
+    assert np.all(mosaic == image[::2, ::2])
+    assert extent == (-0.5, 199.5, 299.5, -0.5)
@@ -1,6 +1,13 @@
 import numpy as np
+import pytest
 
-from graphing.utils import get_percentile
+from graphing.utils import (percentile, get_percentile_limits,
+                            estimate_percentile_limits, reservoir_sample)
+
+
+@pytest.fixture
+def data():
+    return np.random.randn(1000)
 
 
 def test_plims(data, tolerance=1e-6):
@@ -25,10 +32,55 @@ def test_plims(data, tolerance=1e-6):
                 }
 
     for p, e in expected.items():
-        z = get_percentile(data, p)
+        z = percentile(data, p)
         assert (z - e) < tolerance, (f'Expected percentile value of {e:.3f} '
                                      f'does not match computed {z:.3f}')
 
 
+def test_percentile_axis_masked():
+    p = (-120, -5, 0, 10, 50, 100, 105, 270)
+    data = np.random.randn(7, 500)
+    masked = np.ma.masked_greater(data, 1.5)
+    masked[0, :10] = np.nan
+    expected = [percentile(row[~np.isnan(row)].compressed(), p)
+                for row in masked]
+    assert np.allclose(percentile(masked, p, 1), np.transpose(expected))
+    assert np.allclose(percentile(masked.T, p, 0), np.transpose(expected))
+    assert np.allclose(percentile(masked.reshape(7, 20, 25), p, (1, 2)),
+                       np.transpose(expected))
+
+    # unmasked data with nans
+    data = masked.filled(np.nan)
+    assert np.allclose(percentile(data, p, 1), np.transpose(expected))
+    assert np.isnan(percentile(np.full((2, 3), np.nan), 50, 1)).all()
+
+
+def test_percentile_limits_block():
+    data = np.random.randn(5, 100)
+    lims = get_percentile_limits(data, (-5, 105), axis=1)
+    assert lims.shape == (2, 5)
+    for i, row in enumerate(data):
+        assert np.allclose(lims[:, i], get_percentile_limits(row, (-5, 105)))
+
+
+@pytest.mark.parametrize('method', ['strided', 'reservoir'])
+def test_estimate_percentile_limits(method):
+    image = np.random.randn(500, 500)
+    plims = (1, 99)
+    lims, bounds = estimate_percentile_limits(image, plims, 2 ** 14, method,
+                                              confidence=0.9999, seed=1)
+    expected = get_percentile_limits(image.ravel(), plims)
+    assert np.all((bounds[:, 0] <= expected) & (expected <= bounds[:, 1]))
+    assert np.all((bounds[:, 0] <= lims) & (lims <= bounds[:, 1]))
+
+
+def test_reservoir_sample():
+    data = np.ma.masked_greater(np.arange(1000.), 499)
+    sample = reservoir_sample(data, 100, seed=0)
+    assert len(sample) == len(np.unique(sample)) == 100
+    assert sample.max() < 500
+    assert len(reservoir_sample(data, 1000)) == 500
+
+
 if __name__ == '__main__':
     test_plims(np.random.randn(1000))
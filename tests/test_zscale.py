@@ -0,0 +1,61 @@
+import numpy as np
+from astropy.visualization import ZScaleInterval as AstropyZScaleInterval
+
+from graphing.zscale import zrange, Zscale, ZScaleInterval
+from graphing.clims import batch_limits
+
+
+rng = np.random.default_rng(0)
+cube = rng.normal(0, 1, (5, 100, 100)) * np.arange(1, 6)[:, None, None] ** 2
+
+
+def test_zrange_matches_astropy():
+    expected = [AstropyZScaleInterval().get_limits(image) for image in cube]
+    assert np.allclose(zrange(cube, axis=0, contrast=0.25), expected,
+                       rtol=0.05)
+
+
+def test_zrange_batch():
+    lims = zrange(cube, axis=0)
+    assert lims.shape == (5, 2)
+    assert np.array_equal(lims[2], zrange(cube[2]))
+    # stack along a different axis
+    assert np.allclose(zrange(np.moveaxis(cube, 0, 2), axis=2), lims)
+    # deterministic
+    assert np.array_equal(lims, zrange(cube, axis=0))
+
+
+def test_zrange_masked():
+    image = np.ma.masked_greater(cube[0], 2)
+    image[0, 0] = np.nan
+    lo, hi = zrange(image)
+    assert np.isfinite([lo, hi]).all()
+    assert hi <= 2
+
+    assert np.isnan(zrange(np.full((10, 10), np.nan))).all()
+    assert np.array_equal(zrange(np.arange(100).reshape(10, 10)), (0, 99))
+
+
+def test_legacy_interface():
+    image = cube[1]
+    bad = image > 2
+    expected = zrange(np.ma.masked_where(bad, image))
+    assert np.array_equal(zrange(image, mask=bad), expected)
+    assert np.array_equal(zrange(image, Npix=500), zrange(image, n_samples=500))
+
+    # the mask of `Zscale` selects the pixels to use
+    zs = Zscale(mask=~bad)
+    lo, hi = zs.range(image)
+    assert lo < hi <= 2
+    assert (zs.z1, zs.z2) == (lo, hi)
+
+
+def test_interval():
+    interval = ZScaleInterval()
+    assert np.array_equal(batch_limits(cube, interval),
+                          interval.get_limits_batch(cube))
+    assert np.allclose(interval.get_limits(cube[1]),
+                       zrange(cube[1], contrast=0.25))
+
+    interval = ZScaleInterval.from_astropy(AstropyZScaleInterval(contrast=0.1))
+    assert interval.contrast == 0.1